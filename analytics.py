@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Parquet snapshots of the database and DuckDB reports over them
+# ----------------------------------------------------------------------------
+import os
+import shutil
+import time
+from datetime import datetime
+
+from logger import logger
+from data_exporter import DataExporter
+import columnar
+
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_STAMP = "_SNAPSHOT"     # file holding the snapshot date
+
+ORDER_TYPES = {
+    "_id": "string", "customer_id": "string", "order_date": "datetime",
+    "status": "string", "total_price": "decimal", "created_at": "datetime",
+}
+ORDER_LINE_TYPES = {
+    "order_id": "string", "customer_id": "string", "order_date": "datetime",
+    "status": "string", "product_id": "string", "quantity": "int",
+}
+
+# Parameterized reports: {name: {"title", "params", "sql"}}
+# Parameters: $start / $end (dates, inclusive) and $limit
+REPORTS = {
+    "revenue_by_category": {
+        "title": "الإيرادات حسب الفئة والشهر",
+        "params": ("start", "end"),
+        # Order lines do not store their price: the current product price is used
+        "sql": """
+            SELECT strftime(l.order_date, '%Y-%m') AS month,
+                   coalesce(p.category, '') AS category,
+                   sum(l.quantity) AS quantity,
+                   sum(l.quantity * p.price) AS revenue
+            FROM order_lines l
+            LEFT JOIN products p ON p._id = l.product_id
+            WHERE l.status <> 'cancelled'
+              AND l.year BETWEEN year(CAST($start AS DATE)) AND year(CAST($end AS DATE))
+              AND l.order_date >= CAST($start AS DATE)
+              AND l.order_date < CAST($end AS DATE) + INTERVAL 1 DAY
+            GROUP BY ALL
+            ORDER BY month, revenue DESC
+        """,
+    },
+    "customer_cohorts": {
+        "title": "أفواج العملاء حسب شهر أول طلبية",
+        "params": ("start", "end"),
+        "sql": """
+            WITH firsts AS (
+                SELECT customer_id, min(order_date) AS first_order
+                FROM orders
+                WHERE status <> 'cancelled'
+                GROUP BY customer_id
+            )
+            SELECT strftime(f.first_order, '%Y-%m') AS cohort,
+                   date_diff('month', date_trunc('month', f.first_order), date_trunc('month', o.order_date)) AS months,
+                   count(DISTINCT o.customer_id) AS customers,
+                   count(*) AS orders,
+                   sum(o.total_price) AS revenue
+            FROM orders o
+            JOIN firsts f USING (customer_id)
+            WHERE o.status <> 'cancelled'
+              AND f.first_order >= CAST($start AS DATE)
+              AND f.first_order < CAST($end AS DATE) + INTERVAL 1 DAY
+            GROUP BY ALL
+            ORDER BY cohort, months
+        """,
+    },
+    "basket_pairs": {
+        "title": "السلع التي تشترى معا",
+        "params": ("start", "end", "limit"),
+        "sql": """
+            SELECT coalesce(pa.name, a.product_id) AS product_a,
+                   coalesce(pb.name, b.product_id) AS product_b,
+                   count(DISTINCT a.order_id) AS orders
+            FROM order_lines a
+            JOIN order_lines b ON b.order_id = a.order_id AND a.product_id < b.product_id
+            LEFT JOIN products pa ON pa._id = a.product_id
+            LEFT JOIN products pb ON pb._id = b.product_id
+            WHERE a.status <> 'cancelled'
+              AND a.year BETWEEN year(CAST($start AS DATE)) AND year(CAST($end AS DATE))
+              AND a.order_date >= CAST($start AS DATE)
+              AND a.order_date < CAST($end AS DATE) + INTERVAL 1 DAY
+            GROUP BY ALL
+            ORDER BY orders DESC
+            LIMIT $limit
+        """,
+    },
+}
+
+
+# *************************************************************
+#       => Snapshot
+# *************************************************************
+def order_lines(orders):
+    """One row per ordered product."""
+    for order in orders:
+        for item in order.get("products") or []:
+            yield {
+                "order_id": order.get("_id"),
+                "customer_id": order.get("customer_id"),
+                "order_date": order.get("order_date"),
+                "status": order.get("status"),
+                "product_id": item.get("product_id"),
+                "quantity": item.get("quantity"),
+            }
+
+
+def write_partitioned(documents, types, root, batch_number):
+    """Write one batch to `root`, partitioned by year/month of order_date."""
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    table = columnar.documents_to_arrow(documents, types, batch_size=len(documents) or 1)
+    table = table.append_column("year", pc.year(table["order_date"]))
+    table = table.append_column("month", pc.month(table["order_date"]))
+    pq.write_to_dataset(
+        table, root, partition_cols=["year", "month"],
+        basename_template=f"part-{batch_number}-{{i}}.parquet",
+    )
+
+
+def write_snapshot(db_handler, directory=SNAPSHOT_DIR, batch_size=50000, progress_callback=None):
+    """
+    Write Products/Customers to Parquet files and Orders (plus their lines) to
+    Parquet datasets partitioned by year/month. The snapshot is written next to
+    `directory` and swapped in when complete, reports never read a partial one.
+
+    :param db_handler: A connected MongoDBHandler instance.
+    :param directory: The snapshot directory.
+    :param batch_size: Orders per batch (one file per partition and batch).
+    :param progress_callback: Optional callable(exported_orders).
+    :return: A dictionary with the status and the number of orders.
+    """
+    temporary = f"{directory}.tmp"
+    try:
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+
+        exporter = DataExporter(db_handler)
+        for collection_name in ("Products", "Customers"):
+            response = exporter.export(collection_name, os.path.join(temporary, f"{collection_name.lower()}.parquet"))
+            if response["status"] != "success":
+                raise RuntimeError(response["message"])
+
+        projection = {field: 1 for field in ORDER_TYPES}
+        projection["products"] = 1
+        count, batch_number, batch = 0, 0, []
+
+        def flush():
+            nonlocal batch_number
+            write_partitioned(batch, ORDER_TYPES, os.path.join(temporary, "orders"), batch_number)
+            lines = list(order_lines(batch))
+            if lines:
+                write_partitioned(lines, ORDER_LINE_TYPES, os.path.join(temporary, "order_lines"), batch_number)
+            batch_number += 1
+            batch.clear()
+            if progress_callback:
+                progress_callback(count)
+
+        for order in db_handler.iter_documents("Orders", projection=projection, batch_size=batch_size):
+            batch.append(order)
+            count += 1
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        # Keep the views valid on an empty database
+        for name, types in (("orders", ORDER_TYPES), ("order_lines", ORDER_LINE_TYPES)):
+            if not os.path.isdir(os.path.join(temporary, name)):
+                write_partitioned([{"order_date": datetime(1970, 1, 1)}], types, os.path.join(temporary, name), 0)
+
+        with open(os.path.join(temporary, SNAPSHOT_STAMP), "w") as stamp:
+            stamp.write(datetime.now().isoformat(timespec="seconds"))
+
+        previous = f"{directory}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.isdir(directory):
+            os.rename(directory, previous)
+        os.rename(temporary, directory)
+        shutil.rmtree(previous, ignore_errors=True)
+    except Exception as err:
+        logger.error(f"Error writing the analytics snapshot: {err}")
+        shutil.rmtree(temporary, ignore_errors=True)
+        return {"status": "error", "message": str(err)}
+
+    logger.info(f"Analytics snapshot written to {directory} ({count} orders).")
+    return {"status": "success", "count": count}
+
+
+# *************************************************************
+#       => Reports
+# *************************************************************
+class Analytics:
+    """
+    Runs the SQL reports with DuckDB over the last Parquet snapshot,
+    the live MongoDB is not queried.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR):
+        self.directory = directory
+        self.connection = None
+        self.loaded_snapshot = None
+
+    def snapshot_date(self):
+        """The date of the current snapshot (str) or None."""
+        try:
+            with open(os.path.join(self.directory, SNAPSHOT_STAMP)) as stamp:
+                return stamp.read().strip()
+        except OSError:
+            return None
+
+    def connect(self):
+        """Open DuckDB and (re)create the views when the snapshot changed."""
+        snapshot = self.snapshot_date()
+        if snapshot is None:
+            raise FileNotFoundError("No analytics snapshot yet: create one first.")
+        if self.connection is not None and snapshot == self.loaded_snapshot:
+            return self.connection
+
+        try:
+            import duckdb
+        except ImportError:
+            raise ImportError("duckdb is required for the reports: pip install duckdb")
+
+        if self.connection is None:
+            self.connection = duckdb.connect()
+        root = os.path.abspath(self.directory).replace("'", "''")
+        for name in ("orders", "order_lines"):
+            self.connection.execute(
+                f"CREATE OR REPLACE VIEW {name} AS "
+                f"SELECT * FROM read_parquet('{root}/{name}/*/*/*.parquet', hive_partitioning = true)"
+            )
+        for name in ("products", "customers"):
+            self.connection.execute(
+                f"CREATE OR REPLACE VIEW {name} AS SELECT * FROM read_parquet('{root}/{name}.parquet')"
+            )
+        self.loaded_snapshot = snapshot
+        return self.connection
+
+    def run_report(self, name, **params):
+        """
+        Run one of the REPORTS.
+
+        :param name: The report name (key of REPORTS).
+        :param params: The report parameters (start, end: date; limit: int).
+        :return: A dictionary with the status, the columns, the rows and the duration in ms.
+        """
+        try:
+            report = REPORTS[name]
+            missing = [param for param in report["params"] if params.get(param) is None]
+            if missing:
+                raise ValueError(f"missing parameters: {', '.join(missing)}")
+
+            connection = self.connect()
+            start = time.perf_counter()
+            cursor = connection.execute(report["sql"], {param: params[param] for param in report["params"]})
+            rows = cursor.fetchall()
+            columns = [description[0] for description in cursor.description]
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        except Exception as err:
+            logger.error(f"Error running report {name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+        logger.info(f"Report {name}: {len(rows)} rows in {elapsed_ms:.1f} ms.")
+        return {"status": "success", "columns": columns, "rows": rows, "elapsed_ms": elapsed_ms}
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import date
+
+    def parse_date(value):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+
+    parser = argparse.ArgumentParser(description="Analytics snapshot and reports.")
+    parser.add_argument("--directory", default=SNAPSHOT_DIR, help="snapshot directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snapshot_parser = commands.add_parser("snapshot", help="write a new snapshot")
+    snapshot_parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection URI")
+    snapshot_parser.add_argument("--database", default="elSel3a", help="database name")
+
+    report_parser = commands.add_parser("report", help="run a report on the last snapshot")
+    report_parser.add_argument("name", choices=list(REPORTS), help="report name")
+    report_parser.add_argument("--from", dest="start", type=parse_date, default=date(2000, 1, 1))
+    report_parser.add_argument("--to", dest="end", type=parse_date, default=date.today())
+    report_parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        from mongo_handler import MongoDBHandler
+        response = write_snapshot(MongoDBHandler(uri=args.uri, database=args.database), args.directory)
+    else:
+        response = Analytics(args.directory).run_report(args.name, start=args.start, end=args.end, limit=args.limit)
+        if response["status"] == "success":
+            print("\t".join(response["columns"]))
+            for row in response["rows"]:
+                print("\t".join(str(value) for value in row))
+    raise SystemExit(0 if response["status"] == "success" else 1)
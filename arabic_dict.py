@@ -69,6 +69,22 @@ status_mapping_en = {
     "bad_client": "عميل سيئ",
 }
 
-prod_headers = ["أيد", "الاسم", "المرجع", "الوصف", "السعر", "الكمية", "الفئة"]
-customer_headers = ["إيد", "الإسم", "اللقب", "الهاتف", "إيمايل", "العنوان", "مفعل", "درجة الثقة"]
-order_headers = ["أيد", "المشتري", "التاريخ", "الوضعية", "المجموع"]
+# Column headers of the main tables, by field (see table_specs.py)
+table_headers = {
+    "Products": {
+        "_id": "أيد", "name": "الاسم", "ref": "المرجع", "description": "الوصف",
+        "price": "السعر", "qte": "الكمية", "category": "الفئة",
+    },
+    "Customers": {
+        "_id": "إيد", "first_name": "الإسم", "last_name": "اللقب", "phone": "الهاتف",
+        "email": "إيمايل", "address": "العنوان", "is_active": "مفعل", "client_status": "درجة الثقة",
+    },
+    "Orders": {
+        "_id": "أيد", "customer_name": "المشتري", "order_date": "التاريخ", "status": "الوضعية",
+        "total_price": "المجموع",
+    },
+}
+
+prod_headers = list(table_headers["Products"].values())
+customer_headers = list(table_headers["Customers"].values())
+order_headers = list(table_headers["Orders"].values())
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Asynchronous MongoDBHandler built on motor (asyncio)
+# ----------------------------------------------------------------------------
+import asyncio
+from decimal import Decimal
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from bson.decimal128 import Decimal128
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from logger import logger
+from bson_codecs import CODEC_OPTIONS
+from lookup import customer_search_keys
+import cart
+import pipelines
+
+
+class AsyncMongoDBHandler:
+    """
+    Coroutine version of MongoDBHandler.
+
+    The methods have the same names, arguments and response dictionaries as
+    MongoDBHandler; they must be awaited from a running asyncio loop
+    (in the GUI: the qasync loop created in main.py).
+    """
+
+    def __init__(self, uri="mongodb://localhost:27017/", database="elSel3a", event_handler=None):
+        """
+        :param uri: MongoDB connection URI.
+        :param database: Database name.
+        :param event_handler: Optional MongoDBHandler whose change listeners are
+                              notified after each write (see MongoDBHandler.emit_change).
+        """
+        self.client = AsyncIOMotorClient(uri)
+        self.db = self.client.get_database(database, codec_options=CODEC_OPTIONS)
+        self.event_handler = event_handler
+        self.transactions = None    # see supports_transactions
+
+    def close(self):
+        self.client.close()
+
+    async def supports_transactions(self):
+        """Multi-document transactions need a replica set (or a sharded cluster), asked once."""
+        if self.transactions is None:
+            hello = await self.client.admin.command("hello")
+            self.transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        return self.transactions
+
+    async def notify(self, collection_name, operation, document_ids):
+        """
+        Forward write events to the listeners of the synchronous handler. Its local
+        replica gets the written documents first: the listeners read them from it.
+        """
+        if self.event_handler is None:
+            return
+        replica = self.event_handler.replica
+        if replica is not None:
+            if operation == "delete":
+                replica.delete_documents(collection_name, document_ids)
+            else:
+                cursor = self.db[collection_name].find(
+                    {"_id": {"$in": [ObjectId(document_id) for document_id in document_ids]}}
+                )
+                replica.upsert_documents(collection_name, await self.to_list(cursor))
+        for document_id in document_ids:
+            self.event_handler.emit_change(collection_name, operation, document_id)
+        self.event_handler.flush_changes()
+
+    @staticmethod
+    async def to_list(cursor):
+        return await cursor.to_list(length=None)
+
+    # *************************************************************
+    # Base Methods
+    # *************************************************************
+
+    async def add_document(self, collection_name, document):
+        """
+        Adds a new document to a collection.
+
+        :param collection_name: Name of the collection.
+        :param document: The document to insert.
+        :return: Inserted document's ID.
+        """
+        try:
+            document["created_at"] = datetime.now()
+            document["updated_at"] = datetime.now()
+            result = await self.db[collection_name].insert_one(document)
+            await self.notify(collection_name, "insert", [result.inserted_id])
+            logger.info(f"Document added successfully to {collection_name} with ID: {result.inserted_id}")
+            return {"status": "success", "id": str(result.inserted_id)}
+        except Exception as err:
+            logger.error(f"Error adding document to {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def find(self, collection_name, query=None, projection=None, limit=0, sort=None):
+        """
+        Run a find and return the documents as a list.
+        """
+        cursor = self.db[collection_name].find(query or {}, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit > 0:
+            cursor = cursor.limit(limit)
+        return await self.to_list(cursor)
+
+    async def fetch_documents(self, collection_name, query=None, projection=None, limit=0, sort=None):
+        """
+        Fetches documents from a collection.
+
+        :param collection_name: Name of the collection.
+        :param query: Filter criteria. Default is None (fetch all).
+        :param projection: Fields to include or exclude. Default is None (include all).
+        :param limit: Maximum number of documents to fetch. Default is 0 (no limit).
+        :param sort: Sort order as a list of tuples (e.g., [("created_at", -1)]).
+        :return: List of fetched documents.
+        """
+        try:
+            documents = await self.find(collection_name, query, projection, limit, sort)
+            logger.info(f"Fetched documents successfully from {collection_name}.")
+            return {"status": "success", "documents": documents}
+        except Exception as err:
+            logger.error(f"Error fetching documents from {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def update_document(self, collection_name, document_id, updates):
+        """
+        Updates a document in a collection.
+
+        :param collection_name: Name of the collection.
+        :param document_id: The ID of the document to update.
+        :param updates: A dictionary of fields to update.
+        :return: Update status.
+        """
+        try:
+            updates["updated_at"] = datetime.now()
+            if collection_name == "Customers" and {"first_name", "last_name", "phone"} & set(updates):
+                fields = {"first_name": 1, "last_name": 1, "phone": 1}
+                customer = await self.db["Customers"].find_one({"_id": ObjectId(document_id)}, fields) or {}
+                updates["search_keys"] = customer_search_keys({**customer, **updates})
+            result = await self.db[collection_name].update_one({"_id": ObjectId(document_id)}, {"$set": updates})
+            if result.modified_count > 0:
+                await self.notify(collection_name, "update", [document_id])
+                logger.info(f"Document {document_id} updated successfully in {collection_name}.")
+                return {"status": "success", "message": "Document updated."}
+            logger.warning(f"Document {document_id} not found or no changes made.")
+            return {"status": "error", "message": "Document not found or no changes made."}
+        except Exception as err:
+            logger.error(f"Error updating document in {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def delete_document(self, collection_name, document_id):
+        """
+        Deletes a document from a collection.
+
+        :param collection_name: Name of the collection.
+        :param document_id: The ID of the document to delete.
+        :return: Deletion status.
+        """
+        try:
+            result = await self.db[collection_name].delete_one({"_id": ObjectId(document_id)})
+            if result.deleted_count > 0:
+                await self.notify(collection_name, "delete", [document_id])
+                logger.info(f"Document {document_id} deleted successfully from {collection_name}.")
+                return {"status": "success", "message": "Document deleted."}
+
+            logger.warning(f"Document {document_id} not found in collection {collection_name}.")
+            return {"status": "error", "message": "Document not found."}
+        except Exception as err:
+            logger.error(f"Error deleting document from {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def delete_many_documents(self, collection_name, document_ids):
+        """
+        Deletes multiple documents from a collection based on a list of IDs.
+
+        :param collection_name: Name of the collection.
+        :param document_ids: List of IDs of the documents to delete.
+        :return: Deletion status with the count of deleted documents.
+        """
+        try:
+            object_ids = [ObjectId(doc_id) for doc_id in document_ids]
+            result = await self.db[collection_name].delete_many({"_id": {"$in": object_ids}})
+            await self.notify(collection_name, "delete", object_ids)
+
+            if result.deleted_count > 0:
+                logger.info(f"Deleted {result.deleted_count} documents from {collection_name}.")
+                return {
+                    "status": "success",
+                    "message": f"Deleted {result.deleted_count} documents.",
+                    "deleted_count": result.deleted_count
+                }
+
+            logger.warning(f"No documents found to delete in collection {collection_name} with the given IDs.")
+            return {"status": "error", "message": "No documents found to delete.", "deleted_count": 0}
+        except Exception as err:
+            logger.error(f"Error deleting documents from {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def update_record_state(self, collection_name, document_id, field, new_value):
+        """
+        Updates a specific field for a single record in a collection.
+
+        :param collection_name: Name of the collection (e.g., "Products", "Customers", "Orders").
+        :param document_id: The ID of the document to update.
+        :param field: The field to update (e.g., "is_active", "status").
+        :param new_value: The new value to set for the field.
+        :return: A dictionary with the status and a message.
+        """
+        try:
+            result = await self.db[collection_name].update_one(
+                {"_id": ObjectId(document_id)},
+                {"$set": {field: new_value, "updated_at": datetime.now()}}
+            )
+            if result.matched_count == 0:
+                logger.error(f"Document {document_id} not found in {collection_name}.")
+                return {"status": "error", "message": "Record not found."}
+            if result.modified_count == 0:
+                logger.warning(f"No changes made to document {document_id} in {collection_name}.")
+                return {"status": "warning", "message": "No changes made."}
+
+            await self.notify(collection_name, "update", [document_id])
+            logger.info(f"Updated {field} for document {document_id} in {collection_name} to {new_value}.")
+            return {"status": "success", "message": "Record updated successfully."}
+        except Exception as err:
+            logger.error(f"Error updating document {document_id} in {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    # *************************************************************
+    # Product Methods
+    # *************************************************************
+    async def create_product(self, name, ref, description, qte, price, category, supplier):
+        """
+        Adds a new product to the Products collection.
+        """
+        product = {
+            "name": name,
+            "ref": ref,
+            "description": description,
+            "qte": int(qte),
+            "price": Decimal128(Decimal(price)),
+            "category": category,
+            "supplier": supplier,
+            "is_active": True,
+        }
+        return await self.add_document("Products", product)
+
+    async def fetch_products(self, query=None, projection=None, limit=0, sort=None):
+        """
+        Fetches products from the Products collection.
+        """
+        try:
+            product_list = await self.find("Products", query, projection, limit, sort)
+            logger.info("Fetched products successfully.")
+            return {"status": "success", "documents": product_list}
+        except Exception as err:
+            logger.error(f"Error fetching products: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def update_product(self, product_id, update_data):
+        """
+        Updates a product in the Products collection by its product_id.
+
+        :param product_id: The ObjectId of the product to update.
+        :param update_data: A dictionary containing the fields to update.
+        :return: A dictionary with the status of the operation.
+        """
+        try:
+            product_id = ObjectId(product_id)
+            if "price" in update_data:
+                update_data["price"] = Decimal128(Decimal(str(update_data["price"])))
+            if "qte" in update_data:
+                update_data["qte"] = int(update_data["qte"])
+            update_data["updated_at"] = datetime.now()
+
+            result = await self.db["Products"].update_one({"_id": product_id}, {"$set": update_data})
+            if result.matched_count == 0:
+                logger.warning('Product not found')
+                return {"status": "error", "message": "Product not found."}
+            if result.modified_count == 0:
+                logger.warning('No changes were made.')
+                return {"status": "warning", "message": "No changes were made."}
+
+            await self.notify("Products", "update", [product_id])
+            logger.info('Product updated successfully')
+            return {"status": "success", "message": "Product updated successfully."}
+        except Exception as err:
+            logger.error(f"Error updating product: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def update_product_quantity(self, product_id, quantity_change):
+        """
+        Updates the quantity of a product in the database.
+
+        :param product_id: The ID of the product to update.
+        :param quantity_change: The change in quantity (negative to reduce, positive to increase).
+        :return: A dictionary with the status of the operation.
+        """
+        try:
+            result = await self.db["Products"].update_one(
+                {"_id": ObjectId(product_id)},
+                {"$inc": {"qte": quantity_change}, "$set": {"updated_at": datetime.now()}}
+            )
+            if result.matched_count == 0:
+                return {"status": "error", "message": f"Product with ID {product_id} not found."}
+
+            await self.notify("Products", "update", [product_id])
+            return {"status": "success", "message": "Quantity updated successfully."}
+        except Exception as err:
+            logger.error(f"Error updating product quantity: {err}")
+            return {"status": "error", "message": str(err)}
+
+    # *************************************************************
+    # Order Methods
+    # *************************************************************
+    async def create_order(self, customer_id, products, order_date=None, status="pending", expected_prices=None):
+        """
+        Creates an order once the whole cart was checked (one query, see cart.check_cart)
+        and its stock taken (see place_order).
+
+        :param expected_prices: {product_id: price} shown in the cart; when a price changed
+                                the order is not created and the changes are returned.
+        :return: {"status": "success", "order_id"} | {"status": "warning", "price_changes": [...]} | error
+        """
+        try:
+            if len(products) == 0:
+                logger.error("No products selected for this order")
+                return {"status": "error", "message": "عليك إضافة السلعة إلالطلبية"}
+
+            quantities = cart.cart_quantities(products)
+            cursor = self.db["Products"].find(cart.cart_query(quantities), cart.CART_PROJECTION)
+            found = {str(product["_id"]): product for product in await self.to_list(cursor)}
+            response = cart.problems_response(cart.check_cart(quantities, found, expected_prices))
+            if response is not None:
+                logger.warning(f"Order not created: {response}")
+                return response
+
+            order_id = await self.place_order(cart.new_order(customer_id, quantities, found, status, order_date), quantities)
+            if order_id is None:
+                logger.warning("Order not created: the stock changed after the cart was checked.")
+                return dict(cart.STOCK_CHANGED)
+
+            await self.notify("Orders", "insert", [order_id])
+            await self.notify("Products", "update", list(quantities))
+            logger.info(f"Order created successfully with ID: {order_id}")
+            return {"status": "success", "order_id": str(order_id)}
+
+        except Exception as err:
+            logger.error(f"Error creating order: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def place_order(self, order, quantities):
+        """
+        Same as MongoDBHandler.place_order: the stock of every line then the order, all or nothing.
+
+        :return: The _id of the order, None when a line lacks stock (nothing is written).
+        """
+        now = datetime.now()
+        if await self.supports_transactions():
+            async with await self.client.start_session() as session:
+                async with session.start_transaction():
+                    result = await self.db["Products"].bulk_write([
+                        UpdateOne(*cart.decrement_stock(product_id, quantity, now))
+                        for product_id, quantity in quantities.items()
+                    ], session=session)
+                    if result.matched_count < len(quantities):
+                        await session.abort_transaction()
+                        return None
+                    result = await self.db["Orders"].insert_one(order, session=session)
+                    return result.inserted_id
+
+        taken = []
+        try:
+            for product_id, quantity in quantities.items():
+                result = await self.db["Products"].update_one(*cart.decrement_stock(product_id, quantity, now))
+                if result.matched_count == 0:
+                    return None
+                taken.append(product_id)
+            result = await self.db["Orders"].insert_one(order)
+            taken = []
+            return result.inserted_id
+        finally:
+            if taken:
+                await self.db["Products"].bulk_write([
+                    UpdateOne(*cart.restore_stock(product_id, quantities[product_id], now)) for product_id in taken
+                ], ordered=False)
+
+    async def fetch_orders(self, query=None, projection=None, limit=0, sort=None):
+        """
+        Fetches orders from the Orders collection.
+        """
+        return await self.fetch_documents("Orders", query, projection, limit, sort)
+
+    async def fetch_orders_with_customer_names(self, query=None, projection=None, limit=0, sort=None):
+        """
+        Fetches orders from the database and includes customer names.
+
+        :param query: Filter criteria for orders. Default is None (fetch all).
+        :param projection: Fields to include or exclude. Default is None (include all).
+        :param limit: Maximum number of documents to fetch. Default is 0 (no limit).
+        :param sort: Sort order as a list of tuples (e.g., [("order_date", -1)]).
+        :return: List of fetched orders with customer names.
+        """
+        try:
+            pipeline = pipelines.orders_with_customer_names(query, projection, sort, limit)
+            orders = await self.to_list(self.db["Orders"].aggregate(pipeline))
+            logger.info("Fetched orders with customer names successfully.")
+            return {"status": "success", "orders": orders}
+        except Exception as err:
+            logger.error(f"Error fetching orders with customer names: {err}")
+            return {"status": "error", "message": str(err)}
+
+    async def cancel_order(self, order_id):
+        """
+        Handles the cancellation of an order and updates product quantities.
+
+        :param order_id: The ID of the order to cancel.
+        """
+        try:
+            order = await self.db["Orders"].find_one({"_id": ObjectId(order_id)})
+            if not order:
+                logger.warning('[ Cancel Order ] Order not found.')
+                return {"status": "error", "message": "Order not found."}
+
+            # Give the quantities back to the stock
+            await asyncio.gather(*(
+                self.update_product_quantity(item.get("product_id"), item.get("quantity", 0))
+                for item in order.get("products", [])
+            ))
+
+            update_status = await self.db["Orders"].update_one(
+                {"_id": ObjectId(order_id)},
+                {"$set": {"status": "cancelled", "updated_at": datetime.now()}}
+            )
+            if update_status.modified_count > 0:
+                await self.notify("Orders", "update", [order_id])
+                logger.info(f"Order {order_id} cancelled successfully.")
+                return {"status": "success", "message": "Order cancelled and product quantities updated."}
+
+            return {"status": "error", "message": "Failed to update order status."}
+        except Exception as e:
+            logger.error(f"Error cancelling order: {e}")
+            return {"status": "error", "message": str(e)}
+
+    # *************************************************************
+    # Customer Methods
+    # *************************************************************
+    async def add_customer(self, first_name, last_name, email, phone, address, client_status):
+        """
+        Adds a new customer to the Customers collection.
+        """
+        customer = {
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": email,
+            "phone": phone,
+            "address": address,
+            "is_active": False,
+            "client_status": client_status
+        }
+        customer["search_keys"] = customer_search_keys(customer)
+        return await self.add_document("Customers", customer)
+
+    async def fetch_customers(self, query=None, projection=None, limit=0, sort=None):
+        """
+        Fetches customers from the Customers collection.
+        """
+        return await self.fetch_documents("Customers", query, projection, limit, sort)
+
+    async def fetch_customer_orders(self, customer_id):
+        """
+        Fetch all orders for a given customer ID.
+
+        :param customer_id: The ID of the customer.
+        :return: List of orders or an error message.
+        """
+        try:
+            projection = {"_id": 1, "order_date": 1, "status": 1, "total_price": 1}
+            orders = await self.find("Orders", {"customer_id": ObjectId(customer_id)}, projection)
+            logger.info(f"Fetch all orders for customer({customer_id})")
+            return {"status": "success", "orders": orders}
+        except Exception as e:
+            logger.error(f"Error fetching order for Customer({customer_id})\n{e}")
+            return {"status": "error", "message": str(e)}
+
+    # *************************************************************
+    #       => Statistics
+    # *************************************************************
+    async def aggregate_value(self, collection_name, pipeline, field, default=0):
+        """Return `field` of the first aggregation result, `default` when there is none."""
+        results = await self.db[collection_name].aggregate(pipeline).to_list(length=1)
+        return results[0][field] if results else default
+
+    async def generate_statistics(self):
+        """
+        Generate all required statistics for the dashboard widget, excluding cancelled orders.
+        The sub-queries are independent and run concurrently.
+
+        :return: Dictionary containing statistics for products, orders, and customers.
+        """
+        products = self.db["Products"]
+        orders = self.db["Orders"]
+        customers = self.db["Customers"]
+        try:
+            (
+                total_products, total_quantity, top_products,
+                total_orders, total_revenue, orders_by_status, top_customers,
+                total_customers, active_customers, trusted_customers,
+            ) = await asyncio.gather(
+                products.count_documents({}),
+                self.aggregate_value("Products", pipelines.TOTAL_QUANTITY_PIPELINE, "total_quantity"),
+                self.to_list(products.find({}, {"name": 1, "qte": 1}).sort("qte", -1).limit(5)),
+                orders.count_documents(pipelines.NOT_CANCELLED),
+                self.aggregate_value("Orders", pipelines.TOTAL_REVENUE_PIPELINE, "total_revenue", Decimal(0)),
+                self.to_list(orders.aggregate(pipelines.ORDERS_BY_STATUS_PIPELINE)),
+                self.to_list(orders.aggregate(pipelines.TOP_CUSTOMERS_PIPELINE)),
+                customers.count_documents({}),
+                customers.count_documents({"is_active": True}),
+                self.to_list(customers.find({"client_status": "trusted"}, {"first_name": 1, "last_name": 1}).limit(5)),
+            )
+
+            return {
+                "products": {
+                    "total_products": total_products,
+                    "total_quantity": total_quantity,
+                    "top_products": top_products,
+                },
+                "orders": {
+                    "total_orders": total_orders,
+                    "total_revenue": total_revenue,
+                    "orders_by_status": orders_by_status,
+                    "top_customers": top_customers,
+                },
+                "customers": {
+                    "total_customers": total_customers,
+                    "active_customers": active_customers,
+                    "trusted_customers": trusted_customers,
+                },
+            }
+        except Exception as e:
+            logger.error(f"Error generating statistics: {e}")
+            return {}
+
+
+if __name__ == "__main__":
+    import time
+
+    async def main():
+        handler = AsyncMongoDBHandler()
+        start = time.perf_counter()
+        statistics = await handler.generate_statistics()
+        logger.info(f"Statistics generated in {time.perf_counter() - start:.3f}s")
+        print(statistics)
+        handler.close()
+
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Shared BSON codec options (Decimal128 <-> Decimal)
+# ----------------------------------------------------------------------------
+from decimal import Decimal
+
+from bson.codec_options import CodecOptions, TypeCodec, TypeRegistry
+from bson.decimal128 import Decimal128
+from bson.raw_bson import RawBSONDocument
+
+
+class DecimalCodec(TypeCodec):
+    """
+    Prices and totals are stored as Decimal128 and used as Decimal in the
+    application: the driver converts them while encoding/decoding.
+    """
+    python_type = Decimal
+    bson_type = Decimal128
+
+    def transform_python(self, value):
+        return Decimal128(value)
+
+    def transform_bson(self, value):
+        return value.to_decimal()
+
+
+CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry([DecimalCodec()]))
+
+# Documents kept as raw bytes, a document is decoded on its first field access
+RAW_CODEC_OPTIONS = CODEC_OPTIONS.with_options(document_class=RawBSONDocument)
+
+
+if __name__ == "__main__":
+    # Benchmark: decode + hand-written conversion vs. decode with the codec
+    import time
+    import bson
+
+    from logger import logger
+
+    count = 200_000
+    payloads = [
+        bson.encode({"name": f"product {i}", "ref": f"REF-{i}", "price": Decimal128(f"{i}.50"), "qte": i})
+        for i in range(count)
+    ]
+
+    start = time.perf_counter()
+    for payload in payloads:
+        product = bson.decode(payload)
+        product["price"] = Decimal(product["price"].to_decimal())
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for payload in payloads:
+        product = bson.decode(payload, codec_options=CODEC_OPTIONS)
+    codec_time = time.perf_counter() - start
+
+    logger.info(f"decode + loop : {count / loop_time:,.0f} documents/s")
+    logger.info(f"decode (codec): {count / codec_time:,.0f} documents/s")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : The cart of the new order form and the checks of create_order
+# ----------------------------------------------------------------------------
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+
+
+class CartLine:
+    __slots__ = ("product_id", "name", "quantity", "price")
+
+    def __init__(self, product_id, name, quantity, price):
+        self.product_id = product_id
+        self.name = name
+        self.quantity = quantity
+        self.price = price      # the price when the product was added
+
+    @property
+    def amount(self):
+        return self.price * self.quantity
+
+
+class Cart:
+    """
+    The lines of a new order, one per product (adding a product again adds to its
+    quantity), with the prices read when the products were picked. The server checks
+    the whole cart at once when the order is created (MongoDBHandler.create_order).
+    """
+
+    def __init__(self):
+        self.lines = OrderedDict()      # product_id (str) => CartLine
+
+    def add(self, product, quantity=1):
+        """
+        :param product: {"_id", "name", "price", ...}
+        :return: The (new or merged) line.
+        """
+        product_id = str(product["_id"])
+        line = self.lines.get(product_id)
+        if line is None:
+            line = CartLine(product_id, product.get("name", "غير معروف"), quantity, Decimal(str(product["price"])))
+            self.lines[product_id] = line
+        else:
+            line.quantity += quantity
+        return line
+
+    def remove(self, product_id):
+        self.lines.pop(product_id, None)
+
+    def quantity(self, product_id):
+        line = self.lines.get(product_id)
+        return line.quantity if line is not None else 0
+
+    def row(self, product_id):
+        """The position of a line (its row in the cart table)."""
+        return list(self.lines).index(product_id)
+
+    @property
+    def total(self):
+        return sum((line.amount for line in self.lines.values()), Decimal(0))
+
+    def order_products(self):
+        """The products of create_order."""
+        return [{"product_id": line.product_id, "quantity": line.quantity} for line in self.lines.values()]
+
+    def expected_prices(self):
+        """The prices the clerk saw, checked by create_order."""
+        return {line.product_id: line.price for line in self.lines.values()}
+
+    def apply_prices(self, price_changes):
+        """
+        Take the current prices reported by create_order.
+        :param price_changes: [{"product_id", "expected", "current", ...}, ...]
+        """
+        for change in price_changes:
+            line = self.lines.get(change["product_id"])
+            if line is not None:
+                line.price = change["current"]
+
+    def clear(self):
+        self.lines.clear()
+
+    def __iter__(self):
+        return iter(self.lines.values())
+
+    def __len__(self):
+        return len(self.lines)
+
+
+# *************************************************************
+# create_order (MongoDBHandler and AsyncMongoDBHandler)
+# *************************************************************
+CART_PROJECTION = {"name": 1, "price": 1, "qte": 1}
+
+
+def cart_quantities(products):
+    """
+    :param products: [{"product_id": str, "quantity": int}, ...] (a product may appear twice).
+    :return: {product_id (str): total quantity}
+    """
+    quantities = {}
+    for product in products:
+        product_id = str(product["product_id"])
+        quantities[product_id] = quantities.get(product_id, 0) + product["quantity"]
+    return quantities
+
+
+def cart_query(quantities):
+    """The one $in query reading every product of the cart (with CART_PROJECTION)."""
+    return {"_id": {"$in": [ObjectId(product_id) for product_id in quantities]}}
+
+
+def check_cart(quantities, found, expected_prices=None):
+    """
+    Checks every line of an order against the products read by cart_query.
+
+    :param found: {product_id (str): product}
+    :param expected_prices: {product_id: price} the prices shown to the user (optional).
+    :return: {"missing": [ids], "stock": [{"product_id", "name", "quantity", "available"}],
+              "price_changes": [{"product_id", "name", "expected", "current"}]}
+    """
+    problems = {"missing": [], "stock": [], "price_changes": []}
+    for product_id, quantity in quantities.items():
+        product = found.get(product_id)
+        if product is None:
+            problems["missing"].append(product_id)
+            continue
+        available = product.get("qte", 0)
+        if quantity > available:
+            problems["stock"].append(
+                {"product_id": product_id, "name": product.get("name"), "quantity": quantity, "available": available}
+            )
+        if expected_prices and product_id in expected_prices and expected_prices[product_id] != product["price"]:
+            problems["price_changes"].append({
+                "product_id": product_id, "name": product.get("name"),
+                "expected": expected_prices[product_id], "current": product["price"],
+            })
+    return problems
+
+
+def problems_response(problems):
+    """The response of create_order for the problems of check_cart, None when there is none."""
+    if problems["missing"]:
+        return {"status": "error", "message": f"Product with ID {problems['missing'][0]} not found."}
+    if problems["stock"]:
+        line = problems["stock"][0]
+        return {
+            "status": "error",
+            "message": f"insufficient stock for product with ID {line['product_id']}. Available: {line['available']}"
+        }
+    if problems["price_changes"]:
+        return {"status": "warning", "message": "Prices changed.", "price_changes": problems["price_changes"]}
+    return None
+
+
+def new_order(customer_id, quantities, found, status, order_date=None, order_id=None):
+    """
+    The order document of checked lines, priced with the products read by cart_query.
+
+    :param order_id: The _id of the order, default the one given by the insert.
+    """
+    total_price = sum((found[product_id]["price"] * quantity for product_id, quantity in quantities.items()), 0)
+    order = {
+        "customer_id": ObjectId(customer_id),
+        "products": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in quantities.items()],
+        "status": status,
+        "order_date": order_date if order_date else datetime.now(),
+        "total_price": Decimal128(total_price),
+        "created_at": datetime.now(),
+        "updated_at": datetime.now()
+    }
+    if order_id is not None:
+        order["_id"] = ObjectId(order_id)
+    return order
+
+
+def decrement_stock(product_id, quantity, now):
+    """
+    (filter, update) taking `quantity` from a product only while its stock covers it:
+    a concurrent order that took the stock first makes it match nothing.
+    """
+    return (
+        {"_id": ObjectId(product_id), "qte": {"$gte": quantity}},
+        {"$inc": {"qte": -quantity}, "$set": {"updated_at": now}},
+    )
+
+
+def restore_stock(product_id, quantity, now):
+    """(filter, update) giving back a decrement_stock of an order that was not created."""
+    return {"_id": ObjectId(product_id)}, {"$inc": {"qte": quantity}, "$set": {"updated_at": now}}
+
+
+STOCK_CHANGED = {"status": "error", "message": "insufficient stock: the stock changed while the order was placed."}
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Batched decoding of query results into Arrow tables / NumPy arrays
+# ----------------------------------------------------------------------------
+from data_exporter import EXPORT_SCHEMAS, DECIMAL_SCALE, to_plain
+
+
+def column_types(collection_name, fields=None):
+    """
+    Resolve the type of each requested column.
+
+    :param collection_name: ( Products | Customers | Orders )
+    :param fields: Dict {field: type}, list of fields (types from EXPORT_SCHEMAS,
+                   "string" when unknown) or None (every exported field).
+    :return: Dict {field: type}
+    """
+    known = dict(EXPORT_SCHEMAS.get(collection_name, []))
+    if fields is None:
+        return known
+    if isinstance(fields, dict):
+        return dict(fields)
+    return {field: known.get(field, "string") for field in fields}
+
+
+def arrow_schema(types):
+    import pyarrow as pa
+
+    arrow_types = {
+        "string": pa.string(),
+        "json": pa.string(),
+        "decimal": pa.decimal128(38, DECIMAL_SCALE),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "datetime": pa.timestamp("ms"),
+    }
+    return pa.schema([(field, arrow_types[field_type]) for field, field_type in types.items()])
+
+
+def documents_to_arrow(documents, types, batch_size=10000):
+    """
+    Decode documents into an Arrow table, one record batch per `batch_size` documents.
+
+    :param documents: An iterable of documents (a cursor is read as it goes).
+    :param types: Dict {field: type} (see column_types).
+    :return: A pyarrow.Table
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("pyarrow is required for columnar results: pip install pyarrow")
+
+    schema = arrow_schema(types)
+    fields = list(types.items())
+    columns = [[] for _ in fields]
+    batches = []
+
+    def close_batch():
+        batches.append(pa.record_batch(columns, schema=schema))
+        for column in columns:
+            column.clear()
+
+    for document in documents:
+        for column, (field, field_type) in zip(columns, fields):
+            column.append(to_plain(document.get(field), field_type))
+        if len(columns[0]) >= batch_size:
+            close_batch()
+    if columns and columns[0]:
+        close_batch()
+
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def table_to_numpy(table):
+    """
+    Convert an Arrow table to {field: numpy array}; decimal columns become float64.
+    """
+    import pyarrow as pa
+
+    arrays = {}
+    for name in table.column_names:
+        column = table.column(name)
+        if pa.types.is_decimal(column.type):
+            column = column.cast(pa.float64())
+        arrays[name] = column.to_numpy()
+    return arrays
+
+
+# *************************************************************
+#       => Vectorized statistics
+# *************************************************************
+def order_totals(table):
+    """
+    Revenue and number of orders per status (cancelled orders excluded from the revenue).
+
+    :param table: Orders table with the `status` and `total_price` columns.
+    :return: {"total_revenue": Decimal, "orders_by_status": [{"_id": status, "count": n}, ...]}
+    """
+    import pyarrow.compute as pc
+
+    not_cancelled = table.filter(pc.not_equal(table["status"], "cancelled"))
+    total_revenue = pc.sum(not_cancelled["total_price"]).as_py() or 0
+    orders_by_status = [
+        {"_id": entry["values"], "count": entry["counts"]}
+        for entry in pc.value_counts(not_cancelled["status"]).to_pylist()
+    ]
+    return {"total_revenue": total_revenue, "orders_by_status": orders_by_status}
+
+
+def quantity_histogram(table, bins=10):
+    """
+    Histogram of the product quantities in stock.
+
+    :param table: Products table with the `qte` column.
+    :return: (counts, bin_edges) as returned by numpy.histogram.
+    """
+    import numpy as np
+
+    quantities = table["qte"].fill_null(0).to_numpy()
+    return np.histogram(quantities, bins=bins)
+
+
+if __name__ == "__main__":
+    # Benchmark against the dict path on a seeded database:
+    #   python pipelines.py --orders 5000000 --limits 50
+    #   python columnar.py --database elSel3a_benchmark
+    import argparse
+    import time
+    from decimal import Decimal
+
+    from logger import logger
+    from mongo_handler import MongoDBHandler
+
+    parser = argparse.ArgumentParser(description="Compare the dict and columnar paths for order statistics.")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection URI")
+    parser.add_argument("--database", default="elSel3a_benchmark", help="database name")
+    args = parser.parse_args()
+
+    handler = MongoDBHandler(uri=args.uri, database=args.database)
+    fields = ["status", "total_price"]
+
+    start = time.perf_counter()
+    total_revenue, orders_by_status = Decimal(0), {}
+    for order in handler.iter_documents("Orders", projection={field: 1 for field in fields}):
+        if order.get("status") != "cancelled":
+            total_revenue += order.get("total_price") or 0
+            orders_by_status[order.get("status")] = orders_by_status.get(order.get("status"), 0) + 1
+    logger.info(f"dict path    : {time.perf_counter() - start:.2f}s (revenue {total_revenue})")
+
+    start = time.perf_counter()
+    response = handler.fetch_columnar("Orders", fields=fields)
+    decoded = time.perf_counter()
+    totals = order_totals(response["data"])
+    logger.info(f"columnar path: {time.perf_counter() - start:.2f}s "
+                f"({decoded - start:.2f}s decode, revenue {totals['total_revenue']})")
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Streaming export of Orders/Products/Customers to CSV and Parquet
+# ----------------------------------------------------------------------------
+import csv
+import json
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+
+from logger import logger
+
+# Exported columns and their type for each collection
+EXPORT_SCHEMAS = {
+    "Products": [
+        ("_id", "string"), ("name", "string"), ("ref", "string"), ("description", "string"),
+        ("price", "decimal"), ("qte", "int"), ("category", "string"), ("supplier", "string"),
+        ("is_active", "bool"), ("created_at", "datetime"), ("updated_at", "datetime"),
+    ],
+    "Customers": [
+        ("_id", "string"), ("first_name", "string"), ("last_name", "string"), ("phone", "string"),
+        ("email", "string"), ("address", "string"), ("is_active", "bool"), ("client_status", "string"),
+        ("created_at", "datetime"), ("updated_at", "datetime"),
+    ],
+    "Orders": [
+        ("_id", "string"), ("customer_id", "string"), ("order_date", "datetime"), ("status", "string"),
+        ("total_price", "decimal"), ("products", "json"), ("created_at", "datetime"), ("updated_at", "datetime"),
+    ],
+}
+
+# The field the date-range filter applies to
+DATE_FIELDS = {"Products": "created_at", "Customers": "created_at", "Orders": "order_date"}
+
+DECIMAL_SCALE = 4
+
+
+def to_plain(value, field_type):
+    """
+    Convert a BSON value to a plain Python value of the given export type.
+    """
+    if value is None:
+        return None
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if field_type == "string":
+        return str(value)
+    if field_type == "decimal":
+        return Decimal(value).quantize(Decimal(1).scaleb(-DECIMAL_SCALE))
+    if field_type == "json":
+        return json.dumps(value, default=str, ensure_ascii=False)
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+class DataExporter:
+    """
+    Streams a collection through a projected cursor and writes it to CSV
+    or Parquet, one batch at a time.
+    """
+
+    def __init__(self, db_handler, batch_size=10000):
+        """
+        :param db_handler: A connected MongoDBHandler instance.
+        :param batch_size: Number of documents per cursor round trip and per Parquet row group.
+        """
+        self.db_handler = db_handler
+        self.batch_size = batch_size
+
+    @staticmethod
+    def build_query(collection_name, start_date=None, end_date=None, status=None):
+        """
+        Build the export filter.
+
+        :param collection_name: ( Products | Customers | Orders )
+        :param start_date: Include documents from this date (datetime or date).
+        :param end_date: Include documents up to this date, inclusive.
+        :param status: Order status (Orders only).
+        """
+        query = {}
+        date_range = {}
+        if start_date:
+            date_range["$gte"] = datetime.combine(start_date, datetime.min.time())
+        if end_date:
+            date_range["$lt"] = datetime.combine(end_date, datetime.min.time()) + timedelta(days=1)
+        if date_range:
+            query[DATE_FIELDS[collection_name]] = date_range
+        if status and collection_name == "Orders":
+            query["status"] = status
+        return query
+
+    def iter_rows(self, collection_name, query=None):
+        """
+        Yield the export rows (lists of plain values) of a collection.
+        """
+        schema = EXPORT_SCHEMAS[collection_name]
+        projection = {field: 1 for field, _ in schema}
+        documents = self.db_handler.iter_documents(
+            collection_name, query=query, projection=projection, batch_size=self.batch_size
+        )
+        for document in documents:
+            yield [to_plain(document.get(field), field_type) for field, field_type in schema]
+
+    def export(self, collection_name, path, query=None, progress_callback=None):
+        """
+        Export a collection to `path`; the format is taken from the extension (.csv | .parquet).
+
+        :param collection_name: ( Products | Customers | Orders )
+        :param path: The output file.
+        :param query: Filter criteria (see build_query).
+        :param progress_callback: Optional callable(exported_rows) called after each batch.
+        :return: A dictionary with the status and the number of exported rows.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        try:
+            if collection_name not in EXPORT_SCHEMAS:
+                raise ValueError(f"Unknown collection: {collection_name}")
+            if extension == ".csv":
+                count = self._write_csv(collection_name, path, query, progress_callback)
+            elif extension == ".parquet":
+                count = self._write_parquet(collection_name, path, query, progress_callback)
+            else:
+                raise ValueError(f"Unsupported export format: {extension}")
+        except Exception as err:
+            logger.error(f"Error exporting {collection_name} to {path}: {err}")
+            return {"status": "error", "message": str(err)}
+
+        logger.info(f"Exported {count} documents from {collection_name} to {path}.")
+        return {"status": "success", "count": count}
+
+    def _write_csv(self, collection_name, path, query, progress_callback):
+        count = 0
+        # utf-8-sig so that spreadsheet software opens the Arabic text correctly
+        with open(path, "w", newline="", encoding="utf-8-sig") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow([field for field, _ in EXPORT_SCHEMAS[collection_name]])
+            for row in self.iter_rows(collection_name, query):
+                writer.writerow(["" if value is None else value for value in row])
+                count += 1
+                if progress_callback and count % self.batch_size == 0:
+                    progress_callback(count)
+        return count
+
+    def _write_parquet(self, collection_name, path, query, progress_callback):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required to export .parquet files: pip install pyarrow")
+
+        arrow_types = {
+            "string": pa.string(),
+            "json": pa.string(),
+            "decimal": pa.decimal128(38, DECIMAL_SCALE),
+            "int": pa.int64(),
+            "bool": pa.bool_(),
+            "datetime": pa.timestamp("ms"),
+        }
+        schema_fields = EXPORT_SCHEMAS[collection_name]
+        schema = pa.schema([(field, arrow_types[field_type]) for field, field_type in schema_fields])
+
+        count = 0
+        columns = [[] for _ in schema_fields]
+
+        with pq.ParquetWriter(path, schema) as writer:
+            def write_batch():
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+                for column in columns:
+                    column.clear()
+
+            for row in self.iter_rows(collection_name, query):
+                for column, value in zip(columns, row):
+                    column.append(value)
+                count += 1
+                # One row group per batch keeps the memory constant
+                if count % self.batch_size == 0:
+                    write_batch()
+                    if progress_callback:
+                        progress_callback(count)
+
+            if columns[0]:
+                write_batch()
+
+        return count
+
+
+if __name__ == "__main__":
+    import argparse
+    from mongo_handler import MongoDBHandler
+
+    def parse_date(value):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+
+    parser = argparse.ArgumentParser(description="Export a collection to CSV or Parquet.")
+    parser.add_argument("collection", choices=list(EXPORT_SCHEMAS), help="collection to export")
+    parser.add_argument("path", help="output file (.csv or .parquet)")
+    parser.add_argument("--from", dest="start_date", type=parse_date, help="start date YYYY-MM-DD")
+    parser.add_argument("--to", dest="end_date", type=parse_date, help="end date YYYY-MM-DD (inclusive)")
+    parser.add_argument("--status", help="order status (Orders only)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="documents per batch (default: 10000)")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection URI")
+    parser.add_argument("--database", default="elSel3a", help="database name")
+    args = parser.parse_args()
+
+    exporter = DataExporter(MongoDBHandler(uri=args.uri, database=args.database), batch_size=args.batch_size)
+    query = exporter.build_query(args.collection, args.start_date, args.end_date, args.status)
+    response = exporter.export(
+        args.collection, args.path, query=query,
+        progress_callback=lambda count: logger.info(f"{count} rows exported")
+    )
+    raise SystemExit(0 if response["status"] == "success" else 1)
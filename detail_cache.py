@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : LRU of the documents shown in the details dock
+# ----------------------------------------------------------------------------
+from collections import OrderedDict
+
+from bson.objectid import ObjectId
+
+from logger import logger
+
+
+def project(document, exclude):
+    """The document without the `exclude` fields (an exclusion projection applied locally)."""
+    return {key: value for key, value in document.items() if key not in exclude}
+
+
+class DetailCache:
+    """
+    Full documents keyed by (collection, _id). Every change of a document (local
+    write or change stream) drops it, the next read fetches it again.
+    The selected row of a table is prefetched, so the details open without a query;
+    a prefetch read off the GUI thread is dropped if a change arrived meanwhile.
+    """
+
+    def __init__(self, db_handler, size=100):
+        """
+        :param db_handler: MongoDBHandler.
+        :param size: Maximum number of cached documents.
+        """
+        self.db_handler = db_handler
+        self.size = size
+        self.documents = OrderedDict()      # (collection, _id) => document
+        self.changes = 0                    # number of changes seen (see prefetched)
+
+    def cached(self, collection_name, document_id):
+        """The cached document or None (no query)."""
+        key = (collection_name, ObjectId(document_id))
+        document = self.documents.get(key)
+        if document is not None:
+            self.documents.move_to_end(key)
+        return document
+
+    def get(self, collection_name, document_id):
+        """
+        The full document, from the cache or fetched.
+
+        :param collection_name: Products | Customers | Orders (with its customer_name).
+        :return: {"status": "success", "document": ...} | {"status": "error", "message": ...}
+        """
+        document = self.cached(collection_name, document_id)
+        if document is not None:
+            return {"status": "success", "document": document}
+        return self.fetch(collection_name, document_id)
+
+    def prefetch(self, collection_name, document_id):
+        """Load a document ahead of its details (nothing is done if it is cached)."""
+        if ObjectId.is_valid(document_id) and self.cached(collection_name, document_id) is None:
+            self.prefetched(collection_name, document_id, self.changes, self.read(collection_name, document_id))
+
+    def fetch(self, collection_name, document_id):
+        """One query for the document, stored in the cache."""
+        response = self.read(collection_name, document_id)
+        if response["status"] == "success":
+            self.store(collection_name, response["document"])
+        return response
+
+    def read(self, collection_name, document_id, cache=True):
+        """
+        Query the document without storing it.
+
+        :param cache: False from a worker thread (the query cache belongs to the GUI thread).
+        """
+        query = {"_id": ObjectId(document_id)}
+        if collection_name == "Orders":
+            response = self.db_handler.fetch_orders_with_customer_names(query=query, cache=cache)
+            return self.first_document(response, response.get("orders"))
+        response = self.db_handler.fetch_documents(collection_name=collection_name, query=query, cache=cache)
+        return self.first_document(response, response.get("documents"))
+
+    async def read_async(self, async_handler, collection_name, document_id):
+        """Same as read, with the AsyncMongoDBHandler."""
+        query = {"_id": ObjectId(document_id)}
+        if collection_name == "Orders":
+            response = await async_handler.fetch_orders_with_customer_names(query=query)
+            return self.first_document(response, response.get("orders"))
+        response = await async_handler.fetch_documents(collection_name, query=query)
+        return self.first_document(response, response.get("documents"))
+
+    @staticmethod
+    def first_document(response, documents):
+        if response["status"] == "error":
+            return response
+        if not documents:
+            return {"status": "error", "message": "العنصر غير موجود"}
+        return {"status": "success", "document": documents[0]}
+
+    async def prefetch_async(self, async_handler, collection_name, document_id):
+        """prefetch without blocking the GUI: the query is awaited on the qasync loop."""
+        changes = self.changes
+        response = await self.read_async(async_handler, collection_name, document_id)
+        self.prefetched(collection_name, document_id, changes, response)
+
+    def prefetched(self, collection_name, document_id, changes, response):
+        """
+        The result of a prefetch read in the background.
+
+        :param changes: self.changes when the read started; the document is not stored
+                        if a change was seen since (it may be older than the change).
+        :param response: The response of read.
+        """
+        if response["status"] == "error":
+            logger.debug(f"Prefetch of {collection_name} {document_id} failed: {response['message']}")
+        elif changes == self.changes:
+            self.store(collection_name, response["document"])
+
+    def store(self, collection_name, document):
+        key = (collection_name, document["_id"])
+        self.documents[key] = document
+        self.documents.move_to_end(key)
+        while len(self.documents) > self.size:
+            self.documents.popitem(last=False)
+
+    def discard(self, collection_name, document_id):
+        self.documents.pop((collection_name, document_id), None)
+
+    def clear(self, collection_name):
+        for key in [key for key in self.documents if key[0] == collection_name]:
+            del self.documents[key]
+
+    def on_change(self, change):
+        """Change listener (MongoDBHandler.add_change_listener): forget the changed documents."""
+        self.changes += 1
+        collection_name = change["collection"]
+        if change["document_id"] is None or change["operation"] == "reload":
+            self.clear(collection_name)
+        else:
+            self.discard(collection_name, change["document_id"])
+        if collection_name == "Customers":
+            # The cached orders carry the customer names
+            self.clear("Orders")
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Background read of the document of the selected row (details dock)
+# ----------------------------------------------------------------------------
+from PyQt5 import QtCore
+
+
+class DetailPrefetcher(QtCore.QThread):
+    """
+    Reads one document for the DetailCache in a background thread and hands the
+    response to the GUI thread through the `fetched` signal (see DetailCache.prefetched).
+    Only without a local replica: its SQLite connection belongs to the GUI thread.
+    """
+
+    fetched = QtCore.pyqtSignal(str, str, int, object)    # collection, _id, changes, response
+
+    def __init__(self, detail_cache, collection_name, document_id, parent=None):
+        super().__init__(parent)
+        self.detail_cache = detail_cache
+        self.collection_name = collection_name
+        self.document_id = document_id
+        self.changes = detail_cache.changes     # read on the GUI thread, before the query
+
+    def run(self):
+        response = self.detail_cache.read(self.collection_name, self.document_id, cache=False)
+        self.fetched.emit(self.collection_name, self.document_id, self.changes, response)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Product filters (category, supplier, is_active, stock) and their counts
+# ----------------------------------------------------------------------------
+FACET_FIELDS = ("category", "supplier", "is_active")
+STOCK = "stock"
+
+# Stock ranges on qte: key => (label, min included, max excluded)
+STOCK_RANGES = {
+    "out": ("نفد", None, 1),
+    "low": ("أقل من 10", 1, 10),
+    "available": ("من 10 إلى 99", 10, 100),
+    "high": ("100 فأكثر", 100, None),
+}
+
+
+def _stock_query(key):
+    _, low, high = STOCK_RANGES[key]
+    condition = {}
+    if low is not None:
+        condition["$gte"] = low
+    if high is not None:
+        condition["$lt"] = high
+    return {"qte": condition}
+
+
+def _stock_expression(key):
+    # Same range as _stock_query, in an aggregation expression (qte must be a number)
+    _, low, high = STOCK_RANGES[key]
+    conditions = [{"$isNumber": "$qte"}]
+    if low is not None:
+        conditions.append({"$gte": ["$qte", low]})
+    if high is not None:
+        conditions.append({"$lt": ["$qte", high]})
+    return {"$and": conditions}
+
+
+def normalize_filters(filters):
+    """
+    The filter state as a hashable key (the cache key of the counts).
+
+    :param filters: {"category": [...], "supplier": [...], "is_active": [...], "stock": [range keys]}
+    """
+    return tuple(
+        (name, tuple(sorted(set((filters or {}).get(name) or []), key=repr)))
+        for name in FACET_FIELDS + (STOCK,)
+    )
+
+
+def filter_query(filters, exclude=None):
+    """
+    Build the products query of a filter state. Values of one facet are OR-ed,
+    the facets are AND-ed.
+
+    :param filters: The filter state (see normalize_filters).
+    :param exclude: A facet left out (its counts must not depend on its own selection).
+    :return: A MongoDB query (dict).
+    """
+    conditions = []
+    for name, values in normalize_filters(filters):
+        if name == exclude or not values:
+            continue
+        if name == STOCK:
+            ranges = [_stock_query(key) for key in values]
+            conditions.append(ranges[0] if len(ranges) == 1 else {"$or": ranges})
+        else:
+            conditions.append({name: {"$in": list(values)}})
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def facet_pipeline(filters):
+    """
+    One $facet aggregation returning the counts of every facet for a filter state.
+    """
+    facets = {}
+    for name in FACET_FIELDS:
+        facets[name] = [
+            {"$match": filter_query(filters, exclude=name)},
+            {"$group": {"_id": f"${name}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+    facets[STOCK] = [
+        {"$match": filter_query(filters, exclude=STOCK)},
+        {"$group": {
+            "_id": {"$switch": {
+                "branches": [{"case": _stock_expression(key), "then": key} for key in STOCK_RANGES],
+                "default": None,
+            }},
+            "count": {"$sum": 1},
+        }},
+    ]
+    return [{"$facet": facets}]
+
+
+def facet_counts(result):
+    """
+    Shape the $facet result: {facet: [(value, count), ...]}. Every stock range is
+    listed (in STOCK_RANGES order), documents without a value are not counted.
+    """
+    counts = {}
+    for name in FACET_FIELDS:
+        counts[name] = [(group["_id"], group["count"]) for group in result.get(name, []) if group["_id"] is not None]
+    stock = {group["_id"]: group["count"] for group in result.get(STOCK, [])}
+    counts[STOCK] = [(key, stock.get(key, 0)) for key in STOCK_RANGES]
+    return counts
+
+
+def count_replica(replica, filters):
+    """
+    The $facet counts computed by the local replica (offline mode): one grouped
+    count per facet and one count per stock range, on the indexed columns.
+
+    :param replica: LocalReplica.
+    :param filters: The filter state.
+    :return: The same result as the aggregation, before facet_counts.
+    """
+    result = {}
+    for name in FACET_FIELDS:
+        result[name] = replica.group_count("Products", name, filter_query(filters, exclude=name))
+
+    query = filter_query(filters, exclude=STOCK)
+    result[STOCK] = []
+    for key in STOCK_RANGES:
+        count = replica.count("Products", {"$and": [query, _stock_query(key)]} if query else _stock_query(key))
+        if count:
+            result[STOCK].append({"_id": key, "count": count})
+    return result
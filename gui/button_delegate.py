@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Item delegate painting a push button in every cell of a column
+# ----------------------------------------------------------------------------
+from PyQt5 import QtWidgets, QtCore
+
+
+class ButtonDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paints a button in each cell of its column (no widget per row) and emits
+    `clicked` with the model index of the clicked cell, so the row is always
+    the current one.
+    """
+    clicked = QtCore.pyqtSignal(QtCore.QModelIndex)
+
+    def __init__(self, text, icon, parent=None, icon_size=QtCore.QSize(20, 20)):
+        super().__init__(parent)
+        self.text = text
+        self.icon = icon            # created once, shared by every row
+        self.icon_size = icon_size
+        self.pressed = None         # QPersistentModelIndex of the pressed cell
+
+    def button_option(self, option, index):
+        button = QtWidgets.QStyleOptionButton()
+        button.rect = option.rect.adjusted(4, 4, -4, -4)
+        button.text = self.text
+        button.icon = self.icon
+        button.iconSize = self.icon_size
+        button.state = QtWidgets.QStyle.State_Enabled
+        if self.pressed is not None and self.pressed == index:
+            button.state |= QtWidgets.QStyle.State_Sunken
+        else:
+            button.state |= QtWidgets.QStyle.State_Raised
+        return button
+
+    def paint(self, painter, option, index):
+        widget = option.widget
+        style = widget.style() if widget is not None else QtWidgets.QApplication.style()
+        style.drawControl(QtWidgets.QStyle.CE_PushButton, self.button_option(option, index), painter, widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QtCore.QEvent.MouseButtonPress and event.button() == QtCore.Qt.LeftButton:
+            self.pressed = QtCore.QPersistentModelIndex(index)
+            return True
+        if event.type() == QtCore.QEvent.MouseButtonRelease and self.pressed is not None:
+            was_pressed = self.pressed == index
+            self.pressed = None
+            if was_pressed and option.rect.contains(event.pos()):
+                self.clicked.emit(index)
+            return True
+        return False
@@ -9,6 +9,7 @@
 from PyQt5 import QtWidgets, QtCore
 from gui.h_confirmDialog import Ui_Dialog
 from gui.h_addToCartDialog import Ui_AddToCart
+from gui.lookup_completer import LookupCompleter
 
 
 class ConfirmDialog(QtWidgets.QDialog):
@@ -35,13 +36,16 @@ class ConfirmDialog(QtWidgets.QDialog):
 
 
 class AddProductToCart(QtWidgets.QDialog):
-    def __init__(self, product_map):
+    def __init__(self, product_lookup):
+        """
+        :param product_lookup: lookup.ProductLookup (the recent products are listed,
+                               the others are searched by name/ref prefix while typing)
+        """
         super().__init__()
         self.ui = Ui_AddToCart()
         self.ui.setupUi(self)
 
-        self.product_map = product_map
-        self.selected_product = ''
+        self.selected_product = None
         self.qte = 0
 
         # Remove title bar
@@ -51,37 +55,35 @@ class AddProductToCart(QtWidgets.QDialog):
         # Set Focus
         self.setModal(True)
 
-        # Populate the combobox
-        self.ui.comboBoxProduct.clear()
-        for key in product_map.keys():
-            self.ui.comboBoxProduct.addItem(key)
+        # The combobox lists the recent products, the others are completed from the server
+        self.product_completer = LookupCompleter(self.ui.comboBoxProduct, product_lookup)
 
         # Callbacks
-        self.ui.comboBoxProduct.currentIndexChanged.connect(self.update_spinbox_qte)
+        self.product_completer.documentChanged.connect(self.update_spinbox_qte)
 
         self.ui.buttonConfirm.clicked.connect(self.return_values)
         self.ui.buttonCancel.clicked.connect(self.reject)
 
         # Initial setup
-        self.update_spinbox_qte()
+        self.update_spinbox_qte(self.product_completer.current_document())
 
-    def update_spinbox_qte(self):
+    def update_spinbox_qte(self, product):
         """
         Update the spinBox to fit the maximum Qte in database
-        This work with combo_box.currentIndexChanged
+        This work with the selection of a product
         """
-        selected_product = self.ui.comboBoxProduct.currentText()
-        if selected_product in self.product_map:
-            max_qte = self.product_map[selected_product]["qte"]
-            self.ui.spinBoxQte.setMaximum(max_qte)  # Set the maximum to available stock
+        if product is not None:
+            self.ui.spinBoxQte.setMaximum(product.get("qte", 0))  # Set the maximum to available stock
             self.ui.spinBoxQte.setValue(1)  # Reset to minimum value
 
     def return_values(self):
-        self.selected_product = self.ui.comboBoxProduct.currentText()
+        product = self.product_completer.current_document()
         qte = self.ui.spinBoxQte.value()
-        if qte == 0:
+        if product is None or qte == 0:
             self.reject()
         else:
+            self.selected_product = product
+            self.product_completer.remember()
             self.qte = qte
             self.accept()
 
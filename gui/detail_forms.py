@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Pool of the forms of the details dock (one per schema)
+# ----------------------------------------------------------------------------
+from PyQt5 import QtWidgets
+
+from utils import Utils
+
+
+class DetailForm:
+    """
+    A built form: its page, its QFormLayout (read by collect_form_data) and its editors by key.
+    """
+
+    def __init__(self, page, layout, editors):
+        self.page = page
+        self.layout = layout
+        self.editors = editors
+
+    def clear(self):
+        """Empty every editor (new item form)."""
+        for editor in self.editors.values():
+            if isinstance(editor, (QtWidgets.QSpinBox, QtWidgets.QDoubleSpinBox)):
+                editor.setValue(0)
+            elif isinstance(editor, QtWidgets.QComboBox):
+                editor.setCurrentIndex(0)
+            elif isinstance(editor, QtWidgets.QLineEdit):
+                editor.setText("")
+            editor.setEnabled(True)
+
+
+class DetailForms:
+    """
+    The widgets of a form are created the first time its schema (kind + fields) is
+    shown, then kept in a QStackedWidget: showing the form again only rebinds values.
+    """
+
+    def __init__(self, form_layout, parent):
+        """
+        :param form_layout: The QFormLayout of the details dock (self.ui.formLayout).
+        :param parent: The widget of the layout (self.ui.scrollAreaWidgetContents).
+        """
+        Utils.clear_details_form(form_layout)
+        self.stack = QtWidgets.QStackedWidget(parent)
+        form_layout.setWidget(0, QtWidgets.QFormLayout.SpanningRole, self.stack)
+        self.forms = {}         # (kind, fields) => DetailForm
+        self.current = None
+
+    def show(self, kind, fields, create_editor):
+        """
+        Show the form of a schema, built on first use.
+
+        :param kind: The kind of form ( details | create ), the editors differ.
+        :param fields: Tuple of (key, label) in display order.
+        :param create_editor: callable(parent, key) returning the editor of a field.
+        :return: The DetailForm.
+        """
+        schema = (kind, fields)
+        form = self.forms.get(schema)
+        if form is None:
+            page = QtWidgets.QWidget(self.stack)
+            layout = QtWidgets.QFormLayout(page)
+            layout.setContentsMargins(0, 0, 0, 0)
+            editors = {}
+            for row, (key, label) in enumerate(fields):
+                editor = create_editor(page, key)
+                key_label = Utils.create_label(page, f"label_{key}")
+                key_label.setText(label)
+                layout.setWidget(row, QtWidgets.QFormLayout.FieldRole, editor)
+                layout.setWidget(row, QtWidgets.QFormLayout.LabelRole, key_label)
+                editors[key] = editor
+            self.stack.addWidget(page)
+            form = self.forms[schema] = DetailForm(page, layout, editors)
+
+        if form is not self.current:
+            # The stack takes the size of its current page only
+            for other in self.forms.values():
+                policy = QtWidgets.QSizePolicy.Preferred if other is form else QtWidgets.QSizePolicy.Ignored
+                other.page.setSizePolicy(policy, policy)
+            self.stack.setCurrentWidget(form.page)
+            self.stack.adjustSize()
+            self.current = form
+        return form
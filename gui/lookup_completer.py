@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Editable combobox completed from a lookup (see lookup.py)
+# ----------------------------------------------------------------------------
+from PyQt5 import QtWidgets, QtCore, QtGui
+
+
+class LookupCompleter(QtCore.QObject):
+    """
+    Turns an editable QComboBox into an incremental picker: the combobox lists the
+    recent documents and the typed text is completed with a limited server query.
+    Items carry the document _id, a selection never depends on its label.
+    """
+    SEARCH_DELAY = 200     # ms without typing before the lookup runs
+
+    documentChanged = QtCore.pyqtSignal(object)    # the selected document or None
+
+    def __init__(self, combo_box, lookup):
+        """
+        :param combo_box: The QComboBox to complete.
+        :param lookup: ProductLookup | CustomerLookup (search, label, remember).
+        """
+        super().__init__(combo_box)
+        self.combo_box = combo_box
+        self.lookup = lookup
+        self.documents = {}     # _id => document of the listed and completed documents
+
+        combo_box.setEditable(True)
+        combo_box.setInsertPolicy(QtWidgets.QComboBox.NoInsert)
+
+        self.completer_model = QtGui.QStandardItemModel(self)
+        self.completer = QtWidgets.QCompleter(self.completer_model, self)
+        self.completer.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+        combo_box.setCompleter(self.completer)
+
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY)
+
+        self.search_timer.timeout.connect(self.search)
+        combo_box.lineEdit().textEdited.connect(lambda _: self.search_timer.start())
+        self.completer.activated[QtCore.QModelIndex].connect(
+            lambda index: self.select(self.documents[index.data(QtCore.Qt.UserRole)])
+        )
+        combo_box.currentIndexChanged.connect(lambda _: self.documentChanged.emit(self.current_document()))
+
+        self.reset()
+
+    def reset(self):
+        """List the recent documents only (no query)."""
+        self.combo_box.clear()
+        self.documents = {}
+        for document in self.lookup.search(""):
+            self.add_item(document)
+
+    def add_item(self, document):
+        self.documents[document["_id"]] = document
+        self.combo_box.addItem(self.lookup.label(document), document["_id"])
+
+    def search(self):
+        """Complete the typed text with the matching documents."""
+        self.completer_model.clear()
+        for document in self.lookup.search(self.combo_box.currentText()):
+            self.documents[document["_id"]] = document
+            item = QtGui.QStandardItem(self.lookup.label(document))
+            item.setData(document["_id"], QtCore.Qt.UserRole)
+            self.completer_model.appendRow(item)
+        if self.completer_model.rowCount():
+            self.completer.complete()
+
+    def select(self, document):
+        """Select a document in the combobox (added if it is not listed)."""
+        index = self.combo_box.findData(document["_id"])
+        if index == -1:
+            self.add_item(document)
+            index = self.combo_box.count() - 1
+        self.combo_box.setCurrentIndex(index)
+
+    def current_document(self):
+        """The selected document, None when the text does not match the selected item."""
+        index = self.combo_box.currentIndex()
+        if index == -1 or self.combo_box.itemText(index) != self.combo_box.currentText():
+            return None
+        return self.documents.get(self.combo_box.itemData(index))
+
+    def remember(self):
+        """The selected document was used: list it first next time."""
+        document = self.current_document()
+        if document is not None:
+            self.lookup.remember(document)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Filter sidebar of the products page (facets with their counts)
+# ----------------------------------------------------------------------------
+from PyQt5 import QtWidgets, QtCore
+
+from facets import FACET_FIELDS, STOCK, STOCK_RANGES
+
+FACET_TITLES = {
+    "category": "الفئة",
+    "supplier": "المورد",
+    "is_active": "الحالة",
+    STOCK: "المخزون",
+}
+
+
+def value_label(facet, value):
+    if facet == "is_active":
+        return "نشط" if value else "غير نشط"
+    if facet == STOCK:
+        return STOCK_RANGES[value][0]
+    return str(value)
+
+
+class ProductFilters(QtWidgets.QScrollArea):
+    """
+    One group of check boxes per facet, each labelled with its count.
+    `filtersChanged` is emitted with the new filter state when a box is toggled.
+    """
+    filtersChanged = QtCore.pyqtSignal(dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWidgetResizable(True)
+        self.setMinimumWidth(200)
+        self.setMaximumWidth(260)
+
+        container = QtWidgets.QWidget(self)
+        layout = QtWidgets.QVBoxLayout(container)
+        self.groups = {}        # facet => QVBoxLayout of its check boxes
+        self.checkboxes = {}    # facet => {value: QCheckBox}
+        for facet in FACET_FIELDS + (STOCK,):
+            group = QtWidgets.QGroupBox(FACET_TITLES[facet], container)
+            self.groups[facet] = QtWidgets.QVBoxLayout(group)
+            self.checkboxes[facet] = {}
+            layout.addWidget(group)
+
+        self.buttonClear = QtWidgets.QPushButton("إلغاء التصفية", container)
+        self.buttonClear.clicked.connect(self.clear)
+        layout.addWidget(self.buttonClear)
+        layout.addStretch()
+        self.setWidget(container)
+
+    def filters(self):
+        """The current filter state: {facet: [checked values]}."""
+        return {
+            facet: [value for value, checkbox in checkboxes.items() if checkbox.isChecked()]
+            for facet, checkboxes in self.checkboxes.items()
+        }
+
+    def set_counts(self, counts):
+        """
+        Show the counts of facet_counts(); checked values stay listed even without matches.
+        :counts: {facet: [(value, count), ...]}
+        """
+        for facet, values in counts.items():
+            checkboxes = self.checkboxes[facet]
+            values = dict(values)
+            for value, checkbox in list(checkboxes.items()):
+                if value not in values and not checkbox.isChecked():
+                    self.groups[facet].removeWidget(checkbox)
+                    checkbox.deleteLater()
+                    del checkboxes[value]
+
+            for value, count in values.items():
+                checkbox = checkboxes.get(value)
+                if checkbox is None:
+                    checkbox = QtWidgets.QCheckBox(self)
+                    checkbox.toggled.connect(self.emit_filters)
+                    self.groups[facet].addWidget(checkbox)
+                    checkboxes[value] = checkbox
+                checkbox.setText(f"{value_label(facet, value)} ({count})")
+            for value, checkbox in checkboxes.items():
+                if value not in values:
+                    checkbox.setText(f"{value_label(facet, value)} (0)")
+
+    def clear(self):
+        """Uncheck every box (one filtersChanged)."""
+        for checkboxes in self.checkboxes.values():
+            for checkbox in checkboxes.values():
+                checkbox.blockSignals(True)
+                checkbox.setChecked(False)
+                checkbox.blockSignals(False)
+        self.emit_filters()
+
+    def emit_filters(self):
+        self.filtersChanged.emit(self.filters())
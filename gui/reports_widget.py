@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : "Reports" tab of the statistics page (DuckDB over Parquet snapshots)
+# ----------------------------------------------------------------------------
+from PyQt5 import QtWidgets, QtCore
+
+from analytics import Analytics, REPORTS, write_snapshot
+from utils import Utils
+
+
+class ReportsWidget(QtWidgets.QWidget):
+    """
+    Parameterized reports computed from the last analytics snapshot,
+    the snapshot can be refreshed from here.
+    """
+
+    def __init__(self, db_handler, parent=None):
+        super().__init__(parent)
+        self.db_handler = db_handler
+        self.analytics = Analytics()
+
+        self.comboReport = QtWidgets.QComboBox(self)
+        for name, report in REPORTS.items():
+            self.comboReport.addItem(report["title"], name)
+
+        today = QtCore.QDate.currentDate()
+        self.dateFrom = QtWidgets.QDateEdit(today.addYears(-1), self)
+        self.dateTo = QtWidgets.QDateEdit(today, self)
+        for date_edit in (self.dateFrom, self.dateTo):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+        self.spinLimit = QtWidgets.QSpinBox(self)
+        self.spinLimit.setRange(1, 1000)
+        self.spinLimit.setValue(20)
+
+        self.buttonRun = QtWidgets.QPushButton("عرض", self)
+        self.buttonSnapshot = QtWidgets.QPushButton("تحديث البيانات", self)
+        self.labelStatus = QtWidgets.QLabel(self)
+        self.tableReport = QtWidgets.QTableWidget(self)
+        self.tableReport.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tableReport.verticalHeader().setVisible(False)
+
+        toolbar = QtWidgets.QHBoxLayout()
+        toolbar.addWidget(self.comboReport)
+        toolbar.addWidget(QtWidgets.QLabel("من", self))
+        toolbar.addWidget(self.dateFrom)
+        toolbar.addWidget(QtWidgets.QLabel("إلى", self))
+        toolbar.addWidget(self.dateTo)
+        toolbar.addWidget(QtWidgets.QLabel("العدد", self))
+        toolbar.addWidget(self.spinLimit)
+        toolbar.addWidget(self.buttonRun)
+        toolbar.addStretch()
+        toolbar.addWidget(self.buttonSnapshot)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(toolbar)
+        layout.addWidget(self.labelStatus)
+        layout.addWidget(self.tableReport)
+
+        self.comboReport.currentIndexChanged.connect(self.update_parameters)
+        self.buttonRun.clicked.connect(self.run_report)
+        self.buttonSnapshot.clicked.connect(self.create_snapshot)
+        self.update_parameters()
+
+    def update_parameters(self):
+        """Enable only the parameters of the selected report."""
+        params = REPORTS[self.comboReport.currentData()]["params"]
+        self.spinLimit.setEnabled("limit" in params)
+
+    def run_report(self):
+        response = self.analytics.run_report(
+            self.comboReport.currentData(),
+            start=self.dateFrom.date().toPyDate(),
+            end=self.dateTo.date().toPyDate(),
+            limit=self.spinLimit.value(),
+        )
+        if response["status"] != "success":
+            Utils.success_message(self.labelStatus, response["message"], success=False)
+            return
+
+        rows = [["" if value is None else value for value in row] for row in response["rows"]]
+        Utils.populate_table_widget(self.tableReport, rows, response["columns"])
+        Utils.success_message(
+            self.labelStatus,
+            f"{len(rows)} سطر في {response['elapsed_ms']:.0f} ms - بيانات {self.analytics.snapshot_date()}"
+        )
+
+    def create_snapshot(self):
+        """Write a new snapshot of the database (busy dialog, the total is unknown)."""
+        progress = QtWidgets.QProgressDialog("جاري تحديث بيانات التقارير...", None, 0, 0, self)
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.show()
+
+        def report_progress(count):
+            progress.setLabelText(f"تمت معالجة {count} طلبية")
+            QtWidgets.QApplication.processEvents()
+
+        response = write_snapshot(self.db_handler, self.analytics.directory, progress_callback=report_progress)
+        progress.close()
+
+        if response["status"] == "success":
+            Utils.success_message(self.labelStatus, f"تم تحديث بيانات التقارير ({response['count']} طلبية)")
+        else:
+            Utils.success_message(self.labelStatus, response["message"], success=False)
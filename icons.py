@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Icon registry: qtawesome icons rendered once and kept on disk
+# ----------------------------------------------------------------------------
+import hashlib
+import os
+
+from PyQt5 import QtGui
+
+from logger import logger
+
+ICON_CACHE_DIR = "icon_cache"
+
+_icons = {}         # (name, color) => QIcon
+_pixmaps = {}       # (name, color, width, height, mode, state) => QPixmap
+
+
+def cache_dir():
+    # Pixmaps of another qtawesome version may differ: one directory per version
+    import qtawesome
+    return os.path.join(ICON_CACHE_DIR, getattr(qtawesome, "__version__", "unknown"))
+
+
+def render(key, size, mode, state):
+    """
+    The pixmap of `key`: read from the disk cache, or drawn by qtawesome and saved.
+    qtawesome loads its fonts only when a pixmap is missing from the disk.
+    """
+    name, color = key[:2]
+    path = os.path.join(cache_dir(), hashlib.sha1(repr(key).encode()).hexdigest() + ".png")
+    pixmap = QtGui.QPixmap()
+    if pixmap.load(path):
+        return pixmap
+
+    import qtawesome as qta
+    pixmap = qta.icon(name, color=color).pixmap(size, mode, state)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pixmap.save(path, "PNG")
+    except OSError as err:
+        logger.warning(f"Could not cache the icon {name}: {err}")
+    return pixmap
+
+
+class CachedIconEngine(QtGui.QIconEngine):
+    """
+    Renders a pixmap the first time a (size, mode, state) is painted, then reuses it.
+    """
+
+    def __init__(self, name, color):
+        super().__init__()
+        self.name = name
+        self.color = color
+
+    def pixmap(self, size, mode, state):
+        key = (self.name, self.color, size.width(), size.height(), int(mode), int(state))
+        pixmap = _pixmaps.get(key)
+        if pixmap is None:
+            pixmap = _pixmaps[key] = render(key, size, mode, state)
+        return pixmap
+
+    def paint(self, painter, rect, mode, state):
+        painter.drawPixmap(rect, self.pixmap(rect.size(), mode, state))
+
+    def clone(self):
+        return CachedIconEngine(self.name, self.color)
+
+
+def icon(name, color="#ffffff"):
+    """
+    The shared QIcon of a qtawesome icon (same arguments as qta.icon(name, color=color)).
+    Nothing is drawn until the icon is painted.
+    """
+    key = (name, color)
+    cached = _icons.get(key)
+    if cached is None:
+        cached = _icons[key] = QtGui.QIcon(CachedIconEngine(name, color))
+    return cached
+
+
+if __name__ == "__main__":
+    # Benchmark: python icons.py (run twice: the second run reads the disk cache)
+    import sys
+    import time
+    from PyQt5 import QtCore, QtWidgets
+
+    app = QtWidgets.QApplication(sys.argv)
+    names = [("mdi6.clock-time-seven", "#ffffff"), ("mdi6.check-circle-outline", "#ffffff"),
+             ("mdi6.truck-outline", "#ffffff"), ("mdi6.delete-outline", "#e74c3c"), ("ph.plus", "#1abc9c")]
+    size = QtCore.QSize(30, 30)
+
+    start = time.perf_counter()
+    for name, color in names:
+        icon(name, color).pixmap(size)
+    logger.info(f"Registry, first paint of {len(names)} icons: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    import qtawesome as qta
+    start = time.perf_counter()
+    for name, color in names:
+        qta.icon(name, color=color).pixmap(size)
+    logger.info(f"qta.icon for the same icons: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    rows = 1000
+    start = time.perf_counter()
+    for _ in range(rows):
+        qta.icon("fa.trash", color="#EA2027").pixmap(QtCore.QSize(20, 20))
+    logger.info(f"Per row, qta.icon: {(time.perf_counter() - start) * 1e6 / rows:.1f} us")
+    start = time.perf_counter()
+    for _ in range(rows):
+        icon("fa.trash", "#EA2027").pixmap(QtCore.QSize(20, 20))
+    logger.info(f"Per row, registry: {(time.perf_counter() - start) * 1e6 / rows:.1f} us")
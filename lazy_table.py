@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Fill the rows of a QTableWidget only when they scroll into view
+# ----------------------------------------------------------------------------
+from PyQt5 import QtCore
+
+
+class LazyTableRows(QtCore.QObject):
+    """
+    Keeps one (raw) document per table row and creates the cells of a row the
+    first time it becomes visible. The table must not be sorted by the view:
+    row N always shows documents[N].
+    """
+
+    MARGIN = 20     # rows filled above and below the viewport
+
+    def __init__(self, table_widget, documents, fill_callback, parent=None, filled=None):
+        """
+        :param table_widget: The QTableWidget (its row count is set here).
+        :param documents: One document per row.
+        :param fill_callback: callable(rows, documents) that draws the given rows.
+        :param filled: One bool per row, True for the rows already drawn (default: none).
+        """
+        super().__init__(parent or table_widget)
+        self.table = table_widget
+        self.documents = list(documents)
+        self.filled = list(filled) if filled is not None else [False] * len(self.documents)
+        self.fill_callback = fill_callback
+
+        self.table.setRowCount(len(self.documents))
+        self.table.verticalScrollBar().valueChanged.connect(self.fill_visible)
+        self.table.viewport().installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QtCore.QEvent.Resize:
+            QtCore.QTimer.singleShot(0, self.fill_visible)
+        return False
+
+    def close(self):
+        """Stop following the table (before it is repopulated)."""
+        self.table.verticalScrollBar().valueChanged.disconnect(self.fill_visible)
+        self.table.viewport().removeEventFilter(self)
+        self.deleteLater()
+
+    def visible_rows(self):
+        row_count = self.table.rowCount()
+        first = self.table.rowAt(0)
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        first = 0 if first < 0 else first
+        last = row_count - 1 if last < 0 else last
+        return range(max(0, first - self.MARGIN), min(row_count, last + self.MARGIN + 1))
+
+    def fill_visible(self):
+        rows = [row for row in self.visible_rows() if not self.filled[row]]
+        if not rows:
+            return
+        self.fill_callback(rows, [self.documents[row] for row in rows])
+        for row in rows:
+            self.filled[row] = True
+
+    def find_row(self, document_id):
+        """Row of a document (by _id as a string), or None."""
+        for row, document in enumerate(self.documents):
+            if str(document.get("_id")) == document_id:
+                return row
+        return None
+
+    def remove_row(self, row, fill=True):
+        del self.documents[row]
+        del self.filled[row]
+        self.table.removeRow(row)
+        if fill:
+            self.fill_visible()
+
+    def set_document(self, row, document, fill=True):
+        """
+        Replace the document of a row; it is redrawn if visible.
+
+        :param fill: False leaves the drawing to the next fill_visible (batched changes).
+        """
+        self.documents[row] = document
+        self.filled[row] = False
+        if fill:
+            self.fill_visible()
+
+    def append(self, document, fill=True):
+        self.documents.append(document)
+        self.filled.append(False)
+        self.table.insertRow(self.table.rowCount())
+        if fill:
+            self.fill_visible()
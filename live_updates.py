@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Change stream watcher feeding live table updates, server ping of the replica sync
+# ----------------------------------------------------------------------------
+from PyQt5 import QtCore
+
+from logger import logger
+
+
+class ChangeStreamWatcher(QtCore.QThread):
+    """
+    Reads the MongoDB change stream in a background thread and hands every
+    change to the GUI thread through the `changed` signal.
+    """
+
+    changed = QtCore.pyqtSignal(dict)
+
+    RETRY_DELAY = 5000     # ms before reopening a broken stream
+
+    def __init__(self, db_handler, parent=None):
+        super().__init__(parent)
+        self.db_handler = db_handler
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            try:
+                for change in self.db_handler.watch_changes(should_stop=self.isInterruptionRequested):
+                    self.changed.emit(change)
+            except Exception as err:
+                logger.warning(f"Change stream interrupted: {err}")
+                self.msleep(self.RETRY_DELAY)
+
+    def stop(self):
+        """Ask the stream to close and wait for the thread to finish."""
+        self.requestInterruption()
+        self.wait()
+
+
+class ServerPing(QtCore.QThread):
+    """
+    Pings the server in a background thread (up to serverSelectionTimeoutMS while it is
+    unreachable) and hands the answer to the GUI thread through the `answered` signal.
+    """
+
+    answered = QtCore.pyqtSignal(bool)
+
+    def __init__(self, db_handler, parent=None):
+        super().__init__(parent)
+        self.db_handler = db_handler
+
+    def run(self):
+        self.answered.emit(self.db_handler.ping())
@@ -0,0 +1,992 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Local SQLite mirror of Products/Customers/Orders for offline reads
+# ----------------------------------------------------------------------------
+import calendar
+import json
+import re
+import sqlite3
+import struct
+from collections.abc import Mapping
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import bson
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+from logger import logger
+from bson_codecs import CODEC_OPTIONS, RAW_CODEC_OPTIONS
+from paging import keyset_query
+
+COLLECTIONS = ("Products", "Customers", "Orders")
+
+# Documents are re-read a little before the watermark: updated_at comes from
+# each client clock. A document read again unchanged is not reported (see upsert_documents).
+SYNC_OVERLAP = timedelta(minutes=1)
+
+# Fields copied from the BSON blob into indexed columns: the filters, sorts and
+# limits on them run in SQLite, the other conditions are matched in Python.
+INDEXED_FIELDS = {
+    "Products": ("ref", "name", "category", "supplier", "is_active", "price", "qte", "created_at", "updated_at"),
+    "Customers": ("first_name", "last_name", "phone", "email", "client_status", "is_active",
+                  "created_at", "updated_at"),
+    "Orders": ("customer_id", "status", "order_date", "total_price", "created_at", "updated_at"),
+}
+
+# Array fields: one row per element in the table "<collection>__<field>" (key, _id)
+KEY_FIELDS = {
+    "Customers": ("search_keys",),
+}
+
+SQL_OPERATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+MAX_SQL_VALUES = 900        # longer $in lists go through json_each (strings and numbers only)
+
+
+# *************************************************************
+# Query evaluation (the subset of the MongoDB language the app uses)
+# *************************************************************
+def get_field(document, path):
+    """Return the value of a dotted field path, or None if missing."""
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _compare(value, operator, operand):
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(operand, Decimal128):
+        operand = operand.to_decimal()
+    try:
+        if operator == "$gt": return value is not None and value > operand
+        if operator == "$gte": return value is not None and value >= operand
+        if operator == "$lt": return value is not None and value < operand
+        if operator == "$lte": return value is not None and value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator in local replica: {operator}")
+
+
+def _equals(value, operand):
+    if isinstance(value, list) and not isinstance(operand, list):
+        return operand in value
+    return value == operand
+
+
+def _match_condition(value, condition):
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return _equals(value, condition)
+
+    for operator, operand in condition.items():
+        if operator == "$eq":
+            matched = _equals(value, operand)
+        elif operator == "$ne":
+            matched = not _equals(value, operand)
+        elif operator == "$in":
+            matched = any(_equals(value, item) for item in operand)
+        elif operator == "$nin":
+            matched = not any(_equals(value, item) for item in operand)
+        elif operator == "$exists":
+            matched = (value is not None) == bool(operand)
+        elif operator == "$regex":
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            values = value if isinstance(value, list) else [value]   # an array matches by any element
+            matched = any(isinstance(item, str) and re.search(operand, item, flags) is not None for item in values)
+        elif operator == "$options":
+            continue
+        else:
+            matched = _compare(value, operator, operand)
+        if not matched:
+            return False
+    return True
+
+
+def match(document, query):
+    """Return True if the document matches the MongoDB query."""
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(match(document, sub_query) for sub_query in condition):
+                return False
+        elif key == "$and":
+            if not all(match(document, sub_query) for sub_query in condition):
+                return False
+        elif not _match_condition(get_field(document, key), condition):
+            return False
+    return True
+
+
+def project(document, projection):
+    """Apply an inclusion or exclusion projection (dict or list of fields)."""
+    if not projection:
+        return document
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    include_id = projection.get("_id", 1)
+    fields = {key: value for key, value in projection.items() if key != "_id" and value in (0, 1, True, False)}
+    if any(fields.values()):
+        projected = {key: document[key] for key in fields if key in document}
+    else:
+        projected = {key: value for key, value in document.items() if key not in fields}
+    if include_id and "_id" in document:
+        projected = {"_id": document["_id"], **projected}
+    else:
+        projected.pop("_id", None)
+    return projected
+
+
+def apply_update(document, update):
+    """Apply the $set and $inc operators of an update (top level fields) to a document."""
+    unsupported = set(update) - {"$set", "$inc"}
+    if unsupported:
+        raise ValueError(f"Unsupported update operators in local replica: {sorted(unsupported)}")
+    document.update(update.get("$set", {}))
+    for field, step in update.get("$inc", {}).items():
+        document[field] = document.get(field, 0) + step
+    return document
+
+
+def _sort_key(value):
+    # MongoDB order: null < numbers < strings < ... < dates
+    if value is None:
+        return (0, 0)
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(value, bool):
+        return (4, value)
+    if isinstance(value, (int, float, Decimal)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, ObjectId):
+        return (3, value.binary)
+    if isinstance(value, datetime):
+        return (5, value)
+    return (6, str(value))
+
+
+def _sort_value(document, field):
+    if isinstance(document, RawBSONDocument):
+        # Read the key from a temporary decoding: the raw document stays undecoded
+        document = bson.decode(document.raw, codec_options=CODEC_OPTIONS)
+    return _sort_key(get_field(document, field))
+
+
+def sort_documents(documents, sort):
+    """Sort documents in place like cursor.sort([(field, direction), ...])."""
+    for field, direction in reversed(list(sort.items() if isinstance(sort, dict) else sort)):
+        documents.sort(key=lambda document: _sort_value(document, field), reverse=direction < 0)
+    return documents
+
+
+# *************************************************************
+# Indexed columns
+# *************************************************************
+# SQLite orders NULL < numbers < text < blobs. Values keep that order and the
+# blobs start with a type byte, so the columns sort like MongoDB sorts BSON types:
+# null < numbers < strings < ObjectId < bool < date.
+OBJECT_ID, BOOLEAN, DATE, OTHER = 3, 4, 5, 6
+EPOCH = datetime(1970, 1, 1)
+
+
+def column_value(value):
+    """The SQLite value of an indexed field."""
+    if value is None:
+        return None
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    if isinstance(value, bool):
+        return bytes((BOOLEAN, value))
+    if isinstance(value, int):
+        return value if -2 ** 63 <= value < 2 ** 63 else float(value)
+    if isinstance(value, (float, Decimal)):
+        return float(value)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, ObjectId):
+        return bytes((OBJECT_ID,)) + value.binary
+    if isinstance(value, datetime):
+        # BSON dates are milliseconds since the epoch
+        milliseconds = calendar.timegm(value.utctimetuple()) * 1000 + value.microsecond // 1000
+        return bytes((DATE,)) + struct.pack(">Q", milliseconds + 2 ** 63)
+    return bytes((OTHER,)) + str(value).encode()
+
+
+def python_value(value):
+    """The field value of an indexed column (numbers are read back as int or float)."""
+    if not isinstance(value, bytes):
+        return value
+    kind, data = value[0], value[1:]
+    if kind == OBJECT_ID:
+        return ObjectId(data)
+    if kind == BOOLEAN:
+        return bool(data[0])
+    if kind == DATE:
+        return EPOCH + timedelta(milliseconds=struct.unpack(">Q", data)[0] - 2 ** 63)
+    return data.decode()
+
+
+def _type_bounds(value):
+    """The (lowest, highest excluded) column values of the BSON type of `value`."""
+    if isinstance(value, (Decimal128, Decimal, float)) or (isinstance(value, int) and not isinstance(value, bool)):
+        return float("-inf"), ""
+    if isinstance(value, str):
+        return "", b""
+    for kind, python_type in ((OBJECT_ID, ObjectId), (BOOLEAN, bool), (DATE, datetime)):
+        if isinstance(value, python_type):
+            return bytes((kind,)), bytes((kind + 1,))
+    return None
+
+
+def literal_prefix(pattern):
+    """The text a regex such as "^abc" or re.escape'd prefixes match at the start, None otherwise."""
+    if not isinstance(pattern, str) or not pattern.startswith("^"):
+        return None
+    prefix, escaped = [], False
+    for char in pattern[1:]:
+        if escaped:
+            if char.isalnum():      # \d, \w... are classes
+                return None
+            prefix.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in ".^$*+?{}[]|()":
+            return None
+        else:
+            prefix.append(char)
+    return None if escaped else "".join(prefix)
+
+
+def _prefix_end(prefix):
+    """The smallest string greater than every string starting with `prefix`."""
+    last = ord(prefix[-1]) + 1
+    if 0xD800 <= last < 0xE000:
+        last = 0xE000
+    return prefix[:-1] + chr(last) if last <= 0x10FFFF else None
+
+
+def _is_scalar(value):
+    return not isinstance(value, (dict, list, tuple, set, re.Pattern))
+
+
+def _conjunction(clauses):
+    return " AND ".join(clauses) if clauses else "1"
+
+
+def _values_sql(values, params):
+    """The "(?, ?, ...)" of an IN list, appending its parameters."""
+    if len(values) > MAX_SQL_VALUES and all(isinstance(value, (str, int, float)) for value in values):
+        params.append(json.dumps(values))
+        return "(SELECT value FROM json_each(?))"
+    params.extend(values)
+    return f"({', '.join('?' * len(values))})"
+
+
+def _operator_sql(column, operator, operand, options=""):
+    """
+    (sql, params) of one operator applied to an indexed column, None when SQLite
+    cannot evaluate it the way MongoDB does.
+    """
+    params = []
+    if operator == "$eq":
+        if not _is_scalar(operand):
+            return None
+        if operand is None:
+            return f"{column} IS NULL", params
+        return f"{column} = ?", [column_value(operand)]
+    if operator == "$ne":
+        if not _is_scalar(operand):
+            return None
+        if operand is None:
+            return f"{column} IS NOT NULL", params
+        return f"({column} IS NULL OR {column} != ?)", [column_value(operand)]
+    if operator in ("$in", "$nin"):
+        if not isinstance(operand, (list, tuple, set)) or not all(_is_scalar(item) for item in operand):
+            return None
+        with_null = any(item is None for item in operand)
+        values = [column_value(item) for item in operand if item is not None]
+        found = [f"{column} IN {_values_sql(values, params)}"] if values else []
+        if operator == "$in":
+            if with_null:
+                found.append(f"{column} IS NULL")
+            return f"({' OR '.join(found) or '0'})", params
+        if with_null:
+            return f"({column} IS NOT NULL{' AND NOT ' + found[0] if found else ''})", params
+        return (f"({column} IS NULL OR NOT {found[0]})" if found else "1"), params
+    if operator == "$exists":
+        return f"{column} IS {'NOT ' if operand else ''}NULL", params
+    if operator in SQL_OPERATORS:
+        bounds = _type_bounds(operand)
+        if bounds is None:
+            return None
+        # Range operators only match values of the operand type
+        low, high = bounds
+        sql = f"{column} {SQL_OPERATORS[operator]} ?"
+        if operator in ("$gt", "$gte"):
+            return f"{sql} AND {column} < ?", [column_value(operand), high]
+        return f"{sql} AND {column} >= ?", [column_value(operand), low]
+    if operator == "$regex":
+        prefix = literal_prefix(operand)
+        if prefix is None or options:
+            return None
+        end = _prefix_end(prefix) if prefix else b""
+        if end is None:
+            return None
+        return f"{column} >= ? AND {column} < ?", [prefix, end]
+    return None
+
+
+class LocalReplica:
+    """
+    A SQLite (WAL) mirror of the MongoDB collections.
+
+    Every document is stored as its BSON encoding, so values round-trip with
+    the same types MongoDBHandler returns (ObjectId, Decimal, datetime).
+    Writes made while the server is unreachable are kept in `pending_writes`.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path of the SQLite file (created if missing).
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for collection in COLLECTIONS:
+                self.connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{collection}" (_id TEXT PRIMARY KEY, doc BLOB NOT NULL)'
+                )
+                self.create_indexed_columns(collection)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state (collection TEXT PRIMARY KEY, watermark TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS pending_writes "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, method TEXT NOT NULL, payload BLOB NOT NULL, created_at TEXT)"
+            )
+        logger.info(f"Local replica opened at {path}.")
+
+    def create_indexed_columns(self, collection):
+        """
+        Adds the INDEXED_FIELDS columns and KEY_FIELDS tables missing from a replica
+        file, fills them from the stored documents, then indexes them on (field, _id).
+        """
+        columns = {row[1] for row in self.connection.execute(f'PRAGMA table_info("{collection}")')}
+        fields = INDEXED_FIELDS.get(collection, ())
+        added = [field for field in fields if field not in columns]
+        for field in added:
+            # No declared type: values are stored and compared as given (see column_value)
+            self.connection.execute(f'ALTER TABLE "{collection}" ADD COLUMN "{field}"')
+
+        key_tables = [f"{collection}__{field}" for field in KEY_FIELDS.get(collection, ())]
+        new_tables = [
+            table for table in key_tables
+            if self.connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone() is None
+        ]
+        for table in key_tables:
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (key, _id TEXT NOT NULL)')
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_key" ON "{table}" (key, _id)')
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}__id" ON "{table}" (_id)')
+
+        if added or new_tables:
+            rows = self.connection.execute(f'SELECT _id, doc FROM "{collection}"').fetchall()
+            if rows:
+                logger.info(f"Local replica: indexing {len(rows)} {collection} documents.")
+                self.write_indexed_columns(
+                    collection, [bson.decode(doc, codec_options=CODEC_OPTIONS) for _, doc in rows]
+                )
+        for field in fields:
+            self.connection.execute(
+                f'CREATE INDEX IF NOT EXISTS "{collection}_{field}" ON "{collection}" ("{field}", _id)'
+            )
+
+    def write_indexed_columns(self, collection, documents):
+        """Copies the indexed fields of stored documents into their columns and key tables."""
+        fields = INDEXED_FIELDS.get(collection, ())
+        if fields:
+            assignments = ", ".join(f'"{field}" = ?' for field in fields)
+            self.connection.executemany(
+                f'UPDATE "{collection}" SET {assignments} WHERE _id = ?',
+                ([column_value(get_field(document, field)) for field in fields] + [str(document["_id"])]
+                 for document in documents)
+            )
+        self.write_keys(collection, documents)
+
+    def write_keys(self, collection, documents):
+        """Replaces the KEY_FIELDS rows of the documents (one row per array element)."""
+        for field in KEY_FIELDS.get(collection, ()):
+            table = f"{collection}__{field}"
+            self.connection.executemany(
+                f'DELETE FROM "{table}" WHERE _id = ?', ((str(document["_id"]),) for document in documents)
+            )
+            rows = []
+            for document in documents:
+                values = get_field(document, field)
+                values = values if isinstance(values, list) else [values]
+                rows.extend(
+                    (column_value(value), str(document["_id"])) for value in set(
+                        value for value in values if value is not None and _is_scalar(value)
+                    )
+                )
+            self.connection.executemany(f'INSERT INTO "{table}" (key, _id) VALUES (?, ?)', rows)
+
+    # *************************************************************
+    # Synchronization
+    # *************************************************************
+    def get_watermark(self, collection):
+        row = self.connection.execute(
+            "SELECT watermark FROM sync_state WHERE collection = ?", (collection,)
+        ).fetchone()
+        return datetime.fromisoformat(row[0]) if row and row[0] else None
+
+    def upsert_documents(self, collection, documents):
+        """
+        Insert or replace documents in the local mirror. A document identical to its
+        stored copy (e.g. read again in the sync overlap) is left untouched.
+
+        :return: {_id (str): "insert" | "update"} of the documents that changed.
+        """
+        encoded = {
+            str(document["_id"]): (document, bson.encode(document, codec_options=CODEC_OPTIONS))
+            for document in documents
+        }
+        ids = list(encoded)
+        stored = {}
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            stored.update(self.connection.execute(
+                f'SELECT _id, doc FROM "{collection}" WHERE _id IN ({", ".join("?" * len(chunk))})', chunk
+            ))
+        changed = [(_id, document, blob) for _id, (document, blob) in encoded.items() if stored.get(_id) != blob]
+        if not changed:
+            return {}
+
+        fields = INDEXED_FIELDS.get(collection, ())
+        columns = "".join(f', "{field}"' for field in fields)
+        with self.connection:
+            self.connection.executemany(
+                f'INSERT OR REPLACE INTO "{collection}" (_id, doc{columns}) VALUES (?, ?{", ?" * len(fields)})',
+                (
+                    [_id, blob] + [column_value(get_field(document, field)) for field in fields]
+                    for _id, document, blob in changed
+                )
+            )
+            self.write_keys(collection, [document for _, document, _ in changed])
+        return {_id: "update" if _id in stored else "insert" for _id, _, _ in changed}
+
+    def delete_documents(self, collection, document_ids):
+        """
+        Remove documents from the local mirror.
+
+        :return: The set of ids (as strings) that were in the mirror.
+        """
+        ids = list({str(document_id) for document_id in document_ids})
+        existing = set()
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            existing.update(row[0] for row in self.connection.execute(
+                f'SELECT _id FROM "{collection}" WHERE _id IN ({", ".join("?" * len(chunk))})', chunk
+            ))
+        rows = [(_id,) for _id in existing]
+        with self.connection:
+            self.connection.executemany(f'DELETE FROM "{collection}" WHERE _id = ?', rows)
+            for field in KEY_FIELDS.get(collection, ()):
+                self.connection.executemany(f'DELETE FROM "{collection}__{field}" WHERE _id = ?', rows)
+        return existing
+
+    def sync(self, db, reconcile=False, overlap=SYNC_OVERLAP, batch_size=5000):
+        """
+        Pull the documents changed since the last sync (by `updated_at` watermark).
+
+        :param db: The pymongo Database to read from.
+        :param reconcile: Also drop local documents that no longer exist on the server.
+        :param overlap: How far before the watermark to re-read (clock skew between clients).
+        :param batch_size: Documents per cursor round trip and per SQLite transaction.
+        :return: The list of local changes as (collection, operation, _id) tuples,
+                 operation being insert | update | delete; the documents read again
+                 without a change are not listed.
+        """
+        changes = []
+
+        def store(collection, batch):
+            changed = self.upsert_documents(collection, batch)
+            changes.extend((collection, operation, _id) for _id, operation in changed.items())
+
+        for collection in COLLECTIONS:
+            watermark = self.get_watermark(collection)
+            query = {"updated_at": {"$gte": watermark - overlap}} if watermark else {}
+            newest = watermark
+
+            batch = []
+            for document in db[collection].find(query, batch_size=batch_size):
+                batch.append(document)
+                updated_at = document.get("updated_at")
+                if isinstance(updated_at, datetime) and (newest is None or updated_at > newest):
+                    newest = updated_at
+                if len(batch) >= batch_size:
+                    store(collection, batch)
+                    batch = []
+            if batch:
+                store(collection, batch)
+
+            if newest:
+                with self.connection:
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO sync_state (collection, watermark) VALUES (?, ?)",
+                        (collection, newest.isoformat())
+                    )
+
+            if reconcile:
+                server_ids = {str(document["_id"]) for document in db[collection].find({}, {"_id": 1})}
+                local_ids = {row[0] for row in self.connection.execute(f'SELECT _id FROM "{collection}"')}
+                self.delete_documents(collection, local_ids - server_ids)
+                changes.extend((collection, "delete", _id) for _id in local_ids - server_ids)
+
+        if changes:
+            logger.info(f"Local replica: pulled {len(changes)} changed documents.")
+        return changes
+
+    # *************************************************************
+    # Reads
+    # *************************************************************
+    def _condition_sql(self, collection, field, condition):
+        """(sql, params) of a field condition, None when it is matched in Python."""
+        if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+            operators = condition
+        else:
+            operators = {"$eq": condition}
+        options = operators.get("$options", "")
+
+        if field == "_id":
+            # _id is the text primary key: the order of ObjectIds is the order of their hex text
+            def column_sql(operator, operand):
+                operands = operand if operator in ("$in", "$nin") else [operand]
+                if operator != "$exists" and not all(isinstance(item, (ObjectId, str)) for item in operands):
+                    return None
+                if operator in SQL_OPERATORS:
+                    return (f"_id {SQL_OPERATORS[operator]} ?", [str(operand)]) if isinstance(operand, ObjectId) else None
+                if operator in ("$in", "$nin"):
+                    operand = [str(item) for item in operand]
+                elif operator != "$exists":
+                    operand = str(operand)
+                return _operator_sql("_id", operator, operand, options)
+        elif field in INDEXED_FIELDS.get(collection, ()):
+            def column_sql(operator, operand):
+                return _operator_sql(f'"{field}"', operator, operand, options)
+        elif field in KEY_FIELDS.get(collection, ()):
+            # An array matches when one of its elements does (each operator on its own)
+            def column_sql(operator, operand):
+                if operator not in ("$eq", "$in", "$regex") + tuple(SQL_OPERATORS) or operand is None \
+                        or (operator == "$in" and None in operand):
+                    return None
+                sql = _operator_sql("key", operator, operand, options)
+                if sql is None:
+                    return None
+                return f'_id IN (SELECT _id FROM "{collection}__{field}" WHERE {sql[0]})', sql[1]
+        else:
+            return None
+
+        clauses, params = [], []
+        for operator, operand in operators.items():
+            if operator == "$options":
+                continue
+            sql = column_sql(operator, operand)
+            if sql is None:
+                return None
+            clauses.append(sql[0])
+            params.extend(sql[1])
+        return _conjunction(clauses), params
+
+    def _translate(self, collection, query):
+        """
+        Split a query into SQL conditions and the rest matched in Python.
+
+        :return: (clauses, params, residual) where residual is a query dict (empty
+                 when SQLite evaluates the whole query).
+        """
+        clauses, params, residual = [], [], {}
+        for key, condition in (query or {}).items():
+            if key in ("$and", "$or") and isinstance(condition, list):
+                parts = [self._translate(collection, sub_query) for sub_query in condition]
+                if key == "$and":
+                    rest = []
+                    for sub_clauses, sub_params, sub_residual in parts:
+                        clauses.extend(sub_clauses)
+                        params.extend(sub_params)
+                        if sub_residual:
+                            rest.append(sub_residual)
+                    if rest:
+                        residual["$and"] = rest
+                elif parts and not any(sub_residual for _, _, sub_residual in parts):
+                    clauses.append("(" + " OR ".join(f"({_conjunction(sub_clauses)})" for sub_clauses, _, _ in parts) + ")")
+                    params.extend(param for _, sub_params, _ in parts for param in sub_params)
+                else:
+                    residual[key] = condition
+                continue
+            sql = None if key.startswith("$") else self._condition_sql(collection, key, condition)
+            if sql is None:
+                residual[key] = condition
+            else:
+                clauses.append(sql[0])
+                params.extend(sql[1])
+        return clauses, params, residual
+
+    def _order_by(self, collection, sort):
+        """The ORDER BY of a sort, None when a sorted field has no column."""
+        if not sort:
+            return ""
+        terms = []
+        for field, direction in (sort.items() if isinstance(sort, dict) else sort):
+            if field != "_id" and field not in INDEXED_FIELDS.get(collection, ()):
+                return None
+            column = "_id" if field == "_id" else f'"{field}"'
+            terms.append(f"{column} {'DESC' if direction < 0 else 'ASC'}")
+        return " ORDER BY " + ", ".join(terms)
+
+    def _select(self, collection, query=None, sort=None, limit=0, raw=False, clauses=(), params=()):
+        """
+        The documents matching `query`, in `sort` order and cut to `limit`: the
+        conditions and the sort SQLite can evaluate run on the indexes, only the
+        rows it returns are decoded.
+
+        :param clauses, params: Extra SQL conditions (see find_page).
+        """
+        if raw:
+            # Nothing is decoded until a field is read (by the query, the sort or the view)
+            def decode(blob):
+                return RawBSONDocument(blob, RAW_CODEC_OPTIONS)
+        else:
+            def decode(blob):
+                return bson.decode(blob, codec_options=CODEC_OPTIONS)
+
+        if limit > 0 and not sort and not clauses:
+            documents = self._key_scan(collection, query, limit, decode)
+            if documents is not None:
+                return documents
+
+        where, where_params, residual = self._translate(collection, query)
+        where = list(clauses) + where
+        order_by = self._order_by(collection, sort)
+        sql = f'SELECT doc FROM "{collection}"'
+        if where:
+            sql += " WHERE " + _conjunction(where)
+        if order_by:
+            sql += order_by
+        if limit > 0 and order_by is not None and not residual:
+            sql += f" LIMIT {int(limit)}"
+
+        documents = []
+        for row in self.connection.execute(sql, list(params) + where_params):
+            document = decode(row[0])
+            if residual and not match(document, residual):
+                continue
+            documents.append(document)
+            if limit > 0 and order_by is not None and len(documents) == limit:
+                break
+        if order_by is None:
+            sort_documents(documents, sort)
+            if limit > 0:
+                documents = documents[:limit]
+        return documents
+
+    def _key_scan(self, collection, query, limit, decode):
+        """
+        A limited query on one KEY_FIELDS condition (e.g. a search_keys prefix), read along
+        the key index like a MongoDB multikey index: a document matched by several of its
+        keys is returned once, the scan stops at the limit.
+
+        :return: The documents, None when the query has another form.
+        """
+        if not query or len(query) != 1:
+            return None
+        (field, condition), = query.items()
+        if field not in KEY_FIELDS.get(collection, ()) or self._condition_sql(collection, field, condition) is None:
+            return None
+        options = ""
+        if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+            options = condition.get("$options", "")
+            operators = [(key, value) for key, value in condition.items() if key != "$options"]
+        else:
+            operators = [("$eq", condition)]
+        if len(operators) != 1:
+            return None
+        sql, params = _operator_sql("k.key", *operators[0], options)
+
+        documents, seen = [], set()
+        rows = self.connection.execute(
+            f'SELECT c._id, c.doc FROM "{collection}__{field}" AS k JOIN "{collection}" AS c ON c._id = k._id '
+            f"WHERE {sql} ORDER BY k.key, k._id", params
+        )
+        for _id, blob in rows:
+            if _id not in seen:
+                seen.add(_id)
+                documents.append(decode(blob))
+                if len(documents) == limit:
+                    break
+        return documents
+
+    def get_many(self, collection, document_ids, chunk_size=900):
+        """Fetch documents by primary key (chunked to stay under the SQLite variable limit)."""
+        document_ids = [str(document_id) for document_id in document_ids if document_id is not None]
+        documents = []
+        for start in range(0, len(document_ids), chunk_size):
+            chunk = document_ids[start:start + chunk_size]
+            rows = self.connection.execute(
+                f'SELECT doc FROM "{collection}" WHERE _id IN ({", ".join("?" * len(chunk))})', chunk
+            )
+            documents.extend(bson.decode(row[0], codec_options=CODEC_OPTIONS) for row in rows)
+        return documents
+
+    def find(self, collection, query=None, projection=None, sort=None, limit=0, raw=False):
+        """
+        Local equivalent of collection.find(query, projection).sort(sort).limit(limit).
+
+        :param raw: Return RawBSONDocuments; the projection is not applied
+                    (it would decode every document).
+        :return: A list of documents.
+        """
+        documents = self._select(collection, query, sort, limit, raw)
+        if raw:
+            return documents
+        return [project(document, projection) for document in documents]
+
+    def count(self, collection, query=None):
+        """Local equivalent of collection.count_documents(query)."""
+        clauses, params, residual = self._translate(collection, query)
+        if residual:
+            return len(self._select(collection, query, raw=True))
+        where = f" WHERE {_conjunction(clauses)}" if clauses else ""
+        return self.connection.execute(f'SELECT COUNT(*) FROM "{collection}"{where}', params).fetchone()[0]
+
+    def group_count(self, collection, field, query=None):
+        """
+        Local equivalent of [{"$match": query}, {"$group": {"_id": "$field", "count": {"$sum": 1}}}]
+        sorted by decreasing count.
+
+        :return: A list of {"_id": value, "count": int}.
+        """
+        clauses, params, residual = self._translate(collection, query)
+        if residual or field not in INDEXED_FIELDS.get(collection, ()):
+            groups = {}
+            for document in self._select(collection, query):
+                value = get_field(document, field)
+                groups[value] = groups.get(value, 0) + 1
+            rows = sorted(groups.items(), key=lambda item: (-item[1], _sort_key(item[0])))
+            return [{"_id": value, "count": count} for value, count in rows]
+
+        where = f" WHERE {_conjunction(clauses)}" if clauses else ""
+        rows = self.connection.execute(
+            f'SELECT "{field}", COUNT(*) FROM "{collection}"{where} GROUP BY "{field}" ORDER BY 2 DESC, 1',
+            params
+        )
+        return [{"_id": python_value(value), "count": count} for value, count in rows]
+
+    def find_page(self, collection, query, field, direction, last=None, limit=0, raw=False):
+        """
+        Local equivalent of a keyset page (paging.keyset_query + paging.page_sort):
+        the rows after `last` are read from the (field, _id) index with a row value
+        comparison, without skipping the previous pages.
+
+        :param last: The last row of the previous page (mapping with _id and field), None for the first page.
+        """
+        sort = [("_id", direction)] if field == "_id" else [(field, direction), ("_id", direction)]
+        if last is None or (field != "_id" and field not in INDEXED_FIELDS.get(collection, ())):
+            return self._select(collection, keyset_query(query, field, direction, last), sort, limit, raw)
+
+        after = ">" if direction > 0 else "<"
+        last_id = str(last["_id"])
+        if field == "_id":
+            clause, params = f"_id {after} ?", [last_id]
+        else:
+            column = f'"{field}"'
+            value = column_value(last.get(field))
+            if value is None:
+                # Nulls come first in ascending order
+                clause, params = f"({column} IS NULL AND _id {after} ?)", [last_id]
+                if direction > 0:
+                    clause = f"({clause} OR {column} IS NOT NULL)"
+            else:
+                clause, params = f"({column}, _id) {after} (?, ?)", [value, last_id]
+                if direction < 0:
+                    clause = f"({clause} OR {column} IS NULL)"
+        return self._select(collection, query, sort, limit, raw, [clause], params)
+
+    def fetch_orders_with_customer_names(self, query=None, projection=None, sort=None, limit=0):
+        """
+        Local equivalent of MongoDBHandler.fetch_orders_with_customer_names.
+        The sort on the indexed fields and the limit run in SQLite, before the join.
+        """
+        pushed = self._order_by("Orders", sort) is not None
+        orders = self._select("Orders", query, sort, limit) if pushed else self._select("Orders", query)
+        self.add_customer_names(orders)
+        if not pushed:
+            sort_documents(orders, sort)
+            if limit > 0:
+                orders = orders[:limit]
+        return [project(order, projection) for order in orders]
+
+    def add_customer_names(self, orders):
+        """Sets the customer_name of orders (primary key reads of their customers)."""
+        customers = {
+            str(customer["_id"]): customer
+            for customer in self.get_many("Customers", {order.get("customer_id") for order in orders})
+        }
+        for order in orders:
+            customer = customers.get(str(order.get("customer_id")))
+            # $concat returns null when the customer is missing
+            order["customer_name"] = (
+                f"{customer.get('first_name')} {customer.get('last_name')}"
+                if customer and customer.get("first_name") is not None and customer.get("last_name") is not None
+                else None
+            )
+        return orders
+
+    def generate_statistics(self):
+        """
+        Local equivalent of MongoDBHandler.generate_statistics, used while offline.
+        """
+        products = self.find("Products")
+        orders = self.find("Orders", {"status": {"$ne": "cancelled"}})
+        customers = self.find("Customers")
+
+        orders_by_status = {}
+        order_count_by_customer = {}
+        total_revenue = Decimal(0)
+        for order in orders:
+            orders_by_status[order.get("status")] = orders_by_status.get(order.get("status"), 0) + 1
+            order_count_by_customer[order.get("customer_id")] = order_count_by_customer.get(order.get("customer_id"), 0) + 1
+            if isinstance(order.get("total_price"), Decimal):
+                total_revenue += order["total_price"]
+
+        customers_by_id = {customer["_id"]: customer for customer in customers}
+        top_customers = []
+        for customer_id, count in sorted(order_count_by_customer.items(), key=lambda item: -item[1])[:5]:
+            customer = customers_by_id.get(customer_id, {})
+            name = f"{customer.get('first_name')} {customer.get('last_name')}" if customer else None
+            top_customers.append({"_id": customer_id, "customer_name": name, "order_count": count})
+
+        top_products = sort_documents([project(p, {"name": 1, "qte": 1}) for p in products], [("qte", -1)])[:5]
+        return {
+            "products": {
+                "total_products": len(products),
+                "total_quantity": sum(product.get("qte", 0) for product in products),
+                "top_products": top_products,
+            },
+            "orders": {
+                "total_orders": len(orders),
+                "total_revenue": total_revenue,
+                "orders_by_status": [{"_id": status, "count": count} for status, count in orders_by_status.items()],
+                "top_customers": top_customers,
+            },
+            "customers": {
+                "total_customers": len(customers),
+                "active_customers": sum(1 for customer in customers if customer.get("is_active") is True),
+                "trusted_customers": [
+                    project(customer, {"first_name": 1, "last_name": 1})
+                    for customer in customers if customer.get("client_status") == "trusted"
+                ][:5],
+            },
+        }
+
+    # *************************************************************
+    # Offline write queue
+    # *************************************************************
+    def queue_write(self, method, args, kwargs):
+        """Store a handler write call to replay it when the server is back."""
+        payload = bson.encode({"args": list(args), "kwargs": kwargs}, codec_options=CODEC_OPTIONS)
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO pending_writes (method, payload, created_at) VALUES (?, ?, ?)",
+                (method, payload, datetime.now().isoformat())
+            )
+        logger.info(f"Server unreachable: queued {method} for replay.")
+
+    def pending_writes(self):
+        """Return the queued writes in order as (id, method, args, kwargs)."""
+        rows = self.connection.execute("SELECT id, method, payload FROM pending_writes ORDER BY id").fetchall()
+        writes = []
+        for write_id, method, payload in rows:
+            call = bson.decode(payload, codec_options=CODEC_OPTIONS)
+            writes.append((write_id, method, call["args"], call["kwargs"]))
+        return writes
+
+    def pending_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM pending_writes").fetchone()[0]
+
+    def remove_pending_write(self, write_id):
+        with self.connection:
+            self.connection.execute("DELETE FROM pending_writes WHERE id = ?", (write_id,))
+
+    def close(self):
+        self.connection.close()
+
+
+class LocalCollection:
+    """
+    The pymongo collection methods used by the MongoDBHandler writes, applied to the
+    replica: a write made while offline shows in the tables until it is replayed
+    (see queue_when_offline). The results have the counters of the pymongo ones.
+    """
+
+    def __init__(self, replica, name):
+        self.replica = replica
+        self.name = name
+
+    def find(self, query=None, projection=None, **kwargs):
+        return self.replica.find(self.name, query, projection)
+
+    def find_one(self, query=None, projection=None):
+        documents = self.replica.find(self.name, query, projection, limit=1)
+        return documents[0] if documents else None
+
+    def insert_one(self, document, session=None):
+        document.setdefault("_id", ObjectId())
+        self.replica.upsert_documents(self.name, [document])
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def update_one(self, query, update, session=None):
+        document = self.find_one(query)
+        if document is None:
+            return SimpleNamespace(matched_count=0, modified_count=0)
+        changed = self.replica.upsert_documents(self.name, [apply_update(document, update)])
+        return SimpleNamespace(matched_count=1, modified_count=len(changed))
+
+    def bulk_write(self, operations, ordered=True, session=None):
+        """UpdateOne operations only."""
+        results = [self.update_one(operation._filter, operation._doc) for operation in operations]
+        return SimpleNamespace(
+            matched_count=sum(result.matched_count for result in results),
+            modified_count=sum(result.modified_count for result in results),
+        )
+
+    def delete_one(self, query):
+        return self.delete(query, limit=1)
+
+    def delete_many(self, query):
+        return self.delete(query)
+
+    def delete(self, query, limit=0):
+        ids = [document["_id"] for document in self.replica.find(self.name, query, {"_id": 1}, limit=limit)]
+        return SimpleNamespace(deleted_count=len(self.replica.delete_documents(self.name, ids)))
+
+
+class LocalDatabase:
+    """db[collection_name] over the replica (see LocalCollection)."""
+
+    def __init__(self, replica):
+        self.replica = replica
+
+    def __getitem__(self, name):
+        return LocalCollection(self.replica, name)
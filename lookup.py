@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Incremental lookups of the pickers (prefix queries + recently used items)
+# ----------------------------------------------------------------------------
+import re
+from collections import OrderedDict
+
+from logger import logger
+
+ARABIC_MARKS = re.compile("[\u064B-\u0652\u0640]")     # harakat and tatweel
+LETTER_FORMS = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ة": "ه", "ى": "ي"})
+PHONE_PREFIX = re.compile(r"[\d\s+-]+")
+
+
+class RecentItems:
+    """
+    A bounded LRU of documents keyed by _id (the most recent first).
+    """
+
+    def __init__(self, size=50):
+        self.size = size
+        self.items = OrderedDict()
+
+    def add(self, document):
+        self.items[document["_id"]] = document
+        self.items.move_to_end(document["_id"], last=False)
+        while len(self.items) > self.size:
+            self.items.popitem()
+
+    def get(self, document_id):
+        return self.items.get(document_id)
+
+    def replace(self, document):
+        """Update a cached document in place (its position is kept)."""
+        if document["_id"] in self.items:
+            self.items[document["_id"]] = document
+
+    def discard(self, document_id):
+        self.items.pop(document_id, None)
+
+    def clear(self):
+        self.items.clear()
+
+    def __iter__(self):
+        return iter(list(self.items.values()))
+
+    def __len__(self):
+        return len(self.items)
+
+
+def normalize(text):
+    """
+    The searchable form of a name: no harakat, one form per letter, lower case, single spaces.
+    """
+    text = ARABIC_MARKS.sub("", str(text or "")).translate(LETTER_FORMS).lower()
+    return " ".join(text.split())
+
+
+def normalize_phone(phone):
+    return re.sub(r"\D", "", str(phone or ""))
+
+
+def customer_search_keys(customer):
+    """
+    The keys of the Customers.search_keys index: "first last", "last first" and the phone digits.
+    """
+    first_name, last_name = normalize(customer.get("first_name")), normalize(customer.get("last_name"))
+    keys = {f"{first_name} {last_name}".strip(), f"{last_name} {first_name}".strip(), normalize_phone(customer.get("phone"))}
+    return sorted(key for key in keys if key)
+
+
+def prefix_pattern(prefix):
+    """
+    An anchored, case-sensitive regex: MongoDB reads it as an index range scan.
+    """
+    return {"$regex": f"^{re.escape(prefix)}"}
+
+
+class ProductLookup:
+    """
+    Products of the product picker: the recently used ones first, then limited
+    prefix queries on name and ref (indexed on the server and in the local replica).
+    Nothing is loaded up front.
+    """
+    projection = {"_id": 1, "name": 1, "ref": 1, "qte": 1, "price": 1}
+
+    def __init__(self, db_handler, limit=20, recent_size=50):
+        self.db_handler = db_handler
+        self.limit = limit
+        self.recent = RecentItems(recent_size)
+        self.stale = set()      # recent products changed since they were cached
+
+    @staticmethod
+    def label(product):
+        """The text displayed for a product (the reference makes it unique)."""
+        return f"{product.get('name', 'غير معروف')} ({product.get('ref', '')})"
+
+    def search(self, prefix):
+        """
+        :param prefix: The typed text ("" lists the recent products).
+        :return: Up to `limit` product documents.
+        """
+        prefix = prefix.strip()
+        self.refresh_stale()
+        products = [
+            product for product in self.recent
+            if product.get("name", "").startswith(prefix) or product.get("ref", "").startswith(prefix)
+        ][:self.limit]
+        if not prefix or len(products) >= self.limit:
+            return products
+
+        # One index range per field, read in index order up to the limit (a $or of both
+        # would sort all the matches of a short prefix): the names first, then the references
+        pattern = prefix_pattern(prefix)
+        for field in ("name", "ref"):
+            if len(products) >= self.limit:
+                break
+            response = self.db_handler.fetch_documents(
+                "Products", {field: pattern}, self.projection, limit=self.limit, sort=[(field, 1)]
+            )
+            if response["status"] != "success":
+                logger.error(f"Error looking up products: {response['message']}")
+                return products
+            seen = {product["_id"] for product in products}
+            products += [product for product in response["documents"] if product["_id"] not in seen]
+        return products[:self.limit]
+
+    def remember(self, product):
+        """Mark a product as used (listed first next time)."""
+        self.recent.add(product)
+
+    def refresh_stale(self):
+        """Reload the changed recent products with one $in query."""
+        stale_ids = [document_id for document_id in self.stale if self.recent.get(document_id) is not None]
+        self.stale.clear()
+        if not stale_ids:
+            return
+        response = self.db_handler.fetch_documents("Products", {"_id": {"$in": stale_ids}}, self.projection)
+        if response["status"] != "success":
+            for document_id in stale_ids:
+                self.recent.discard(document_id)
+            return
+        found = {product["_id"]: product for product in response["documents"]}
+        for document_id in stale_ids:
+            if document_id in found:
+                self.recent.replace(found[document_id])
+            else:
+                self.recent.discard(document_id)   # deleted
+
+    def on_change(self, change):
+        """Change listener: a cached product is reloaded on the next search (stock, price...)."""
+        if change["collection"] != "Products":
+            return
+        if change["document_id"] is None:
+            self.stale.update(product["_id"] for product in self.recent)
+        else:
+            self.stale.add(change["document_id"])
+
+
+class RefIndex:
+    """
+    Products by reference (barcode) for the scan-to-cart entry: the scanned products
+    with their price and stock, kept in memory and refreshed from the change events.
+    A reference seen for the first time is read through the index on Products.ref
+    (unique index on the server, indexed column of the local replica).
+    """
+    projection = ProductLookup.projection
+
+    def __init__(self, db_handler):
+        self.db_handler = db_handler
+        self.products = {}      # ref => product
+        self.refs = {}          # _id => ref (to follow deletions and ref changes)
+        self.stale = set()      # changed product ids, reloaded before the next lookup
+
+    def store(self, product):
+        previous_ref = self.refs.get(product["_id"])
+        if previous_ref is not None and previous_ref != product.get("ref"):
+            self.products.pop(previous_ref, None)
+        if product.get("ref"):
+            self.products[product["ref"]] = product
+            self.refs[product["_id"]] = product["ref"]
+
+    def refresh_stale(self):
+        """Reload the changed products that were scanned, with one $in query on _id."""
+        stale_ids = [document_id for document_id in self.stale if document_id in self.refs]
+        self.stale.clear()
+        if not stale_ids:
+            return
+        response = self.db_handler.fetch_documents("Products", {"_id": {"$in": stale_ids}}, self.projection)
+        if response["status"] != "success":
+            self.stale.update(stale_ids)
+            return
+        found = {product["_id"]: product for product in response["documents"]}
+        for document_id in stale_ids:
+            if document_id in found:
+                self.store(found[document_id])
+            else:
+                self.products.pop(self.refs.pop(document_id, None), None)   # deleted
+
+    def lookup(self, ref):
+        """
+        :param ref: The scanned reference.
+        :return: The product {"_id", "name", "ref", "qte", "price"} or None.
+        """
+        ref = ref.strip()
+        self.refresh_stale()
+        product = self.products.get(ref)
+        if product is not None:
+            return product
+
+        response = self.db_handler.fetch_documents("Products", {"ref": ref}, self.projection, limit=1)
+        if response["status"] != "success" or not response["documents"]:
+            return None
+        product = response["documents"][0]
+        self.store(product)
+        return product
+
+    def on_change(self, change):
+        """Change listener: the changed products are reloaded before the next lookup."""
+        if change["collection"] != "Products":
+            return
+        if change["document_id"] is None:
+            # Unknown changes (e.g. a bulk import): every reference is read again
+            self.products.clear()
+            self.refs.clear()
+            self.stale.clear()
+        else:
+            self.stale.add(change["document_id"])
+
+
+class CustomerLookup:
+    """
+    Customers of the new order form: the recently used ones first, then a limited
+    prefix query on the normalized names/phone (Customers.search_keys).
+    """
+    projection = {"_id": 1, "first_name": 1, "last_name": 1, "phone": 1}
+
+    def __init__(self, db_handler, limit=20, recent_size=50):
+        self.db_handler = db_handler
+        self.limit = limit
+        self.recent = RecentItems(recent_size)
+
+    @staticmethod
+    def label(customer):
+        name = f"{customer.get('first_name', '')} {customer.get('last_name', '')}".strip()
+        return f"{name} - {customer['phone']}" if customer.get("phone") else name
+
+    @staticmethod
+    def search_key(prefix):
+        """The typed text in the form of the search keys (digits only for a phone)."""
+        if PHONE_PREFIX.fullmatch(prefix) and normalize_phone(prefix):
+            return normalize_phone(prefix)
+        return normalize(prefix)
+
+    def search(self, prefix):
+        """
+        :param prefix: The typed text ("" lists the recent customers).
+        :return: Up to `limit` customer documents.
+        """
+        key = self.search_key(prefix)
+        customers = [
+            customer for customer in self.recent
+            if any(search_key.startswith(key) for search_key in customer_search_keys(customer))
+        ][:self.limit]
+        if not key or len(customers) >= self.limit:
+            return customers
+
+        response = self.db_handler.fetch_documents(
+            "Customers", {"search_keys": prefix_pattern(key)}, self.projection, limit=self.limit
+        )
+        if response["status"] != "success":
+            logger.error(f"Error looking up customers: {response['message']}")
+            return customers
+        seen = {customer["_id"] for customer in customers}
+        customers += [customer for customer in response["documents"] if customer["_id"] not in seen]
+        return customers[:self.limit]
+
+    def remember(self, customer):
+        """Mark a customer as used (listed first next time)."""
+        self.recent.add(customer)
+
+    def on_change(self, change):
+        """Change listener: a changed customer leaves the recent list (its name may differ)."""
+        if change["collection"] != "Customers":
+            return
+        if change["document_id"] is None:
+            self.recent.clear()
+        else:
+            self.recent.discard(change["document_id"])
+
+
+if __name__ == "__main__":
+    # Benchmark: python lookup.py --products 50000 (a MongoDBHandler on a generated local replica)
+    import argparse
+    import logging
+    import os
+    import tempfile
+    import time
+    from datetime import datetime
+    from decimal import Decimal
+
+    from bson.objectid import ObjectId
+
+    from mongo_handler import MongoDBHandler
+
+    parser = argparse.ArgumentParser(description="Benchmark the picker lookups on the local replica.")
+    parser.add_argument("--products", type=int, default=50_000, help="number of products (default: 50000)")
+    parser.add_argument("--customers", type=int, default=20_000, help="number of customers (default: 20000)")
+    parser.add_argument("--repeat", type=int, default=50, help="searches per prefix (default: 50)")
+    args = parser.parse_args()
+
+    def timed(label, search, prefixes):
+        for prefix in prefixes:
+            logging.disable(logging.INFO)     # one log line per fetch
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                found = search(prefix)
+            elapsed = (time.perf_counter() - start) / args.repeat * 1000
+            logging.disable(logging.NOTSET)
+            logger.info(f"{label} {prefix!r:14} {len(found):3} results  {elapsed:.2f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        handler = MongoDBHandler(replica_path=os.path.join(directory, "replica.sqlite3"), connect=False)
+        handler.query_cache.enabled = False     # measure the queries, not the cache
+        handler.replica.upsert_documents("Products", [
+            {"_id": ObjectId(), "name": f"product {i * 7919 % args.products:06d}", "ref": f"REF-{i:06d}",
+             "qte": i % 300, "price": Decimal("9.90"), "updated_at": datetime.now()}
+            for i in range(args.products)
+        ])
+        customers = [
+            {"_id": ObjectId(), "first_name": f"client{i * 7919 % args.customers:05d}", "last_name": "بن علي",
+             "phone": f"0555{i:06d}", "updated_at": datetime.now()}
+            for i in range(args.customers)
+        ]
+        for customer in customers:
+            customer["search_keys"] = customer_search_keys(customer)
+        handler.replica.upsert_documents("Customers", customers)
+
+        timed("products ", ProductLookup(handler).search, ["p", "product 01", "product 0123", "REF-0042", "none"])
+        timed("customers", CustomerLookup(handler).search, ["c", "client012", "بن", "0555 0001", "none"])
+        handler.replica.close()
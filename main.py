@@ -4,20 +4,51 @@
 # author        : el3arbi bdabve@gmail.com
 #
 # ----------------------------------------------------------------------------
-from datetime import datetime       # , date
+import asyncio
+import time
+from datetime import datetime, timedelta       # , date
 from PyQt5 import QtWidgets, QtCore
 from bson.objectid import ObjectId
-import qtawesome as qta
-from decimal import Decimal
 
 from gui.h_interface import Ui_MainWindow
 from gui.call_dialogs import AddProductToCart, ConfirmDialog
+from gui.reports_widget import ReportsWidget
+from gui.product_filters import ProductFilters
+from gui.lookup_completer import LookupCompleter
+from gui.button_delegate import ButtonDelegate
+from gui.detail_forms import DetailForms
 
 from utils import Utils
 from mongo_handler import MongoDBHandler
+from product_importer import ProductImporter
+from data_exporter import DataExporter
+from live_updates import ChangeStreamWatcher, ServerPing
+from detail_prefetcher import DetailPrefetcher
+from table_specs import TABLE_SPECS
+from lazy_table import LazyTableRows
+from lookup import ProductLookup, CustomerLookup, RefIndex
+from detail_cache import DetailCache, project
+from cart import Cart
+from local_replica import match
+import pipelines
+import paging
+import icons
+import facets
+import page_cache
 from logger import logger
 import arabic_dict as arabic
 
+try:
+    # Optional: run the Qt application on an asyncio loop (motor + qasync)
+    import qasync
+    from async_mongo_handler import AsyncMongoDBHandler
+except ImportError:
+    qasync = None
+
+REPLICA_PATH = "talabiyat_replica.sqlite3"     # Local read-replica (offline mode)
+REPLICA_SYNC_INTERVAL = 30 * 1000               # ms
+PAGE_CACHE_OVERLAP = timedelta(minutes=5)       # clock differences between the clients
+
 
 class Interface(QtWidgets.QMainWindow):
     def __init__(self):
@@ -25,20 +56,149 @@ class Interface(QtWidgets.QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
-        # Setup the mongo client
+        # Live updates: apply each document change to its table row
+        self.tables = {
+            'Products': (self.ui.tableWidgetProduct, self.ui.labelProductTableCount),
+            'Customers': (self.ui.tableWidgetCustomer, self.ui.labelCustomerTableCount),
+            'Orders': (self.ui.tableWidgetOrders, self.ui.labelOrderTableCount),
+        }
+        self.row_items = {table_name: {} for table_name in self.tables}   # _id => item of column 0
+        self.lazy_rows = {}     # table_name => LazyTableRows (tables filled on scroll)
+        self.table_loaded_at = {}   # table_name => datetime of the rows of a table showing all its rows
+        self.table_views = {}       # table_name => query of the displayed rows (None: not known)
+        self.stale_tables = set()   # tables painted from the page cache, not reconciled yet
+
+        # The rows saved on the last exit are painted before anything else (marked stale),
+        # they are reconciled once the window is shown (connect_database)
+        painted = self.paint_page_cache()
+
+        # Setup the mongo client: the local replica is opened, the server is reached
+        # once the window is shown (connect_database)
         try:
-            self.db_handler = MongoDBHandler()
+            self.db_handler = MongoDBHandler(replica_path=REPLICA_PATH, connect=False)
         except Exception as err:
             logger.error(err)
             exit()
 
-        # TABLE WIDGETS SETTINGS
-        self.product_projection = ["_id", "name", "ref", "description", "price", "qte", "category"]
-        self.customer_projection = ["_id", "first_name", "last_name", "phone", "email", "address", "is_active", "client_status"]
+        # Coroutine handler, only when the Qt loop is driven by asyncio (see __main__)
+        self.async_db_handler = None
+        if qasync is not None and isinstance(asyncio.get_event_loop(), qasync.QEventLoop):
+            self.async_db_handler = AsyncMongoDBHandler(
+                uri=self.db_handler.uri, database=self.db_handler.database_name, event_handler=self.db_handler
+            )
+
+        # Keep the local replica in sync (and replay offline writes), started by connect_database.
+        # The server is pinged in a worker thread: it waits up to 2 s while the server is down
+        self.sync_timer = QtCore.QTimer(self)
+        self.sync_timer.timeout.connect(self.sync_replica)
+        self.server_ping = ServerPing(self.db_handler, self)
+        self.server_ping.answered.connect(self.replica_pinged)
+        self.database_connected = False
+
+        self.db_handler.add_change_listener(self.apply_change)
+
+        # Product picker of the cart (prefix queries + recently used products)
+        self.product_lookup = ProductLookup(self.db_handler)
+        self.db_handler.add_change_listener(self.product_lookup.on_change)
+
+        # Customer of a new order: prefix queries on the normalized names/phone + recent customers
+        self.customer_lookup = CustomerLookup(self.db_handler)
+        self.db_handler.add_change_listener(self.customer_lookup.on_change)
+        self.customer_completer = LookupCompleter(self.ui.comboBoxAddOrderCustomer_id, self.customer_lookup)
+
+        # Full documents of the details dock, the selected row is loaded before the double-click
+        self.detail_cache = DetailCache(self.db_handler)
+        self.db_handler.add_change_listener(self.detail_cache.on_change)
+        self.prefetch_timer = QtCore.QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(150)
+        self.prefetch_timer.timeout.connect(self.prefetch_details)
+        self.prefetch_target = None
+        for table_widget, coll_name in (
+            (self.ui.tableWidgetProduct, "Products"),
+            (self.ui.tableWidgetCustomer, "Customers"),
+            (self.ui.tableWidgetOrders, "Orders"),
+        ):
+            table_widget.itemSelectionChanged.connect(
+                lambda table_widget=table_widget, coll_name=coll_name: self.schedule_prefetch(table_widget, coll_name)
+            )
+
+        # Lines of the new order (prices cached when the products are added)
+        self.cart = Cart()
+
+        # Scan-to-cart: products by reference (barcode) with their price and stock
+        self.ref_index = RefIndex(self.db_handler)
+        self.db_handler.add_change_listener(self.ref_index.on_change)
+
+        # Header clicks sort on the server (typed values, every row, indexed) and the
+        # sorted rows are loaded page by page while scrolling down
+        self.table_sort = {}    # table_name => (field, direction)
+        self.table_pages = {}   # table_name => {"query", "last", "has_more"} of a sorted table
+        for table_name, (table_widget, _) in self.tables.items():
+            table_widget.setSortingEnabled(False)
+            table_widget.horizontalHeader().setSectionsClickable(True)
+            table_widget.horizontalHeader().sectionClicked.connect(
+                lambda column, name=table_name: self.sort_table(name, column)
+            )
+            table_widget.verticalScrollBar().valueChanged.connect(
+                lambda value, name=table_name: self.load_next_page(name, value)
+            )
+
+        # Changes made by other clients (replica set only), started by connect_database
+        self.change_watcher = None
 
+        # TABLE WIDGETS SETTINGS
         # column size
         Utils.table_column_size(self.ui.tableWidgetProduct, [(0, 0), (1, 180), (2, 100), (3, 450), (4, 90), (5, 80)])
 
+        # Statistics page: the dashboard and the reports (analytics snapshot) in two tabs
+        self.ui.tabWidgetStatistics = QtWidgets.QTabWidget(self.ui.StatisticsPage)
+        self.ui.verticalLayout_6.removeWidget(self.ui.frameStatistics)
+        self.ui.tabWidgetStatistics.addTab(self.ui.frameStatistics, "الإحصائيات")
+        self.ui.reportsWidget = ReportsWidget(self.db_handler, self.ui.tabWidgetStatistics)
+        self.ui.tabWidgetStatistics.addTab(self.ui.reportsWidget, "التقارير")
+        self.ui.verticalLayout_6.addWidget(self.ui.tabWidgetStatistics)
+
+        # Products page: filter sidebar next to the table
+        self.ui.productFilters = ProductFilters(self.ui.ProductPage)
+        self.ui.verticalLayout_4.removeWidget(self.ui.tableWidgetProduct)
+        self.ui.productTableLayout = QtWidgets.QHBoxLayout()
+        self.ui.productTableLayout.addWidget(self.ui.productFilters)
+        self.ui.productTableLayout.addWidget(self.ui.tableWidgetProduct)
+        self.ui.verticalLayout_4.addLayout(self.ui.productTableLayout)
+        self.ui.productFilters.filtersChanged.connect(self.filter_products)
+
+        # Extra tool buttons (not in the designer file)
+        self.ui.buttonImportProducts = Utils.create_tool_button(
+            self.ui.frameToolButton_3, "buttonImportProducts", "استيراد السلع من ملف"
+        )
+        self.ui.horizontalLayout_12.addWidget(self.ui.buttonImportProducts)
+        self.ui.buttonExportOrders = Utils.create_tool_button(
+            self.ui.frameToolButton, "buttonExportOrders", "تصدير الطلبيات"
+        )
+        self.ui.horizontalLayout_5.addWidget(self.ui.buttonExportOrders)
+
+        # New order: the scanner types the reference and Enter (outside formLayoutNewOrder:
+        # collect_form_data must not read it)
+        self.ui.lineEditScanRef = QtWidgets.QLineEdit(self.ui.createOrderPage)
+        self.ui.lineEditScanRef.setObjectName("lineEditScanRef")
+        self.ui.lineEditScanRef.setPlaceholderText("امسح الرمز أو أدخل المرجع")
+        self.ui.lineEditScanRef.setClearButtonEnabled(True)
+        self.ui.verticalLayout_17.insertWidget(0, self.ui.lineEditScanRef)
+        self.ui.lineEditScanRef.returnPressed.connect(self.scan_to_cart)
+
+        # Details dock: one form per schema, built once and rebound on every open
+        self.detail_forms = DetailForms(self.ui.formLayout, self.ui.scrollAreaWidgetContents)
+
+        # Cart remove buttons: painted by one delegate, the clicked row is read from its index
+        self.cart_remove_delegate = ButtonDelegate(
+            " إزالة", icons.icon('fa.trash', "#EA2027"), self.ui.tableWidgetAddOrderProds
+        )
+        self.ui.tableWidgetAddOrderProds.setItemDelegateForColumn(4, self.cart_remove_delegate)
+        self.cart_remove_delegate.clicked.connect(
+            lambda index: self.remove_cart_line(self.ui.tableWidgetAddOrderProds.item(index.row(), 0).text())
+        )
+
         # CallbackFunctions and Icons
         Utils.interface_icons_callbacks(self)
 
@@ -49,11 +209,11 @@ class Interface(QtWidgets.QMainWindow):
 
         # MENU Define the order status actions
         order_actions = [
-            ({"pending": "قيد الانتظار"}, self.change_order_status, qta.icon('mdi6.clock-time-seven', color="#ffffff")),
-            ({"confirmed": "مؤكد"}, self.change_order_status, qta.icon('mdi6.check-circle-outline', color="#ffffff")),
-            ({"shipped": "تم الشحن"}, self.change_order_status, qta.icon('mdi6.truck-outline', color="#ffffff")),
-            ({"delivered": "تم التوصيل"}, self.change_order_status, qta.icon('mdi6.check-bold', color="#ffffff")),
-            ({"cancelled": "ملغي"}, self.change_order_status, qta.icon('mdi6.close-circle-outline', color="#ffffff")),
+            ({"pending": "قيد الانتظار"}, self.change_order_status, icons.icon('mdi6.clock-time-seven', "#ffffff")),
+            ({"confirmed": "مؤكد"}, self.change_order_status, icons.icon('mdi6.check-circle-outline', "#ffffff")),
+            ({"shipped": "تم الشحن"}, self.change_order_status, icons.icon('mdi6.truck-outline', "#ffffff")),
+            ({"delivered": "تم التوصيل"}, self.change_order_status, icons.icon('mdi6.check-bold', "#ffffff")),
+            ({"cancelled": "ملغي"}, self.change_order_status, icons.icon('mdi6.close-circle-outline', "#ffffff")),
         ]
         # create the menu
         Utils.create_menu(
@@ -66,9 +226,9 @@ class Interface(QtWidgets.QMainWindow):
 
         # Define the customer status actions
         customer_status_actions = [
-            ({"good_client": "عميل جيد"}, self.change_customer_status, qta.icon('mdi6.thumb-up', color="#4caf50")),
-            ({"bad_client": "عميل سيئ"}, self.change_customer_status, qta.icon('mdi6.thumb-down', color="#f44336")),
-            ({"trusted": "موثوق"}, self.change_customer_status, qta.icon('mdi6.star', color="#ffc107")),
+            ({"good_client": "عميل جيد"}, self.change_customer_status, icons.icon('mdi6.thumb-up', "#4caf50")),
+            ({"bad_client": "عميل سيئ"}, self.change_customer_status, icons.icon('mdi6.thumb-down', "#f44336")),
+            ({"trusted": "موثوق"}, self.change_customer_status, icons.icon('mdi6.star', "#ffc107")),
         ]
 
         Utils.create_menu(
@@ -79,9 +239,27 @@ class Interface(QtWidgets.QMainWindow):
             is_action_with_icon=True
         )
 
-        # initial functions
-        self.goto_page(page='Products')
+        # Export orders (all or by status)
+        export_actions = [({"all": "كل الطلبيات"}, self.export_orders)] + [
+            ({status: label}, self.export_orders) for label, status in arabic.status_mapping_neworder.items()
+        ]
+        Utils.create_menu(
+            root=self,
+            button=self.ui.buttonExportOrders,
+            icon_name='mdi6.file-export-outline',
+            actions=export_actions,
+        )
+
+        # initial functions: without saved rows the products are read from the local replica,
+        # the server is reached once the window is shown
+        if 'Products' in painted:
+            self.enable_disable_buttons(page='Products')
+            self.ui.containerStackedWidget.setCurrentWidget(self.ui.ProductPage)
+            Utils.pagebuttons_stats(self)
+        else:
+            self.goto_page(page='Products')
         self.showMaximized()
+        QtCore.QTimer.singleShot(0, self.connect_database)
 
     # **********************
     #   => Global Functions
@@ -92,21 +270,16 @@ class Interface(QtWidgets.QMainWindow):
         :param page: Page to navigate to (Products | Customers | Orders).
         """
         if page == 'Products':
-            # Display all products
-            self.fetch_and_display_data(
-                collection_name='Products',
-                headers=self.product_projection,
-            )
+            # Display the products (with the filters of the sidebar)
+            self.fetch_and_display_data(collection_name='Products', query=self.product_filter_query())
+            self.refresh_product_facets()
             self.enable_disable_buttons(page='Products')
             self.ui.labelErrorProductPage.setText('')
             self.ui.containerStackedWidget.setCurrentWidget(self.ui.ProductPage)
 
         elif page == 'Customers':
             # Display all customers
-            self.fetch_and_display_data(
-                collection_name='Customers',
-                headers=self.customer_projection
-            )
+            self.fetch_and_display_data(collection_name='Customers')
             self.enable_disable_buttons(page='Customers')
             self.ui.labelErrorCustomerPage.setText('')
             self.ui.containerStackedWidget.setCurrentWidget(self.ui.CustomerPage)
@@ -119,94 +292,572 @@ class Interface(QtWidgets.QMainWindow):
 
         elif page == 'Statistics':
             # self.enable_disable_buttons(page='Statistics')
-            self.show_statistics()
+            if self.async_db_handler is not None and self.db_handler.online:
+                asyncio.ensure_future(self.show_statistics_async())
+            else:
+                self.show_statistics()
             self.ui.dockWidget.close()
             self.ui.containerStackedWidget.setCurrentWidget(self.ui.StatisticsPage)
 
         Utils.pagebuttons_stats(self)
 
-    def update_count_label(self, label, rows):
+    def connect_database(self):
+        """
+        First contact with the server, after the window is painted: sync the local replica
+        (replaying the offline writes), reconcile the rows painted from the page cache,
+        then follow the changes of the other clients (see replica_pinged).
+        """
+        self.sync_timer.start(REPLICA_SYNC_INTERVAL)
+        self.sync_replica()
+
+    def sync_replica(self):
+        """
+        Periodic sync of the local replica with the server: ping it in the worker thread,
+        the sync runs in replica_pinged once it answered.
+        """
+        if not self.server_ping.isRunning():
+            self.server_ping.start()
+
+    def replica_pinged(self, reachable):
+        """
+        The answer of the server ping: sync the replica (on the GUI thread, its SQLite
+        connection belongs to it), and the first time finish connect_database.
+        """
+        self.db_handler.sync_replica(reachable=reachable)
+        self.update_connection_status()
+        if self.database_connected:
+            return
+        self.database_connected = True
+        if self.stale_tables:
+            self.reconcile_page_cache()
+
+        # Changes made by other clients (replica set only)
+        if self.db_handler.supports_change_streams():
+            self.change_watcher = ChangeStreamWatcher(self.db_handler, self)
+            self.change_watcher.changed.connect(self.db_handler.handle_stream_change)
+            self.change_watcher.start()
+
+    def update_connection_status(self):
+        """
+        Show in the status bar if the app works offline.
+        """
+        if self.db_handler.online:
+            self.ui.statusbar.clearMessage()
+        else:
+            pending = self.db_handler.replica.pending_count()
+            self.ui.statusbar.showMessage(f"غير متصل بالخادم - العمل من النسخة المحلية ({pending} عملية في الانتظار)")
+
+    def closeEvent(self, event):
+        if self.change_watcher:
+            self.change_watcher.stop()
+        self.server_ping.wait()
+        logger.info(f"Query cache: {self.db_handler.query_cache.stats()}")
+        self.save_page_cache()
+        super().closeEvent(event)
+
+    # ************************************************
+    #   => Page Cache (rows painted before the first query)
+    # ************************************************
+    def paint_page_cache(self):
+        """
+        Paint the rows saved on the last exit, marked as stale until reconcile_page_cache.
+        :return: The painted tables.
+        """
+        schemas = {table_name: TABLE_SPECS[table_name].fields for table_name in self.tables}
+        cache = page_cache.PageCache.open(page_cache.PAGE_CACHE_PATH, schemas)
+        if cache is None:
+            return []
+        try:
+            for table_name, cached_table in cache.tables.items():
+                table_widget, count_label = self.tables[table_name]
+                if cached_table.lazy:
+                    self.paint_lazy_rows(table_name, cached_table)
+                else:
+                    Utils.populate_table_widget(table_widget, list(cached_table), TABLE_SPECS[table_name].headers)
+                    self.index_rows(table_name)
+                    self.table_views[table_name] = {}     # only tables showing all their rows are saved
+                self.table_loaded_at[table_name] = cached_table.saved_at
+                self.stale_tables.add(table_name)
+                count_label.setText(f"المجموع ({len(cached_table)}) - بيانات محفوظة")
+            painted = list(cache.tables)
+        finally:
+            cache.close()
+        if painted:
+            self.ui.statusbar.showMessage("عرض البيانات المحفوظة، جارٍ التحديث...")
+        return painted
+
+    def paint_lazy_rows(self, table_name, cached_table):
+        """
+        Paint a lazily filled table from the page cache: the rows drawn before the exit are
+        painted, the others keep their _id only and are read when they scroll into view.
+        """
+        table_widget, _ = self.tables[table_name]
+        drawn = [cached_table.drawn(row) for row in range(len(cached_table))]
+        documents = [{"_id": ObjectId(cached_table.cell(row, 0))} for row in range(len(cached_table))]
+        self.populate_table_lazily(table_name, documents, drawn)
+        for row, row_drawn in enumerate(drawn):
+            if row_drawn:
+                Utils.set_table_row(table_widget, row, cached_table.row(row))
+
+    def reconcile_lazy_rows(self, table_name, response):
+        """
+        reconcile_page_cache for a lazily filled table: the deleted rows are removed, the
+        changed and new rows keep their _id only and are read when they scroll into view.
+        """
+        lazy_rows = self.lazy_rows[table_name]
+        deleted = set(response["deleted"])
+        for row in reversed(range(len(lazy_rows.documents))):
+            if str(lazy_rows.documents[row]["_id"]) in deleted:
+                lazy_rows.remove_row(row, fill=False)
+
+        rows = {str(document["_id"]): row for row, document in enumerate(lazy_rows.documents)}
+        for document in response["documents"]:
+            row = rows.get(str(document["_id"]))
+            if row is None:
+                lazy_rows.append({"_id": document["_id"]}, fill=False)
+            else:
+                lazy_rows.set_document(row, {"_id": document["_id"]}, fill=False)
+        lazy_rows.fill_visible()
+
+    def reconcile_page_cache(self):
+        """
+        Bring the tables painted from the page cache up to date: one delta query per table
+        (changed, new and deleted rows) instead of fetching all the rows again.
+        """
+        for table_name in list(self.stale_tables):
+            if table_name not in self.stale_tables:
+                continue    # reloaded meanwhile
+            table_widget, count_label = self.tables[table_name]
+            loaded_at = datetime.now()
+            if table_name in self.lazy_rows:
+                known_ids = [str(document["_id"]) for document in self.lazy_rows[table_name].documents]
+            else:
+                known_ids = list(self.row_items[table_name])
+            response = self.db_handler.fetch_delta(
+                table_name, known_ids, self.table_loaded_at[table_name] - PAGE_CACHE_OVERLAP
+            )
+            if response["status"] != "success":
+                continue    # stays marked as stale
+
+            if table_name in self.lazy_rows:
+                self.reconcile_lazy_rows(table_name, response)
+            else:
+                for document_id in response["deleted"]:
+                    item = self.row_items[table_name].pop(document_id, None)
+                    if item is not None:
+                        table_widget.removeRow(item.row())
+                for document in response["documents"]:
+                    self.draw_row(table_name, document)
+
+            self.stale_tables.discard(table_name)
+            self.table_loaded_at[table_name] = loaded_at
+            self.update_count_label(count_label, table_widget.rowCount())
+
+        self.refresh_product_facets()
+        self.update_connection_status()
+
+    def save_page_cache(self):
+        """
+        Save the rendered rows of the tables showing all their rows (no search, filter,
+        sort or customer orders) for the next start.
+        """
+        tables = {}
+        for table_name, loaded_at in self.table_loaded_at.items():
+            table_widget, _ = self.tables[table_name]
+            fields = TABLE_SPECS[table_name].fields
+            lazy_rows = self.lazy_rows.get(table_name)
+            rows, drawn = [], []
+            for row in range(table_widget.rowCount()):
+                if lazy_rows is not None and not lazy_rows.filled[row]:
+                    # Never scrolled into view: its _id keeps its place, it stays lazy on start
+                    rows.append([str(lazy_rows.documents[row]["_id"])] + [""] * (len(fields) - 1))
+                    drawn.append(False)
+                    continue
+                items = [table_widget.item(row, column) for column in range(len(fields))]
+                if items[0] is None:
+                    continue
+                rows.append([item.text() if item is not None else "" for item in items])
+                drawn.append(True)
+            if rows:
+                tables[table_name] = (fields, loaded_at, rows, drawn if lazy_rows is not None else None)
+        try:
+            page_cache.save(page_cache.PAGE_CACHE_PATH, tables)
+        except OSError as err:
+            logger.warning(f"Could not save the page cache: {err}")
+
+    def update_count_label(self, label, count, has_more=False):
         """
-        Update the count len(rows) label.
+        Update the count label.
         :label: self.ui.labelCount :: the label to display count in
-        :rows: the rows to count with len(rows)
+        :count: the number of rows
+        :has_more: more rows are loaded on scroll
         """
-        label.setText(f"المجموع ({len(rows)})")
+        label.setText(f"المجموع ({count}+)" if has_more else f"المجموع ({count})")
 
-    def populate_table_widget(self, table_name, response):
+    def table_row(self, table_name, doc):
+        """
+        Transform one document into the row displayed in the table.
+        :table_name: ( Products | Orders | Customers )
+        :doc: the document from database
+        """
+        return TABLE_SPECS[table_name].row(doc)
+
+    def populate_table_widget(self, table_name, response, all_rows=False, query=None):
         """
         Display rows in tableWidget_name and update the count label.
         :table_name: tableWidget name ( Products | Orders | Customers )
-        :rows: rows to diaplay in table
         :response: the response from database
+        :all_rows: the response has every row of the table (no search or filter), saved in the page cache on exit
+        :query: the query of the rows, checked by apply_change before inserting a new document
+                (None: not known, an insert reloads the table)
         """
-        # PRODUCTS
-        if table_name == 'Products':
-            table_widget = self.ui.tableWidgetProduct
-            headers = arabic.prod_headers
-            count_label = self.ui.labelProductTableCount
-            rows = [
-                [
-                    doc.get(field, "") for field in self.product_projection
-                ] for doc in response["documents"]
-            ]
+        headers = TABLE_SPECS[table_name].headers
+        documents = response["orders"] if "orders" in response else response["documents"]
+        rows = [self.table_row(table_name, doc) for doc in documents]
 
-        # CUSTOMERS
-        elif table_name == 'Customers':
-            table_widget = self.ui.tableWidgetCustomer
-            headers = arabic.customer_headers
-            count_label = self.ui.labelCustomerTableCount
-            rows = [
-                [
-                    doc.get('_id', ''),
-                    doc.get('first_name', ''),
-                    doc.get('last_name', ''),
-                    doc.get('phone', ''),
-                    doc.get('email', ''),
-                    doc.get('address', ''),
-                    arabic.status_mapping_en.get(doc.get('is_active', ''), ''),
-                    arabic.status_mapping_en.get(doc.get('client_status', ''), ''),
-                ] for doc in response["documents"]
-            ]
+        table_widget, count_label = self.tables[table_name]
+        if table_name in self.lazy_rows:
+            self.lazy_rows.pop(table_name).close()
+        Utils.populate_table_widget(table_widget, rows, headers)
+        self.index_rows(table_name)
+        self.table_views[table_name] = query
 
-        # ORDERS
-        elif table_name == 'Orders':
-            table_widget = self.ui.tableWidgetOrders
-            headers = arabic.order_headers
-            count_label = self.ui.labelOrderTableCount
-            rows = [
-                [
-                    order.get("_id", ""),
-                    order.get("customer_name", "غير مسجل"),
-                    order.get("order_date", "").strftime('%Y - %m - %d'),
-                    arabic.status_mapping_en.get(order.get("status", ""), ""),
-                    order.get("total_price", ""),
-                ] for order in response["orders"]
-            ]
+        # The first page of a sorted table: the next pages are loaded on scroll
+        page = response.get("page")
+        if page is None:
+            self.table_pages.pop(table_name, None)
+        else:
+            self.table_pages[table_name] = page
 
-        Utils.populate_table_widget(table_widget, rows, headers)
-        self.update_count_label(count_label, rows)
+        self.stale_tables.discard(table_name)
+        if all_rows and page is None:
+            self.table_loaded_at[table_name] = datetime.now()
+        else:
+            self.table_loaded_at.pop(table_name, None)
+        self.update_count_label(count_label, len(rows), page is not None and page["has_more"])
         Utils.pagebuttons_stats(self)
 
-    def fetch_and_display_data(self, collection_name: str, headers: list, query=None, projection=None, sort=None):
+    def index_rows(self, table_name):
+        """
+        Index the rows by _id; item.row() follows the row when rows are removed.
+        """
+        table_widget, _ = self.tables[table_name]
+        self.row_items[table_name] = {
+            table_widget.item(row, 0).text(): table_widget.item(row, 0) for row in range(table_widget.rowCount())
+        }
+
+    def lazy_projection(self, table_name):
+        """
+        The fields fetched for a lazily filled table (customer_name is resolved on display).
+        """
+        projection, _, _ = pipelines.split_customer_name_projection(TABLE_SPECS[table_name].projection)
+        return projection
+
+    def populate_table_lazily(self, table_name, documents, filled=None):
+        """
+        Display raw documents: the rows are decoded and drawn when they scroll into view.
+        :table_name: ( Products | Orders | Customers )
+        :documents: list of RawBSONDocument (see fetch_documents(raw=True)), or {"_id"} only
+                    for a row read when it is drawn (see fill_lazy_rows)
+        :filled: the rows already drawn (painted from the page cache), default none
+        """
+        table_widget, count_label = self.tables[table_name]
+        if table_name in self.lazy_rows:
+            self.lazy_rows.pop(table_name).close()
+        self.table_pages.pop(table_name, None)
+        self.stale_tables.discard(table_name)
+        self.table_loaded_at[table_name] = datetime.now()
+        self.table_views[table_name] = {}
+
+        headers = TABLE_SPECS[table_name].headers
+        table_widget.clear()
+        table_widget.setColumnCount(len(headers))
+        table_widget.setHorizontalHeaderLabels(headers)
+        table_widget.horizontalHeader().setStretchLastSection(True)
+
+        self.row_items[table_name] = {}
+        lazy_rows = LazyTableRows(
+            table_widget, documents, lambda rows, docs: self.fill_lazy_rows(table_name, rows, docs), filled=filled
+        )
+        self.lazy_rows[table_name] = lazy_rows
+        QtCore.QTimer.singleShot(0, lazy_rows.fill_visible)
+
+        self.update_count_label(count_label, len(documents))
+        Utils.pagebuttons_stats(self)
+
+    def fill_lazy_rows(self, table_name, rows, documents):
+        """
+        Decode and draw the given rows of a lazily filled table.
+        """
+        table_widget, _ = self.tables[table_name]
+        documents = [dict(document) for document in documents]
+
+        # Rows painted from the page cache (or changed since) hold their _id only
+        unread = [document["_id"] for document in documents if len(document) == 1]
+        if unread:
+            response = self.db_handler.fetch_documents(
+                table_name, query={"_id": {"$in": unread}}, projection=self.lazy_projection(table_name)
+            )
+            found = {document["_id"]: document for document in response.get("documents", [])}
+            documents = [found.get(document["_id"], document) for document in documents]
+
+        if table_name == 'Orders':
+            names = self.db_handler.resolve_customer_names(document.get("customer_id") for document in documents)
+            for document in documents:
+                document["customer_name"] = names.get(document.get("customer_id"))
+
+        for row, document in zip(rows, documents):
+            Utils.set_table_row(table_widget, row, self.table_row(table_name, document))
+
+    def apply_lazy_change(self, table_name, change):
+        """
+        apply_change for a lazily filled table: the row is located in its documents.
+        """
+        lazy_rows = self.lazy_rows[table_name]
+        row = lazy_rows.find_row(str(change["document_id"]))
+
+        if change["operation"] == "delete":
+            if row is not None:
+                lazy_rows.remove_row(row)
+            return
+
+        if row is None and change["operation"] != "insert":
+            return
+        response = self.db_handler.fetch_documents(
+            table_name, query={"_id": change["document_id"]}, projection=self.lazy_projection(table_name)
+        )
+        documents = response.get("documents", [])
+        if not documents:
+            return
+        if row is None:
+            lazy_rows.append(documents[0])
+        else:
+            lazy_rows.set_document(row, documents[0])
+
+    def sort_table(self, table_name, column):
+        """
+        Header click: ascending, then descending, then back to the default order.
+        The table is reloaded (with the search text of its page) sorted by the server.
+        :table_name: ( Products | Orders | Customers )
+        :column: the clicked column
+        """
+        field = TABLE_SPECS[table_name].fields[column]
+        if field in TABLE_SPECS[table_name].sortable:
+            current = self.table_sort.get(table_name)
+            if current is None or current[0] != field:
+                self.table_sort[table_name] = (field, 1)
+            elif current[1] == 1:
+                self.table_sort[table_name] = (field, -1)
+            else:
+                del self.table_sort[table_name]
+            self.reload_table(table_name)
+        self.show_sort_indicator(table_name)
+
+    def show_sort_indicator(self, table_name):
+        header = self.tables[table_name][0].horizontalHeader()
+        current = self.table_sort.get(table_name)
+        header.setSortIndicatorShown(current is not None)
+        if current is not None:
+            field, direction = current
+            header.setSortIndicator(
+                TABLE_SPECS[table_name].fields.index(field),
+                QtCore.Qt.AscendingOrder if direction == 1 else QtCore.Qt.DescendingOrder
+            )
+
+    def reload_table(self, table_name):
+        """
+        Reload a table with the current search text of its page.
+        """
+        if table_name == 'Products':
+            self.search_products()
+            self.refresh_product_facets()
+        elif table_name == 'Customers':
+            self.search_customers(self.ui.lineEditSearchCustomer.text().strip())
+        elif self.ui.lineEditSearchOrder.text().strip():
+            self.search_orders()
+        else:
+            self.all_orders()
+
+    def fetch_sorted_page(self, table_name, query=None):
+        """
+        Fetch the first page of a table sorted by a header click (see sort_table).
+        :return: the fetch_page response, with the paging state under "page"
+        """
+        field, direction = self.table_sort[table_name]
+        response = self.db_handler.fetch_page(table_name, query=query, sort_field=field, direction=direction)
+        if response["status"] == "success":
+            documents = response["documents"]
+            response["page"] = {
+                "query": query,
+                "last": documents[-1] if documents else None,
+                "has_more": response["has_more"],
+            }
+        return response
+
+    def load_next_page(self, table_name, value):
+        """
+        Append the next page of a sorted table when it is scrolled to the bottom.
+        :value: the vertical scroll bar value
+        """
+        page = self.table_pages.get(table_name)
+        table_widget, count_label = self.tables[table_name]
+        if page is None or not page["has_more"] or value < table_widget.verticalScrollBar().maximum():
+            return
+
+        field, direction = self.table_sort[table_name]
+        response = self.db_handler.fetch_page(
+            table_name, query=page["query"], sort_field=field, direction=direction, after=page["last"]
+        )
+        if response["status"] != "success":
+            logger.error(f"Error fetching the next page of {table_name}: {response['message']}")
+            return
+
+        documents = response["documents"]
+        page["has_more"] = response["has_more"]
+        if documents:
+            page["last"] = documents[-1]
+
+        row_items = self.row_items[table_name]
+        first_row = table_widget.rowCount()
+        table_widget.setRowCount(first_row + len(documents))
+        for row, doc in enumerate(documents, start=first_row):
+            Utils.set_table_row(table_widget, row, self.table_row(table_name, doc))
+            row_items[table_widget.item(row, 0).text()] = table_widget.item(row, 0)
+        self.update_count_label(count_label, table_widget.rowCount(), page["has_more"])
+
+    def fetch_table_document(self, table_name, document_id, view=None):
+        """
+        Fetch the single document needed to (re)draw one row.
+        :view: the query of the displayed rows: None is returned when the document is not one of them
+        :return: the document or None
+        """
+        query = {"_id": document_id}
+        if view:
+            # Read the same way as the rows of the view, so it matches exactly like they did
+            query = {"$and": [query, view]}
+        response = self.db_handler.fetch_records(table_name, query=query)
+        documents = response.get("documents", [])
+        return documents[0] if documents else None
+
+    def apply_change(self, change):
+        """
+        Apply one document change to its table: only the changed row is fetched and redrawn.
+        :change: {"collection": ..., "operation": insert | update | delete | reload, "document_id": ...}
+        """
+        table_name = change["collection"]
+        if table_name not in self.tables:
+            return
+        table_widget, count_label = self.tables[table_name]
+        row_items = self.row_items[table_name]
+
+        if change["operation"] == "reload":
+            self.reload_table(table_name)
+            return
+
+        if table_name in self.lazy_rows:
+            self.apply_lazy_change(table_name, change)
+            self.update_count_label(count_label, table_widget.rowCount())
+            return
+
+        key = str(change["document_id"])
+        item = row_items.get(key)
+        view = self.table_views.get(table_name)
+
+        if change["operation"] == "delete":
+            if item is not None:
+                table_widget.removeRow(item.row())
+                del row_items[key]
+        elif item is None and change["operation"] != "insert":
+            # An update of a row that is not displayed (filtered view) is ignored
+            return
+        elif item is None and view is None:
+            # The rows of the table cannot be checked: read them again
+            self.reload_table(table_name)
+            return
+        else:
+            doc = self.fetch_table_document(table_name, change["document_id"], view)
+            if doc is None:
+                # Not (or no longer) in the view: filtered, searched, orders of another customer
+                if item is not None:
+                    table_widget.removeRow(item.row())
+                    del row_items[key]
+            elif item is None and table_name in self.table_pages:
+                page = self.table_pages[table_name]
+                if not self.sorts_after_page(table_name, doc):
+                    # Among the loaded rows of a sorted table: read its first page again
+                    self.reload_table(table_name)
+                    return
+                if page["has_more"]:
+                    # On a page not loaded yet: load_next_page draws it
+                    return
+                self.draw_row(table_name, doc)
+                page["last"] = doc
+            else:
+                self.draw_row(table_name, doc)
+
+        page = self.table_pages.get(table_name)
+        self.update_count_label(count_label, table_widget.rowCount(), page is not None and page["has_more"])
+
+    def sorts_after_page(self, table_name, doc):
+        """
+        True when a document comes after the last loaded row of a sorted table (page_sort order).
+        """
+        field, direction = self.table_sort[table_name]
+        last = self.table_pages[table_name]["last"]
+        if last is None:
+            return True
+        values = {"_id": doc["_id"], field: doc.get(field)}
+        return match(values, paging.keyset_query(None, field, direction, last))
+
+    def draw_row(self, table_name, doc):
+        """
+        Redraw the row of a document, appended when it is not displayed.
+        """
+        table_widget, _ = self.tables[table_name]
+        row_items = self.row_items[table_name]
+        key = str(doc["_id"])
+        item = row_items.get(key)
+
+        sorting_enabled = table_widget.isSortingEnabled()
+        table_widget.setSortingEnabled(False)
+        if item is None:
+            row = table_widget.rowCount()
+            table_widget.insertRow(row)
+        else:
+            row = item.row()
+        Utils.set_table_row(table_widget, row, self.table_row(table_name, doc))
+        row_items[key] = table_widget.item(row, 0)
+        table_widget.setSortingEnabled(sorting_enabled)
+
+    def fetch_and_display_data(self, collection_name: str, query=None, projection=None, sort=None):
         """
         Generic function to fetch and display data in a table widget.
         :param collection_name: MongoDB collection name.
-        :param headers: List of headers to display in the table widget.
         :param query: MongoDB query filter.
-        :param projection: Fields to include or exclude in results.
+        :param projection: Fields to include or exclude in results (default: the table columns as records).
         :param sort: Sort order.
         """
-        response = self.db_handler.fetch_documents(
-            collection_name=collection_name,
-            query=query or {},
-            projection=projection,
-            sort=sort or [("created_at", 1)]
-        )
+        if projection is None and collection_name in self.table_sort:
+            response = self.fetch_sorted_page(collection_name, query or {})
+        elif projection is None:
+            # Only the displayed columns, as compact records
+            response = self.db_handler.fetch_records(
+                collection_name, query=query or {}, sort=sort or [("created_at", 1)]
+            )
+        else:
+            response = self.db_handler.fetch_documents(
+                collection_name=collection_name,
+                query=query or {},
+                projection=projection,
+                sort=sort or [("created_at", 1)]
+            )
 
         if response["status"] == "success":
             # display data in tableWidget
-            self.populate_table_widget(collection_name, response)
+            self.populate_table_widget(
+                collection_name, response, all_rows=not query and projection is None,
+                query=(query or {}) if projection is None else None
+            )
         else:
             logger.error(f"Error fetching data from {collection_name}: {response['message']}")
             Utils.success_message(self.ui.labelErrorProductPage, response['message'], success=False)
@@ -246,6 +897,34 @@ class Interface(QtWidgets.QMainWindow):
         for button in buttons:
             button.setEnabled(Utils.selected_rows(table_widget))
 
+    def schedule_prefetch(self, table_widget, coll_name):
+        """The selection moved: prefetch the details of the new row once it settles."""
+        self.prefetch_target = (table_widget, coll_name)
+        self.prefetch_timer.start()
+
+    def prefetch_details(self):
+        """
+        Load the document of the selected row in the details cache, without blocking the GUI:
+        awaited on the qasync loop when the async handler is connected, else read by a worker
+        thread. From the local replica it is a primary key read of the SQLite file, done here.
+        """
+        table_widget, coll_name = self.prefetch_target
+        if table_widget.currentRow() == -1 or table_widget.item(table_widget.currentRow(), 0) is None:
+            return
+        document_id = Utils.get_column_value(table_widget, 0)
+        if not ObjectId.is_valid(document_id) or self.detail_cache.cached(coll_name, document_id) is not None:
+            return
+
+        if self.async_db_handler is not None and self.db_handler.online:
+            asyncio.ensure_future(self.detail_cache.prefetch_async(self.async_db_handler, coll_name, document_id))
+        elif self.db_handler.replica is None:
+            worker = DetailPrefetcher(self.detail_cache, coll_name, document_id, self)
+            worker.fetched.connect(self.detail_cache.prefetched)
+            worker.finished.connect(worker.deleteLater)
+            worker.start()
+        else:
+            self.detail_cache.prefetch(coll_name, document_id)
+
     def item_details(self, lineEditEnabled, operation='None', coll_name="Products", item_id=None):
         """
         Show details for a selected Product.
@@ -270,23 +949,20 @@ class Interface(QtWidgets.QMainWindow):
         self.ui.labelMongoTable.setText(coll_name)
         self.ui.frameDetailsID.hide()
 
+        # search_keys is derived from the names and phone (see lookup.customer_search_keys)
         if operation in ['Edit', 'Create']:
-            projection = {"_id": 0, "created_at": 0, "updated_at": 0, "client_status": 0}
+            exclude = ("_id", "created_at", "updated_at", "client_status", "search_keys")
             self.ui.frameToolButton_2.show()
         else:
-            projection = {"_id": 0}
+            exclude = ("_id", "search_keys")
             self.ui.frameToolButton_2.hide()
 
-        response = self.db_handler.fetch_documents(
-            collection_name=coll_name,
-            query={"_id": ObjectId(item_id)},
-            projection=projection,
-        )
+        response = self.detail_cache.get(coll_name, item_id)
         if response["status"] == "error":
             Utils.success_message(label_message, response['message'], False)
             return
 
-        response = response["documents"][0]
+        response = project(response["document"], exclude)
 
         self.populate_formFrame(response, lineEditEnabled=lineEditEnabled)
 
@@ -334,12 +1010,9 @@ class Interface(QtWidgets.QMainWindow):
                 logger.debug(f"Delete One from {coll_name} :: {ids}")
                 response = self.db_handler.delete_document(coll_name, ObjectId(ids))
 
-            # Delete items from database
+            # Delete items from database (the rows are removed by apply_change)
             if response['status'] == 'success':
-                if coll_name == 'Products': self.goto_page(page="Products")
-                elif coll_name == 'Orders': self.goto_page(page="Orders")
-                elif coll_name == 'Customers': self.goto_page(page="Customers")
-
+                self.enable_disable_buttons(page=coll_name)
                 Utils.success_message(label, 'تم الحذف بنجاح', success=True)
             else:
                 Utils.success_message(label, 'هناك خطأ أعد من جديد', success=False)
@@ -372,7 +1045,6 @@ class Interface(QtWidgets.QMainWindow):
                     field="is_active",
                     new_value=True
                 )
-                self.goto_page(page=coll_name)
                 Utils.success_message(label, response["message"], response["status"] == "success")
 
     def change_order_status(self, new_status):
@@ -386,7 +1058,6 @@ class Interface(QtWidgets.QMainWindow):
             logger.debug('Order Cancelled: the quantity must return to product')
             response = self.db_handler.cancel_order(item_id)
             Utils.success_message(self.ui.labelErrorOrderPage, response['message'], response['status'] == 'success')
-            self.all_orders()
         else:
             response = self.db_handler.update_record_state(
                 collection_name='Orders',
@@ -394,50 +1065,37 @@ class Interface(QtWidgets.QMainWindow):
                 new_value=new_status
             )
             Utils.success_message(self.ui.labelErrorOrderPage, response['message'], response['status'] == 'success')
-            self.all_orders()
 
     # ************************************************
     #   => Form Management
     # ************************************************
     def create_form(self, fields):
         """
-        Dynamically create a form for new entries.
+        Show the form for new entries (built the first time, emptied afterwards).
         :param fields: A dictionary mapping keys to Arabic labels.
         """
-        Utils.clear_details_form(self.ui.formLayout)
-        parent = self.ui.scrollAreaWidgetContents
-        for count, (key, label) in enumerate(fields.items(), start=1):
-            if key == 'qte':
-                value_edit = Utils.create_spinBox(parent, f"lineEdit_{key}")
-                value_edit.setValue(0)
-                value_edit.setEnabled(True)
-            elif key == 'price':
-                value_edit = Utils.create_doubleSpinBox(parent, f"lineEdit_{key}")
-                value_edit.setValue(0)
-                value_edit.setEnabled(True)
-            elif key == 'client_status':
-                values = ["عميل جيد", "عميل سيئ", "موثوق"]
-                # Create the comboBox
-                value_edit = Utils.create_comboBox(parent=parent, object_name=f"lineEdit_{key}", values=values)
-            else:
-                value_edit = Utils.create_lineEdit(parent, f"lineEdit_{key}")
-                value_edit.setText("")
-                value_edit.setEnabled(True)
-
-            key_label = Utils.create_label(parent, f"label_{key}")
-            key_label.setText(label)
-
-            self.ui.formLayout.setWidget(count, QtWidgets.QFormLayout.FieldRole, value_edit)
-            self.ui.formLayout.setWidget(count, QtWidgets.QFormLayout.LabelRole, key_label)
+        form = self.detail_forms.show("create", tuple(fields.items()), self.create_form_editor)
+        form.clear()
 
         self.ui.stackedWidgetDetails.setCurrentWidget(self.ui.allDetailsPage)
         self.ui.frameToolButton_2.show()
         self.ui.dockWidget.show()
 
+    def create_form_editor(self, parent, key):
+        """The editor of a field of the new entries form."""
+        if key == 'qte':
+            return Utils.create_spinBox(parent, f"lineEdit_{key}")
+        if key == 'price':
+            return Utils.create_doubleSpinBox(parent, f"lineEdit_{key}")
+        if key == 'client_status':
+            values = ["عميل جيد", "عميل سيئ", "موثوق"]
+            return Utils.create_comboBox(parent=parent, object_name=f"lineEdit_{key}", values=values)
+        return Utils.create_lineEdit(parent, f"lineEdit_{key}")
+
     def collect_form_data(self, formLayout):
         """
         Collect data from formFrame QLineEdit fields and product table.
-        :formLayout: the layout to collect data from ( self.ui.formLayout | self.ui.formLayoutNewOrder )
+        :formLayout: the layout to collect data from ( self.detail_forms.current.layout | self.ui.formLayoutNewOrder )
         :return: A dictionary containing the input data.
         """
         input_data = {}
@@ -476,7 +1134,8 @@ class Interface(QtWidgets.QMainWindow):
                         key = input_widget.objectName().replace("comboBoxAddOrder", "").lower()
 
                     if key == 'customer_id':
-                        value = self.customers_map.get(input_widget.currentText().strip(), '')
+                        customer = self.customer_completer.current_document()
+                        value = str(customer["_id"]) if customer is not None else ''
                     elif key in ['status', 'client_status']:
                         value = arabic.status_mapping.get(input_widget.currentText().strip(), 'None')
                     else:
@@ -514,7 +1173,7 @@ class Interface(QtWidgets.QMainWindow):
             return
 
         # Collect data
-        data = self.collect_form_data(self.ui.formLayout)
+        data = self.collect_form_data(self.detail_forms.current.layout)
         # ------------# Products ------------#
         if mongo_table == 'Products':
             label = self.ui.labelErrorProductPage
@@ -523,13 +1182,6 @@ class Interface(QtWidgets.QMainWindow):
             # CREATE PRODUCT
             if operation == 'Create':
                 response = self.db_handler.create_product(**data)
-                if response['status'] == 'success':
-                    # re-display all the Products
-                    self.fetch_and_display_data(
-                        collection_name='Products',
-                        headers=self.product_projection
-                    )
-
                 Utils.success_message(self.ui.labelErrorProductPage, response['message'], response['status'] == 'success')
 
             # UPDATE PRODUCT
@@ -539,11 +1191,6 @@ class Interface(QtWidgets.QMainWindow):
                 if response['status'] == 'success':
                     Utils.success_message(label, 'تم تعديل المنتج بنجاح', success=True)
                     self.item_details(lineEditEnabled=False, operation='None', item_id=product_id)
-                    # re-display all Products
-                    self.fetch_and_display_data(
-                        collection_name='Products',
-                        headers=self.product_projection
-                    )
                 else:
                     Utils.success_message(label, 'هنالك خطأ إعد من جديد', success=False)
 
@@ -557,12 +1204,6 @@ class Interface(QtWidgets.QMainWindow):
                 if response['status'] == 'success':
                     message = "تم إضافة المشتري بنجاح"
                     Utils.success_message(label, message, success=True)
-
-                    # re-display all customers in tableWidget
-                    self.fetch_and_display_data(
-                        collection_name='Customers',
-                        headers=self.customer_projection
-                    )
                 else:
                     message = "هنالك خطأ إعد من جديد"
                     Utils.success_message(label, message, success=True)
@@ -577,11 +1218,6 @@ class Interface(QtWidgets.QMainWindow):
                 if response['status'] == 'success':
                     Utils.success_message(label, "تم التعديل على المشتري بنجاح", success=True)
                     self.item_details(lineEditEnabled=False, coll_name='Customers', operation='None', item_id=customer_id)
-                    # re-display the Customers in the tableWidget
-                    self.fetch_and_display_data(
-                        collection_name='Customers',
-                        headers=self.customer_projection
-                    )
                 else:
                     Utils.success_message(label, 'هنالك خطأ إعد من جديد', success=False)
 
@@ -592,11 +1228,21 @@ class Interface(QtWidgets.QMainWindow):
             if operation == 'Create':
                 data = self.collect_form_data(self.ui.formLayoutNewOrder)
                 del data['labelCartTotal']
+                data['products'] = self.cart.order_products()
+                data['expected_prices'] = self.cart.expected_prices()
 
                 response = self.db_handler.create_order(**data)
                 if response['status'] == 'success':
+                    self.customer_completer.remember()
                     Utils.success_message(label, 'تم بنجاح')
-                    self.all_orders()
+                elif response.get('price_changes'):
+                    # Show the current prices: the clerk saves again to accept them
+                    self.cart.apply_prices(response['price_changes'])
+                    self.show_cart()
+                    changes = "، ".join(
+                        f"{change['name']}: {change['expected']} ← {change['current']}" for change in response['price_changes']
+                    )
+                    Utils.success_message(label, f"تغيرت الأسعار ({changes})، احفظ مرة أخرى للتأكيد", success=False)
                 else:
                     Utils.success_message(label, response['message'], success=False)
 
@@ -621,11 +1267,44 @@ class Interface(QtWidgets.QMainWindow):
             {"category": {"$regex": search_text, "$options": "i"}},  # Search in category
         ]} if search_text else {}
 
+        # Narrow with the filters of the sidebar
+        filter_query = self.product_filter_query()
+        if query and filter_query:
+            query = {"$and": [query, filter_query]}
+        else:
+            query = query or filter_query
+
         # Fetch matching products
-        response = self.db_handler.fetch_products(query=query)
+        if 'Products' in self.table_sort:
+            response = self.fetch_sorted_page('Products', query)
+        else:
+            response = self.db_handler.fetch_records('Products', query=query)
         if response["status"] == "success":
             # populate in tableWidget
-            self.populate_table_widget('Products', response)
+            self.populate_table_widget('Products', response, all_rows=not query, query=query)
+        else:
+            Utils.success_message(self.ui.labelErrorProductPage, response['message'], False)
+
+    def product_filter_query(self):
+        """
+        The query of the filters checked in the sidebar.
+        """
+        return facets.filter_query(self.ui.productFilters.filters())
+
+    def filter_products(self, filters):
+        """
+        A filter was toggled: display the matching products and update the counts.
+        """
+        self.search_products()
+        self.refresh_product_facets()
+
+    def refresh_product_facets(self):
+        """
+        Update the counts of the sidebar (cached by the handler until a product changes).
+        """
+        response = self.db_handler.fetch_product_facets(self.ui.productFilters.filters())
+        if response["status"] == "success":
+            self.ui.productFilters.set_counts(response["facets"])
         else:
             Utils.success_message(self.ui.labelErrorProductPage, response['message'], False)
 
@@ -651,6 +1330,36 @@ class Interface(QtWidgets.QMainWindow):
         # create the form
         self.create_form(fields)
 
+    def import_products(self):
+        """
+        Import products from a supplier CSV/XLSX file (upsert by ref).
+        """
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "استيراد السلع", "", "Spreadsheets (*.csv *.xlsx)"
+        )
+        if not path:
+            return
+
+        # Streaming import: the total is unknown, show a busy progress dialog
+        progress = QtWidgets.QProgressDialog("جاري الاستيراد...", None, 0, 0, self)
+        progress.setWindowModality(QtCore.Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.show()
+
+        def report_progress(processed, failed):
+            progress.setLabelText(f"تمت معالجة {processed} سطر ({failed} خطأ)")
+            QtWidgets.QApplication.processEvents()
+
+        response = ProductImporter(self.db_handler).import_file(path, progress_callback=report_progress)
+        progress.close()
+
+        if response['status'] == 'success':
+            self.goto_page(page="Products")
+            message = f"تم الاستيراد: {response['inserted']} جديد، {response['modified']} معدل، {response['failed']} خطأ"
+            Utils.success_message(self.ui.labelErrorProductPage, message, success=response['failed'] == 0)
+        else:
+            Utils.success_message(self.ui.labelErrorProductPage, response['message'], success=False)
+
     # *******************************************
     #       => Product Details Widget
     # *******************************************
@@ -665,57 +1374,50 @@ class Interface(QtWidgets.QMainWindow):
         :param response: dict The response from MongoDB (e.g., response['product']).
         :param lineEditEnabled: If details; enabled=False; else True.
         """
-        # Clear the existing form
-        form_layout = self.ui.formLayout
-        Utils.clear_details_form(form_layout)
+        # Same keys (same collection and projection) => same form, only the values change
+        fields = tuple((key, arabic.arabic_mapping.get(key, key)) for key in response)
+        form = self.detail_forms.show("details", fields, self.details_editor)
+
+        for key, value in response.items():
+            editor = form.editors[key]
+            # Products of an order: refill the table of the form
+            if key == "products":
+                self.fill_product_table(editor, value)
+                continue
 
-        for count, (key, value) in enumerate(response.items(), start=1):
             # If the key is a date field, transform its format
             date_fields = ["created_at", "updated_at", "order_date"]
             if key in date_fields and (isinstance(value, str) or isinstance(value, datetime)):
                 value = Utils.datetime_fields(value)
 
-            # Create QTableWidget to display Products for a specific Order
-            if key == "products":
-                product_table = self.create_product_table(value)
-                form_layout.setWidget(count, QtWidgets.QFormLayout.FieldRole, product_table)
-
-                key_label = Utils.create_label(self.ui.scrollAreaWidgetContents, f"label_{key}")
-                key_label.setText(arabic.arabic_mapping.get(key, key))
-                form_layout.setWidget(count, QtWidgets.QFormLayout.LabelRole, key_label)
-                continue
-
             # Translate to arabic
             if key in ["status", "is_active", "client_status"]:
                 value = arabic.status_mapping_en.get(value, value)
 
-            # Create a line edit for the value
-            value_edit = Utils.create_lineEdit(self.ui.scrollAreaWidgetContents, f"lineEdit_{key}")
-            value_edit.setText(str(value))
-            value_edit.setEnabled(lineEditEnabled)
-
-            # Translate the key to Arabic using the mapping and create the Label
-            translated_key = arabic.arabic_mapping.get(key, key)  # Default to key if no translation exists
-            key_label = Utils.create_label(self.ui.scrollAreaWidgetContents, f"label_{key}")
-            key_label.setText(translated_key)
-
-            # Add the widgets to the form layout
-            form_layout.setWidget(count, QtWidgets.QFormLayout.FieldRole, value_edit)
-            form_layout.setWidget(count, QtWidgets.QFormLayout.LabelRole, key_label)
+            editor.setText(str(value))
+            editor.setEnabled(lineEditEnabled)
 
         self.ui.stackedWidgetDetails.setCurrentWidget(self.ui.allDetailsPage)
         self.ui.dockWidget.show()
 
-    def create_product_table(self, products):
+    def details_editor(self, parent, key):
+        """The editor of a field of the details form: a table for the products of an order."""
+        if key == "products":
+            headers = ["اسم المنتج", "الكمية", "السعر", "المجموع"]
+            table_widget = Utils.create_qtablewidget(column_count=4, headers=headers)
+            table_widget.setParent(parent)
+            return table_widget
+        return Utils.create_lineEdit(parent, f"lineEdit_{key}")
+
+    def fill_product_table(self, table_widget, products):
         """
         Order Details TableWidget for products
-        Create a QTableWidget to display products for a specific order.
+        Fill the table of the details form with the products of an order.
 
+        :param table_widget: The products QTableWidget of the form (reused between orders).
         :param products: List of product dictionaries (e.g., [{"product_id": "...", "quantity": 2}, ...]).
-        :return: QTableWidget instance populated with product data.
         """
-        headers = ["اسم المنتج", "الكمية", "السعر", "المجموع"]
-        table_widget = Utils.create_qtablewidget(column_count=4, headers=headers)
+        table_widget.setRowCount(0)
         table_widget.setRowCount(len(products))
 
         # Populate the table with product data
@@ -723,6 +1425,7 @@ class Interface(QtWidgets.QMainWindow):
             product_id = product.get("product_id", "")
             quantity = product.get("quantity", 0)
             product_name = "غير معروف"
+            price = 0
             total = 0
 
             # Fetch product name and price from the database
@@ -735,7 +1438,7 @@ class Interface(QtWidgets.QMainWindow):
             if product_response["status"] == "success" and product_response["documents"]:
                 product_data = product_response["documents"][0]
                 product_name = product_data.get("name", "غير معروف")
-                price = Decimal(product_data.get("price", 0).to_decimal())
+                price = product_data.get("price", 0)
                 total = price * quantity
 
             # Fill the row with product data
@@ -744,8 +1447,6 @@ class Interface(QtWidgets.QMainWindow):
             table_widget.setItem(row, 2, QtWidgets.QTableWidgetItem(f"{price}"))
             table_widget.setItem(row, 3, QtWidgets.QTableWidgetItem(f"{total:.2f}"))
 
-        return table_widget
-
     # ********************************************
     #       => CUSTOMERS PAGE
     # ********************************************
@@ -765,9 +1466,12 @@ class Interface(QtWidgets.QMainWindow):
         ]} if search_text else {}
 
         # Fetch matching customers from the database
-        response = self.db_handler.fetch_customers(query=query)
+        if 'Customers' in self.table_sort:
+            response = self.fetch_sorted_page('Customers', query)
+        else:
+            response = self.db_handler.fetch_records('Customers', query=query)
         if response["status"] == "success":
-            self.populate_table_widget('Customers', response)
+            self.populate_table_widget('Customers', response, all_rows=not query, query=query)
         else:
             Utils.success_message(self.ui.labelErrorCustomerPage, response['message'], False)
 
@@ -805,7 +1509,7 @@ class Interface(QtWidgets.QMainWindow):
         if response["status"] == "success":
             if len(response["orders"]) > 0:
                 # display details in Orders Page
-                self.populate_table_widget('Orders', response)
+                self.populate_table_widget('Orders', response, query={"customer_id": ObjectId(customer_id)})
                 self.ui.containerStackedWidget.setCurrentWidget(self.ui.OrderPage)
             else:
                 Utils.success_message(self.ui.labelErrorCustomerPage, message=f"لا يوجد طلبيات للمشتري {customer_name}")
@@ -830,7 +1534,6 @@ class Interface(QtWidgets.QMainWindow):
 
         # Display success or error message
         if response["status"] == "success":
-            self.goto_page(page="Customers")
             Utils.success_message(self.ui.labelErrorCustomerPage, "تم تحديث حالة العميل بنجاح", True)
         else:
             Utils.success_message(self.ui.labelErrorCustomerPage, response["message"], False)
@@ -842,22 +1545,25 @@ class Interface(QtWidgets.QMainWindow):
         """
         Fetches all Orders from the database and displays them in the table widget.
         """
-        # Fetch all products
-        response = self.db_handler.fetch_orders_with_customer_names(
-            projection={
-                "_id": 1,
-                "customer_id": 1,
-                "order_date": 1,
-                "status": 1,
-                "total_price": 1,
-                "customer_name": 1
-            },
-            sort=[("created_at", 1)]  # Sort by create time
+        if 'Orders' in self.table_sort:
+            response = self.fetch_sorted_page('Orders')
+            if response["status"] == "success":
+                self.populate_table_widget('Orders', response, query={})
+            else:
+                Utils.success_message(self.ui.labelErrorOrderPage, response['message'], success=False)
+            return
+
+        # Fetch all orders as raw BSON: a row is decoded when it scrolls into view
+        response = self.db_handler.fetch_documents(
+            'Orders',
+            projection=self.lazy_projection('Orders'),
+            sort=[("created_at", 1)],  # Sort by create time
+            raw=True
         )
 
         if response["status"] == "success":
             # Display records in the table
-            self.populate_table_widget('Orders', response)
+            self.populate_table_lazily('Orders', response["documents"])
         else:
             logger.error(f"Error fetching orders: {response['message']}")
             Utils.success_message(self.ui.labelErrorOrderPage, response['message'], success=False)
@@ -876,12 +1582,34 @@ class Interface(QtWidgets.QMainWindow):
         } if search_term else {}
 
         # Fetch matching customers from the database
-        response = self.db_handler.fetch_orders_with_customer_names(query=query)
+        if 'Orders' in self.table_sort:
+            response = self.fetch_sorted_page('Orders', query)
+        else:
+            response = self.db_handler.fetch_records('Orders', query=query)
         if response["status"] == "success":
-            self.populate_table_widget('Orders', response)
+            self.populate_table_widget('Orders', response, all_rows=not query, query=query)
         else:
             Utils.success_message(self.ui.labelErrorOrderPage, response['message'], False)
 
+    def export_orders(self, status):
+        """
+        Export the orders to a CSV or Parquet file.
+        :status: the order status to export or "all"
+        """
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "تصدير الطلبيات", "orders.csv", "CSV (*.csv);;Parquet (*.parquet)"
+        )
+        if not path:
+            return
+
+        exporter = DataExporter(self.db_handler)
+        query = exporter.build_query('Orders', status=None if status == 'all' else status)
+        response = exporter.export('Orders', path, query=query)
+        if response['status'] == 'success':
+            Utils.success_message(self.ui.labelErrorOrderPage, f"تم تصدير {response['count']} طلبية")
+        else:
+            Utils.success_message(self.ui.labelErrorOrderPage, response['message'], success=False)
+
     def order_details(self, lineEditEnabled, operation='None'):
         """
         Show details for a selected Order.
@@ -897,21 +1625,18 @@ class Interface(QtWidgets.QMainWindow):
         self.ui.frameDetailsID.hide()
 
         if operation in ['Edit', 'Create']:
-            projection = {"_id": 0, "created_at": 0, "updated_at": 0}
+            exclude = ("_id", "created_at", "updated_at")
             self.ui.frameToolButton_2.show()
         else:
-            projection = {"_id": 0, "customer_id": 0}
+            exclude = ("_id", "customer_id")
             self.ui.frameToolButton_2.hide()
 
-        response = self.db_handler.fetch_orders_with_customer_names(
-            query={"_id": ObjectId(order_id)},
-            projection=projection,
-        )
+        response = self.detail_cache.get("Orders", order_id)
         if response["status"] == "error":
             self.ui.labelErrorOrderPage.setText(response["message"])
             return
 
-        response = response["orders"][0]
+        response = project(response["document"], exclude)
         # Re-order the fields
         response = {
             "order_date": response.get("order_date", ""),
@@ -939,31 +1664,14 @@ class Interface(QtWidgets.QMainWindow):
 
     def new_order_form(self):
         """
-        customers: response['documents']
+        The customer combobox lists the recent customers, the others are completed while typing.
         """
-        # Fetch all products to populate the combo box
-        response = self.db_handler.fetch_customers(
-            projection={"_id": 1, "first_name": 1, "last_name": 1},
-            sort=[("name", 1)]
-        )
-        if response['status'] == 'error':
-            logger.debug(response['message'])
-            return
-
         # Clear all the widget for the new order
-        self.ui.comboBoxAddOrderCustomer_id.clear()     # clear the combobox
+        self.customer_completer.reset()                 # recent customers only (no query)
         self.ui.comboBoxAddOrderStatus.clear()
         self.ui.dateEditAddOrderDate.clear()
-        self.ui.labelCartTotal.setText('0')
-        self.ui.tableWidgetAddOrderProds.setRowCount(0)
-
-        # Combobox Order Customers
-        self.customers_map = {}                         # Map orders names to ObjectIds
-        for customer in response['documents']:
-            cust_name = f"{customer.get('first_name', '')} {customer.get('last_name')}".strip()
-            cust_id = str(customer["_id"])
-            self.customers_map[cust_name] = cust_id
-            self.ui.comboBoxAddOrderCustomer_id.addItem(cust_name)
+        self.cart.clear()
+        self.show_cart()
 
         # Combobox Order Status
         for status in arabic.status_mapping_neworder.keys():
@@ -975,6 +1683,7 @@ class Interface(QtWidgets.QMainWindow):
         self.ui.frameToolButton_2.show()
         self.ui.stackedWidgetDetails.setCurrentWidget(self.ui.createOrderPage)
         self.ui.dockWidget.show()
+        self.ui.lineEditScanRef.setFocus()
 
     def add_product_to_table(self, table_widget):
         """
@@ -983,58 +1692,72 @@ class Interface(QtWidgets.QMainWindow):
 
         :param table_widget: The QTableWidget to add the product to.
         """
-        # Fetch all products to populate the combo box and the spin box
-        response = self.db_handler.fetch_products(
-            projection={"_id": 1, "name": 1, "qte": 1},
-            sort=[("name", 1)]
-        )
+        # Execute the dialog (products are looked up while typing) and add product to cart
+        dialog = AddProductToCart(self.product_lookup)
+        if dialog.exec_() == QtWidgets.QDialog.Accepted:
+            logger.debug('Adding product to cart from the QDialog')
+            # The picked product comes with its price: no other query
+            self.add_cart_line(table_widget, dialog.selected_product, dialog.qte)
+
+    def scan_to_cart(self):
+        """
+        Add one unit of the scanned product to the cart (a line already in the cart is incremented).
+        The product, its price and its stock come from one lookup of RefIndex.
+        """
+        start = time.perf_counter()
+        ref = self.ui.lineEditScanRef.text().strip()
+        self.ui.lineEditScanRef.clear()
+        if not ref:
+            return
 
-        if response["status"] != "success" or not response["documents"]:
-            QtWidgets.QMessageBox.warning(self, "خطأ", "لا توجد منتجات لإضافتها.")
+        product = self.ref_index.lookup(ref)
+        if product is None:
+            Utils.success_message(self.ui.labelErrorOrderPage, f"لا توجد سلعة بالمرجع {ref}", success=False)
             return
 
-        product_map = {}  # Map product names to ObjectIds
-        for product in response["documents"]:
-            product_name = product.get("name", "غير معروف")
-            product_id = str(product["_id"])
-            product_qte = product.get("qte", 0)
+        if product.get("qte", 0) <= self.cart.quantity(str(product["_id"])):
+            Utils.success_message(self.ui.labelErrorOrderPage, f"الكمية غير متوفرة: {product.get('name', ref)}", success=False)
+            return
 
-            product_map[product_name] = {"id": product_id, "qte": product_qte}
+        self.add_cart_line(self.ui.tableWidgetAddOrderProds, product, 1)
+        logger.debug(f"Scan {ref} -> cart in {(time.perf_counter() - start) * 1000:.2f} ms")
 
-        # Execute the dialog and add product to cart
-        dialog = AddProductToCart(product_map)
-        if dialog.exec_() == QtWidgets.QDialog.Accepted:
-            logger.debug('Adding product to cart from the QDialog')
-            # Get the selected product and quantity
-            selected_product_name = dialog.selected_product
-            product_id = product_map[selected_product_name]["id"]
-            quantity = dialog.qte
-
-            # Update the price
-            product_response = self.db_handler.db["Products"].find_one({"_id": ObjectId(product_id)}, {"price": 1})
-            prod_price = Decimal(product_response["price"].to_decimal())
-            total = Decimal(self.ui.labelCartTotal.text())
-            total += quantity * prod_price
-
-            self.ui.labelCartTotal.setText(f"{total}")
-
-            # Add the selected product to the table
-            table_widget.setColumnCount(5)  # Columns: Product ID, Name, Quantity, Actions
-            table_widget.setHorizontalHeaderLabels(["رقم المنتج", "اسم المنتج", "الكمية", "السعر", "إزالة"])
-            row_position = table_widget.rowCount()
-            table_widget.insertRow(row_position)
-            table_widget.setItem(row_position, 0, QtWidgets.QTableWidgetItem(product_id))
-            table_widget.setItem(row_position, 1, QtWidgets.QTableWidgetItem(selected_product_name))
-            table_widget.setItem(row_position, 2, QtWidgets.QTableWidgetItem(str(quantity)))
-            table_widget.setItem(row_position, 3, QtWidgets.QTableWidgetItem(str(prod_price)))
-
-            # Add a remove button
-            remove_button = QtWidgets.QPushButton(" إزالة")
-            remove_button.setIcon(qta.icon('fa.trash', color="#EA2027"))
-            remove_button.setIconSize(QtCore.QSize(20, 20))
-            remove_button.clicked.connect(lambda: table_widget.removeRow(row_position))
-
-            table_widget.setCellWidget(row_position, 4, remove_button)
+    def add_cart_line(self, table_widget, product, quantity):
+        """
+        Add a product to the cart (merged with its line if it is already there) and update the total.
+        :product: {"_id", "name", "price", ...}
+        """
+        line = self.cart.add(product, quantity)
+        row = self.cart.row(line.product_id)
+        if row == table_widget.rowCount():
+            table_widget.insertRow(row)
+            self.set_cart_row(table_widget, row, line)
+        else:
+            table_widget.item(row, 2).setText(str(line.quantity))
+        self.ui.labelCartTotal.setText(f"{self.cart.total}")
+
+    def remove_cart_line(self, product_id):
+        table_widget = self.ui.tableWidgetAddOrderProds
+        table_widget.removeRow(self.cart.row(product_id))
+        self.cart.remove(product_id)
+        self.ui.labelCartTotal.setText(f"{self.cart.total}")
+
+    def set_cart_row(self, table_widget, row, line):
+        # Column 4 (remove) is painted by self.cart_remove_delegate
+        Utils.set_table_row(table_widget, row, [line.product_id, line.name, line.quantity, line.price])
+
+    def show_cart(self):
+        """
+        Redraw the cart table and its total from self.cart.
+        """
+        table_widget = self.ui.tableWidgetAddOrderProds
+        table_widget.setRowCount(0)
+        table_widget.setColumnCount(5)  # Columns: Product ID, Name, Quantity, Price, Actions
+        table_widget.setHorizontalHeaderLabels(["رقم المنتج", "اسم المنتج", "الكمية", "السعر", "إزالة"])
+        table_widget.setRowCount(len(self.cart))
+        for row, line in enumerate(self.cart):
+            self.set_cart_row(table_widget, row, line)
+        self.ui.labelCartTotal.setText(f"{self.cart.total}")
 
     # ********************************************
     #       ==> STATISTICS PAGE
@@ -1048,7 +1771,7 @@ class Interface(QtWidgets.QMainWindow):
         self.ui.labelTotalQuantity.setText(f"إجمالي الكمية: {stats['products']['total_quantity']}")
 
         self.ui.labelTotalOrders.setText(f"إجمالي الطلبات: {stats['orders']['total_orders']}")
-        total_revenu = Decimal(stats['orders']['total_revenue'].to_decimal())
+        total_revenu = stats['orders']['total_revenue']
         self.ui.labelTotalRevenue.setText(f"إجمالي الإيرادات: ${total_revenu:.2f}")
 
         self.ui.labelTotalCustomers.setText(f"إجمالي العملاء: {stats['customers']['total_customers']}")
@@ -1104,7 +1827,18 @@ class Interface(QtWidgets.QMainWindow):
         """
         # Fetch statistics
         stats = self.db_handler.generate_statistics()
+        self.display_statistics(stats)
+
+    async def show_statistics_async(self):
+        """
+        Same as show_statistics, the sub-queries run concurrently without blocking the GUI.
+        """
+        stats = await self.async_db_handler.generate_statistics()
+        self.display_statistics(stats)
 
+    def display_statistics(self, stats):
+        if not stats:
+            return
         self.display_statistics_labels(stats)
         self.display_top_products(stats)
         self.plot_orders_by_status(stats)
@@ -1114,6 +1848,15 @@ if __name__ == '__main__':
     import sys
     app = QtWidgets.QApplication(sys.argv)
 
+    if qasync is not None:
+        loop = qasync.QEventLoop(app)
+        asyncio.set_event_loop(loop)
+
     dialog = Interface()
     dialog.show()
+
+    if qasync is not None:
+        with loop:
+            loop.run_forever()
+        sys.exit(0)
     sys.exit(app.exec_())
@@ -3,13 +3,84 @@
 #
 # ----------------------------------------------------------------------------
 
+import copy
+import functools
 import pymongo
-from pymongo.errors import ConnectionFailure
+from pymongo import UpdateOne
+from pymongo.errors import ConnectionFailure, BulkWriteError
 from bson.objectid import ObjectId
 from bson.decimal128 import Decimal128
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 from logger import logger
+from local_replica import LocalDatabase, LocalReplica
+from bson_codecs import CODEC_OPTIONS, RAW_CODEC_OPTIONS
+from records import RECORD_CLASSES
+import cart
+import columnar
+import pipelines
+import paging
+import facets
+from query_cache import QueryCache, make_key
+from lookup import customer_search_keys
+from table_specs import TABLE_SPECS
+
+# The replica is reconciled against deletions made by other clients every N syncs
+RECONCILE_EVERY = 10
+
+# Above this many changes in one collection, listeners get a single "reload" event
+MAX_ROW_CHANGES = 200
+
+WATCHED_COLLECTIONS = ("Products", "Customers", "Orders")
+
+
+def queue_when_offline(method):
+    """
+    Decorator for the write methods of MongoDBHandler.
+
+    With a local replica: while the server is unreachable the call is made on the
+    replica (LocalDatabase), so the tables show it, then stored and replayed later;
+    once a write succeeds, the replica pulls the changed documents
+    (the changes of other clients pulled with them are recorded too).
+    The change events recorded by the write are then sent to the listeners.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.replica is None:
+            response = method(self, *args, **kwargs)
+            self.flush_changes()
+            return response
+
+        if not self.online:
+            if method.__name__ == "create_order":
+                # The order keeps the _id it gets in the replica when it is replayed
+                kwargs.setdefault("order_id", ObjectId())
+            # The write is applied to the replica first (a refused write is not queued);
+            # an inserted document gets its _id there, replayed with it
+            local = copy.copy(self)
+            local.db = LocalDatabase(self.replica)
+            response = method(local, *args, **kwargs)
+            if response.get("status") != "success":
+                self.flush_changes()
+                return response
+            self.replica.queue_write(method.__name__, args, kwargs)
+            self.flush_changes()
+            return {**response, "message": "Saved offline, will be sent when the server is back.", "queued": True}
+
+        response = method(self, *args, **kwargs)
+        if response.get("status") == "success":
+            try:
+                changes = self.replica.sync(self.db, overlap=timedelta(0))
+            except ConnectionFailure:
+                self.online = False
+            else:
+                recorded = {(change["collection"], str(change["document_id"])) for change in self.pending_changes}
+                for collection_name, operation, document_id in changes:
+                    if (collection_name, document_id) not in recorded:
+                        self.emit_change(collection_name, operation, document_id)
+        self.flush_changes()
+        return response
+    return wrapper
 
 
 class MongoDBHandler:
@@ -17,28 +88,47 @@ class MongoDBHandler:
     A class to handle MongoDB operations for Products, Orders, and Customers.
     """
 
-    def __init__(self, uri="mongodb://localhost:27017/", database="elSel3a"):
+    def __init__(self, uri="mongodb://localhost:27017/", database="elSel3a", replica_path=None, connect=True):
         """
         Initializes the MongoDBHandler class and checks MongoDB service.
 
         :param uri: MongoDB connection URI. Default is localhost.
         :param database: Name of the database to connect to.
+        :param replica_path: Optional SQLite file of the local replica. When set, reads are
+                             served locally and the handler keeps working while the server is down.
+        :param connect: With a replica, False opens the handler offline without waiting for
+                        the server (no ping, indexes nor sync): the first sync_replica connects.
         """
         self.uri = uri
         self.database_name = database
+        self.replica = LocalReplica(replica_path) if replica_path else None
+        self.sync_count = 0
+        self.change_listeners = []
+        self.pending_changes = []
+        self.customer_names = {}     # _id => "first last", used by the client-side join
+        self.transactions = None     # the server supports transactions (see supports_transactions)
+        self.query_cache = QueryCache()     # read results, invalidated by the writes (emit_change)
 
         # Check if MongoDB is running
-        if not self.is_mongodb_running():
+        self.online = self.is_mongodb_running() if connect or self.replica is None else False
+        if not self.online and self.replica is None:
             raise ConnectionError("MongoDB service is not running. Please start it and try again.")
 
         try:
-            self.client = pymongo.MongoClient(self.uri)
-            self.db = self.client[self.database_name]
+            # With a replica, fail fast when the server disappears instead of freezing the UI
+            options = {"serverSelectionTimeoutMS": 2000} if self.replica else {}
+            self.client = pymongo.MongoClient(self.uri, **options)
+            # Decimal128 values are decoded as Decimal (and Decimal encoded as Decimal128)
+            self.db = self.client.get_database(self.database_name, codec_options=CODEC_OPTIONS)
             logger.info("Connected to MongoDB successfully.")
         except Exception as err:
             logger.error(f"Error connecting to MongoDB: {err}")
             raise ConnectionError(f"Error connecting to MongoDB: {err}")
 
+        if self.online:
+            self.ensure_indexes()
+            self.sync_replica()
+
     def is_mongodb_running(self):
         """
         Checks if the MongoDB service is running.
@@ -54,10 +144,239 @@ class MongoDBHandler:
             logger.error("MongoDB service is not running.")
             return False
 
+    def ensure_indexes(self):
+        """
+        Creates the indexes the application relies on (no-op if they already exist).
+        """
+        try:
+            # Products are keyed on their reference for bulk imports
+            self.db["Products"].create_index("ref", unique=True)
+        except Exception as err:
+            # Duplicate refs in an existing catalog must not prevent the app from starting
+            logger.warning(f"Could not create the unique index on Products.ref: {err}")
+
+        # Incremental sync of the local replica reads documents by modification time
+        for collection_name in ("Products", "Customers", "Orders"):
+            self.db[collection_name].create_index("updated_at")
+
+        # Customer autocomplete: prefix queries on the normalized names and phone
+        self.db["Customers"].create_index("search_keys")
+        self.backfill_customer_search_keys()
+
+        # Product filters (see facets.py); category and qte are covered by the sort indexes
+        for field in ("supplier", "is_active"):
+            self.db["Products"].create_index(field)
+
+        # Sorted tables are read page by page along (field, _id), see paging.py
+        for table_name, spec in TABLE_SPECS.items():
+            for field in spec.sortable:
+                if field != "_id":
+                    self.db[table_name].create_index([(field, 1), ("_id", 1)])
+
+    def backfill_customer_search_keys(self, batch_size=1000):
+        """
+        Sets Customers.search_keys on the customers created before the field existed.
+        """
+        fields = {"first_name": 1, "last_name": 1, "phone": 1}
+        operations = []
+        for customer in self.db["Customers"].find({"search_keys": {"$exists": False}}, fields):
+            operations.append(UpdateOne(
+                {"_id": customer["_id"]},
+                {"$set": {"search_keys": customer_search_keys(customer), "updated_at": datetime.now()}}
+            ))
+            if len(operations) == batch_size:
+                self.db["Customers"].bulk_write(operations, ordered=False)
+                operations.clear()
+        if operations:
+            self.db["Customers"].bulk_write(operations, ordered=False)
+
+    # *************************************************************
+    # Local Replica
+    # *************************************************************
+    def ping(self):
+        """
+        Checks the connection with the server using the handler client.
+
+        :return: True if the server answered, False otherwise.
+        """
+        try:
+            self.client.admin.command("ping")
+            return True
+        except ConnectionFailure:
+            return False
+
+    def sync_replica(self, reachable=None):
+        """
+        Refreshes the local replica: detects connectivity, replays the writes queued
+        while offline, then pulls the documents changed on the server.
+
+        :param reachable: The answer of a ping made by the caller (e.g. in a worker thread),
+                          None pings the server here.
+        :return: A dictionary with the status and the number of pulled documents.
+        """
+        if self.replica is None:
+            return {"status": "success", "pulled": 0}
+
+        was_online = self.online
+        self.online = self.ping() if reachable is None else reachable
+        if not self.online:
+            if was_online:
+                logger.warning("MongoDB is unreachable, working from the local replica.")
+            return {"status": "warning", "message": "Working offline.", "pulled": 0}
+
+        if not was_online:
+            logger.info("MongoDB is reachable again.")
+            self.ensure_indexes()
+
+        try:
+            self.replay_pending_writes()
+            self.sync_count += 1
+            changes = self.replica.sync(self.db, reconcile=self.sync_count % RECONCILE_EVERY == 1)
+        except ConnectionFailure as err:
+            self.online = False
+            logger.warning(f"Lost the connection while syncing the local replica: {err}")
+            return {"status": "warning", "message": "Working offline.", "pulled": 0}
+
+        # Changes made by other clients (documents read again unchanged are not listed)
+        for collection_name, operation, document_id in changes:
+            self.emit_change(collection_name, operation, document_id)
+        self.flush_changes()
+        return {"status": "success", "pulled": len(changes)}
+
+    def replay_pending_writes(self):
+        """
+        Sends the writes queued while offline to the server, in their original order.
+        A write the server refuses (e.g. insufficient stock) is logged and dropped.
+        """
+        for write_id, method_name, args, kwargs in self.replica.pending_writes():
+            method = getattr(MongoDBHandler, method_name).__wrapped__
+            # Nobody can confirm a price change during a replay: the order keeps the current prices
+            kwargs.pop("expected_prices", None)
+            response = method(self, *args, **kwargs)
+            if response.get("status") == "error":
+                if not self.ping():
+                    raise ConnectionFailure("Server unreachable while replaying queued writes.")
+                logger.error(f"Dropped queued {method_name}{tuple(args)}: {response.get('message')}")
+            self.replica.remove_pending_write(write_id)
+
+    # *************************************************************
+    # Change Events
+    # *************************************************************
+    def add_change_listener(self, callback):
+        """
+        Registers a callable notified of every document change.
+
+        :param callback: callable(change) where change is a dictionary:
+                         {"collection": ..., "operation": insert | update | delete | reload, "document_id": ObjectId}
+        """
+        self.change_listeners.append(callback)
+
+    def emit_change(self, collection_name, operation, document_id=None):
+        """
+        Records a document change; it is delivered by flush_changes once the write completed.
+        """
+        if document_id is not None and ObjectId.is_valid(document_id):
+            document_id = ObjectId(document_id)
+        if collection_name == "Customers":
+            if document_id is None:
+                self.customer_names.clear()
+            else:
+                self.customer_names.pop(document_id, None)
+        self.query_cache.bump(collection_name)
+        self.pending_changes.append(
+            {"collection": collection_name, "operation": operation, "document_id": document_id}
+        )
+
+    def flush_changes(self):
+        """
+        Delivers the recorded changes to the listeners. A collection with too many
+        changes is collapsed into one "reload" event.
+        """
+        changes, self.pending_changes = self.pending_changes, []
+        by_collection = {}
+        for change in changes:
+            by_collection.setdefault(change["collection"], []).append(change)
+
+        for collection_name, collection_changes in by_collection.items():
+            if len(collection_changes) > MAX_ROW_CHANGES:
+                collection_changes = [{"collection": collection_name, "operation": "reload", "document_id": None}]
+            for change in collection_changes:
+                for listener in self.change_listeners:
+                    try:
+                        listener(change)
+                    except Exception as err:
+                        logger.error(f"Error in change listener for {change}: {err}")
+
+    def supports_change_streams(self):
+        """
+        Change streams need a replica set (or a sharded cluster).
+
+        :return: True if the server can open a change stream.
+        """
+        if not self.online:
+            return False
+        try:
+            hello = self.client.admin.command("hello")
+            return "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            return False
+
+    def supports_transactions(self):
+        """
+        Multi-document transactions need a replica set (or a sharded cluster), asked once.
+        """
+        if self.transactions is None and self.online:
+            self.transactions = self.supports_change_streams()
+        return bool(self.transactions)
+
+    def watch_changes(self, should_stop):
+        """
+        Yields the changes made on the server by any client, using a change stream.
+
+        :param should_stop: callable returning True to end the stream.
+        :return: A generator of change dictionaries (see add_change_listener), with the
+                 "document" key holding the full document for inserts and updates.
+        """
+        operations = {"insert": "insert", "update": "update", "replace": "update", "delete": "delete"}
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(WATCHED_COLLECTIONS)},
+            "operationType": {"$in": list(operations)},
+        }}]
+        with self.db.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000) as stream:
+            while stream.alive and not should_stop():
+                event = stream.try_next()
+                if event is None:
+                    continue
+                yield {
+                    "collection": event["ns"]["coll"],
+                    "operation": operations[event["operationType"]],
+                    "document_id": event["documentKey"]["_id"],
+                    "document": event.get("fullDocument"),
+                }
+
+    def handle_stream_change(self, change):
+        """
+        Applies a change received from the change stream (on the GUI thread):
+        updates the local replica, then notifies the listeners. A change the replica
+        already holds (own write, or pulled by sync_replica first) is not notified again.
+        """
+        if self.replica is not None:
+            if change["operation"] == "delete":
+                changed = self.replica.delete_documents(change["collection"], [change["document_id"]])
+            elif change.get("document") is not None:
+                changed = self.replica.upsert_documents(change["collection"], [change["document"]])
+            else:
+                changed = True      # updated then deleted before the lookup: the delete follows
+            if not changed:
+                return
+        self.emit_change(change["collection"], change["operation"], change["document_id"])
+        self.flush_changes()
+
     # *************************************************************
     # Base Methods
     # *************************************************************
 
+    @queue_when_offline
     def add_document(self, collection_name, document):
         """
         Adds a new document to a collection.
@@ -70,13 +389,15 @@ class MongoDBHandler:
             document["created_at"] = datetime.now()
             document["updated_at"] = datetime.now()
             result = self.db[collection_name].insert_one(document)
+            self.emit_change(collection_name, "insert", result.inserted_id)
             logger.info(f"Document added successfully to {collection_name} with ID: {result.inserted_id}")
             return {"status": "success", "id": str(result.inserted_id)}
         except Exception as err:
             logger.error(f"Error adding document to {collection_name}: {err}")
             return {"status": "error", "message": str(err)}
 
-    def fetch_documents(self, collection_name, query=None, projection=None, limit=0, sort=None):
+    def fetch_documents(self, collection_name, query=None, projection=None, limit=0, sort=None, raw=False,
+                        cache=True):
         """
         Fetches documents from a collection.
 
@@ -85,20 +406,223 @@ class MongoDBHandler:
         :param projection: Fields to include or exclude. Default is None (include all).
         :param limit: Maximum number of documents to fetch. Default is 0 (no limit).
         :param sort: Sort order as a list of tuples (e.g., [("created_at", -1)]).
+        :param raw: Return RawBSONDocuments, decoded only when a field is read
+                    (from the local replica the projection is not applied).
+        :param cache: False reads the database even if the result is in the query cache.
         :return: List of fetched documents.
         """
         try:
-            cursor = self.db[collection_name].find(query or {}, projection or {})
-            if sort:
-                cursor = cursor.sort(sort)
-            if limit > 0:
-                cursor = cursor.limit(limit)
+            documents = self.cached_find(collection_name, query, projection, limit, sort, raw, cache)
             logger.info(f"Fetched documents successfully from {collection_name}.")
-            return {"status": "success", "documents": list(cursor)}
+            return {"status": "success", "documents": documents}
         except Exception as err:
             logger.error(f"Error fetching documents from {collection_name}: {err}")
             return {"status": "error", "message": str(err)}
 
+    def cached_find(self, collection_name, query=None, projection=None, limit=0, sort=None, raw=False, cache=True):
+        """
+        find through the query cache.
+        """
+        return self.query_cache.read(
+            make_key("find", collection_name, query, projection, limit, sort, raw),
+            (collection_name,),
+            lambda: self.find(collection_name, query, projection, limit, sort, raw),
+            cache,
+        )
+
+    def find(self, collection_name, query=None, projection=None, limit=0, sort=None, raw=False):
+        """
+        Runs a find on the local replica when there is one, on the server otherwise.
+
+        :param raw: Return RawBSONDocuments instead of decoded dictionaries.
+        :return: List of documents.
+        """
+        if self.replica is not None:
+            return self.replica.find(collection_name, query, projection, sort, limit, raw)
+
+        collection = self.db[collection_name]
+        if raw:
+            collection = collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+        cursor = collection.find(query or {}, projection or {})
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit > 0:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def fetch_records(self, collection_name, query=None, limit=0, sort=None, cache=True):
+        """
+        Fetches the displayed columns of a table as compact records (see records.py).
+        Documents are converted one at a time while the cursor is read.
+
+        :param collection_name: ( Products | Customers | Orders )
+        :param query: Filter criteria. Default is None (fetch all).
+        :param limit: Maximum number of records to fetch. Default is 0 (no limit).
+        :param sort: Sort order as a list of tuples (e.g., [("created_at", -1)]).
+        :param cache: False reads the database even if the result is in the query cache.
+        :return: {"status": "success", "documents": [Record, ...]}
+        """
+        try:
+            records = self.query_cache.read(
+                make_key("records", collection_name, query, limit, sort),
+                ("Orders", "Customers") if collection_name == "Orders" else (collection_name,),
+                lambda: self.read_records(collection_name, query, limit, sort),
+                cache,
+            )
+            logger.info(f"Fetched {len(records)} records from {collection_name}.")
+            return {"status": "success", "documents": records}
+        except Exception as err:
+            logger.error(f"Error fetching records from {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    def read_records(self, collection_name, query=None, limit=0, sort=None):
+        """The records of fetch_records, read from the replica or the server."""
+        record_class = RECORD_CLASSES[collection_name]
+        projection = {field: 1 for field in record_class.__slots__}
+        if collection_name == "Orders":
+            if self.replica is not None:
+                documents = self.replica.fetch_orders_with_customer_names(query, projection, sort, limit)
+            else:
+                pipeline = pipelines.orders_with_customer_names(query, projection, sort, limit)
+                documents = self.db["Orders"].aggregate(pipeline)
+        elif self.replica is not None:
+            documents = self.replica.find(collection_name, query, projection, sort, limit)
+        else:
+            documents = self.db[collection_name].find(query or {}, projection)
+            if sort:
+                documents = documents.sort(sort)
+            if limit > 0:
+                documents = documents.limit(limit)
+        return [record_class.from_document(document) for document in documents]
+
+    def fetch_page(self, collection_name, query=None, sort_field="_id", direction=1, after=None,
+                   page_size=paging.PAGE_SIZE, cache=True):
+        """
+        Fetches one page of a table sorted by the server (keyset pagination).
+
+        :param collection_name: ( Products | Customers | Orders )
+        :param query: Filter criteria. Default is None (fetch all).
+        :param sort_field: The sorted field (one of TABLE_SPECS[collection_name].sortable).
+        :param direction: 1 (ascending) or -1 (descending).
+        :param after: The last record of the previous page, None for the first page.
+        :param page_size: Number of records per page.
+        :param cache: False reads the database even if the page is in the query cache.
+        :return: {"status": "success", "documents": [Record, ...], "has_more": bool}
+        """
+        if sort_field not in TABLE_SPECS[collection_name].sortable:
+            return {"status": "error", "message": f"{collection_name} cannot be sorted on {sort_field}"}
+
+        keyset_query = paging.keyset_query(query, sort_field, direction, after)
+        sort = paging.page_sort(sort_field, direction)
+        limit = page_size + 1   # one more record tells if there is a next page
+        if self.replica is None:
+            response = self.fetch_records(collection_name, query=keyset_query, limit=limit, sort=sort, cache=cache)
+            if response["status"] != "success":
+                return response
+            documents = response["documents"]
+        else:
+            try:
+                # Same cache key as fetch_records: the page is the same result
+                documents = self.query_cache.read(
+                    make_key("records", collection_name, keyset_query, limit, sort),
+                    ("Orders", "Customers") if collection_name == "Orders" else (collection_name,),
+                    lambda: self.read_page(collection_name, query, sort_field, direction, after, limit),
+                    cache,
+                )
+            except Exception as err:
+                logger.error(f"Error fetching a page of {collection_name}: {err}")
+                return {"status": "error", "message": str(err)}
+        return {"status": "success", "documents": documents[:page_size], "has_more": len(documents) > page_size}
+
+    def read_page(self, collection_name, query, sort_field, direction, after, limit):
+        """The records of a page read from the replica (see LocalReplica.find_page)."""
+        record_class = RECORD_CLASSES[collection_name]
+        documents = self.replica.find_page(collection_name, query, sort_field, direction, after, limit)
+        if collection_name == "Orders":
+            self.replica.add_customer_names(documents)
+        return [record_class.from_document(document) for document in documents]
+
+    def fetch_delta(self, collection_name, known_ids, since):
+        """
+        What changed in a table since its rows were saved (see page_cache.py): the records
+        updated after `since` or missing from the saved rows, and the saved rows deleted since.
+        Reads around the query cache, the saved rows are compared with the database.
+
+        :param collection_name: ( Products | Customers | Orders )
+        :param known_ids: The _id (str) of the saved rows.
+        :param since: datetime of the saved rows (minus a margin for the clocks of the clients).
+        :return: {"status": "success", "documents": [Record, ...], "deleted": [str, ...]}
+        """
+        try:
+            # _id only: the whole collection is read from the _id index
+            current = {
+                str(document["_id"]): document["_id"]
+                for document in self.find(collection_name, projection={"_id": 1})
+            }
+            known_ids = set(known_ids)
+            deleted = [document_id for document_id in known_ids if document_id not in current]
+            missing = [object_id for document_id, object_id in current.items() if document_id not in known_ids]
+
+            changed = [{"updated_at": {"$gte": since}}, {"_id": {"$in": missing}}]
+            if collection_name == "Orders":
+                # The rows display the customer names
+                renamed = self.find("Customers", {"updated_at": {"$gte": since}}, {"_id": 1})
+                changed.append({"customer_id": {"$in": [customer["_id"] for customer in renamed]}})
+            records = self.read_records(collection_name, query={"$or": changed}, sort=[("created_at", 1)])
+            logger.info(f"{collection_name} delta: {len(records)} changed, {len(deleted)} deleted.")
+            return {"status": "success", "documents": records, "deleted": deleted}
+        except Exception as err:
+            logger.error(f"Error fetching the changes of {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    def iter_documents(self, collection_name, query=None, projection=None, sort=None, batch_size=10000):
+        """
+        Streams documents from a collection without materializing them in a list.
+
+        :param collection_name: Name of the collection.
+        :param query: Filter criteria. Default is None (fetch all).
+        :param projection: Fields to include or exclude. Default is None (include all).
+        :param sort: Sort order as a list of tuples (e.g., [("created_at", -1)]).
+        :param batch_size: Number of documents the server returns per round trip.
+        :return: A generator of documents.
+        """
+        cursor = self.db[collection_name].find(query or {}, projection or None, batch_size=batch_size)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def fetch_columnar(self, collection_name, query=None, fields=None, output="arrow", batch_size=10000):
+        """
+        Fetches columns of a collection as an Arrow table or NumPy arrays, for
+        vectorized statistics (see columnar.py).
+
+        :param collection_name: Name of the collection.
+        :param query: Filter criteria. Default is None (fetch all).
+        :param fields: List of fields, dict {field: type} or None (every exported field).
+        :param output: ( arrow | numpy ) numpy returns {field: array}.
+        :param batch_size: Documents per round trip and per record batch.
+        :return: A dictionary with the status, the data and the row count.
+        """
+        try:
+            types = columnar.column_types(collection_name, fields)
+            projection = {field: 1 for field in types}
+            if self.replica is not None and not self.online:
+                documents = self.replica.find(collection_name, query, projection)
+            else:
+                documents = self.iter_documents(collection_name, query, projection, batch_size=batch_size)
+
+            table = columnar.documents_to_arrow(documents, types, batch_size)
+            data = columnar.table_to_numpy(table) if output == "numpy" else table
+            logger.info(f"Fetched {table.num_rows} rows from {collection_name} as {output}.")
+            return {"status": "success", "data": data, "count": table.num_rows}
+        except Exception as err:
+            logger.error(f"Error fetching columns from {collection_name}: {err}")
+            return {"status": "error", "message": str(err)}
+
+    @queue_when_offline
     def update_document(self, collection_name, document_id, updates):
         """
         Updates a document in a collection.
@@ -110,8 +634,13 @@ class MongoDBHandler:
         """
         try:
             updates["updated_at"] = datetime.now()
+            if collection_name == "Customers" and {"first_name", "last_name", "phone"} & set(updates):
+                fields = {"first_name": 1, "last_name": 1, "phone": 1}
+                customer = self.db["Customers"].find_one({"_id": ObjectId(document_id)}, fields) or {}
+                updates["search_keys"] = customer_search_keys({**customer, **updates})
             result = self.db[collection_name].update_one({"_id": ObjectId(document_id)}, {"$set": updates})
             if result.modified_count > 0:
+                self.emit_change(collection_name, "update", document_id)
                 logger.info(f"Document {document_id} updated successfully in {collection_name}.")
                 return {"status": "success", "message": "Document updated."}
             logger.warning(f"Document {document_id} not found or no changes made.")
@@ -120,6 +649,7 @@ class MongoDBHandler:
             logger.error(f"Error updating document in {collection_name}: {err}")
             return {"status": "error", "message": str(err)}
 
+    @queue_when_offline
     def delete_document(self, collection_name, document_id):
         """
         Deletes a document from a collection.
@@ -130,7 +660,10 @@ class MongoDBHandler:
         """
         try:
             result = self.db[collection_name].delete_one({"_id": ObjectId(document_id)})
+            if self.replica is not None:
+                self.replica.delete_documents(collection_name, [document_id])
             if result.deleted_count > 0:
+                self.emit_change(collection_name, "delete", document_id)
                 logger.info(f"Document {document_id} deleted successfully from {collection_name}.")
                 return {"status": "success", "message": "Document deleted."}
 
@@ -140,6 +673,7 @@ class MongoDBHandler:
             logger.error(f"Error deleting document from {collection_name}: {err}")
             return {"status": "error", "message": str(err)}
 
+    @queue_when_offline
     def delete_many_documents(self, collection_name, document_ids):
         """
         Deletes multiple documents from a collection based on a list of IDs.
@@ -154,6 +688,10 @@ class MongoDBHandler:
 
             # Perform the deletion
             result = self.db[collection_name].delete_many({"_id": {"$in": object_ids}})
+            if self.replica is not None:
+                self.replica.delete_documents(collection_name, object_ids)
+            for object_id in object_ids:
+                self.emit_change(collection_name, "delete", object_id)
 
             if result.deleted_count > 0:
                 logger.info(f"Deleted {result.deleted_count} documents from {collection_name}.")
@@ -174,6 +712,7 @@ class MongoDBHandler:
             logger.error(f"Error deleting documents from {collection_name}: {err}")
             return {"status": "error", "message": str(err)}
 
+    @queue_when_offline
     def update_record_state(self, collection_name, document_id, field, new_value):
         """
         Updates a specific field for a single record in a collection.
@@ -188,11 +727,12 @@ class MongoDBHandler:
             # Perform the update
             result = self.db[collection_name].update_one(
                 {"_id": ObjectId(document_id)},  # Match the document by its _id
-                {"$set": {field: new_value}}     # Update the specified field
+                {"$set": {field: new_value, "updated_at": datetime.now()}}     # Update the specified field
             )
 
             if result.matched_count > 0:
                 if result.modified_count > 0:
+                    self.emit_change(collection_name, "update", document_id)
                     logger.info(f"Updated {field} for document {document_id} in {collection_name} to {new_value}.")
                     return {"status": "success", "message": "Record updated successfully."}
                 else:
@@ -226,24 +766,12 @@ class MongoDBHandler:
         }
         return self.add_document("Products", product)
 
-    def fetch_products(self, query=None, projection=None, limit=0, sort=None):
+    def fetch_products(self, query=None, projection=None, limit=0, sort=None, cache=True):
         """
         Fetches products from the Products collection.
         """
         try:
-            products = self.db["Products"]
-            cursor = products.find(query or {}, projection or {})
-            if sort:
-                cursor = cursor.sort(sort)
-            if limit > 0:
-                cursor = cursor.limit(limit)
-
-            product_list = []
-            for product in cursor:
-                if "price" in product:
-                    product["price"] = Decimal(product["price"].to_decimal())
-                product_list.append(product)
-
+            product_list = self.cached_find("Products", query, projection, limit, sort, cache=cache)
             logger.info("Fetched products successfully.")
             return {"status": "success", "documents": product_list}
         except Exception as err:
@@ -252,6 +780,32 @@ class MongoDBHandler:
 
         # return self.fetch_documents("Products", query, projection, limit, sort)
 
+    def fetch_product_facets(self, filters=None, cache=True):
+        """
+        Counts of the product filters (category, supplier, is_active, stock ranges)
+        for a filter state, with a single $facet aggregation. The counts of a facet
+        ignore its own selection. Results are cached until a product changes.
+
+        :param filters: {"category": [...], "supplier": [...], "is_active": [...], "stock": [range keys]}
+        :param cache: False counts again even if the counts are in the query cache.
+        :return: {"status": "success", "facets": {facet: [(value, count), ...]}}
+        """
+        def count():
+            if self.replica is not None:
+                result = facets.count_replica(self.replica, filters)
+            else:
+                result = next(self.db["Products"].aggregate(facets.facet_pipeline(filters)), {})
+            return facets.facet_counts(result)
+
+        try:
+            key = make_key("facets", facets.normalize_filters(filters))
+            counts = self.query_cache.read(key, ("Products",), count, cache)
+        except Exception as err:
+            logger.error(f"Error counting the product filters: {err}")
+            return {"status": "error", "message": str(err)}
+        return {"status": "success", "facets": counts}
+
+    @queue_when_offline
     def update_product(self, product_id, update_data):
         """
         Updates a product in the Products collection by its product_id.
@@ -274,7 +828,7 @@ class MongoDBHandler:
                 update_data["qte"] = int(update_data["qte"])
 
             # Add the 'updated_at' field to track modification time
-            update_data["updated_at"] = datetime.utcnow()
+            update_data["updated_at"] = datetime.now()
 
             # Perform the update
             result = self.db["Products"].update_one(
@@ -289,12 +843,63 @@ class MongoDBHandler:
                 logger.warning('No changes were made.')
                 return {"status": "warning", "message": "No changes were made."}
 
+            self.emit_change("Products", "update", product_id)
             logger.info('Product updated successfully')
             return {"status": "success", "message": "Product updated successfully."}
         except Exception as err:
             logger.error(f"Error updating product: {err}")
             return {"status": "error", "message": str(err)}
 
+    def bulk_upsert_products(self, products):
+        """
+        Inserts or updates a batch of products keyed on their `ref` in one round trip.
+
+        :param products: List of normalized product dictionaries (price as Decimal128, qte as int).
+        :return: A dictionary with the status and the inserted/modified counts, the errors
+                 are {"index": position in products, "ref": ..., "message": ...}.
+        """
+        now = datetime.now()
+        operations = []
+        for product in products:
+            on_insert = {"created_at": now}
+            if "is_active" not in product:
+                on_insert["is_active"] = True
+            operations.append(UpdateOne(
+                {"ref": product["ref"]},
+                {"$set": {**product, "updated_at": now}, "$setOnInsert": on_insert},
+                upsert=True
+            ))
+
+        if not operations:
+            return {"status": "success", "inserted": 0, "modified": 0, "errors": []}
+
+        # No change events for an import: the cached product reads are dropped here
+        self.query_cache.bump("Products")
+        try:
+            # ordered=False: one bad row does not stop the rest of the batch
+            result = self.db["Products"].bulk_write(operations, ordered=False)
+            return {
+                "status": "success",
+                "inserted": result.upserted_count,
+                "modified": result.modified_count,
+                "errors": []
+            }
+        except BulkWriteError as err:
+            details = err.details
+            logger.warning(f"Bulk upsert finished with {len(details['writeErrors'])} errors.")
+            return {
+                "status": "warning",
+                "inserted": details.get("nUpserted", 0),
+                "modified": details.get("nModified", 0),
+                "errors": [
+                    {"index": error["index"], "ref": products[error["index"]]["ref"], "message": error["errmsg"]}
+                    for error in details["writeErrors"]
+                ]
+            }
+        except Exception as err:
+            logger.error(f"Error upserting products: {err}")
+            return {"status": "error", "message": str(err)}
+
     def update_product_quantity(self, product_id, quantity_change):
         """
         Updates the quantity of a product in the database.
@@ -306,11 +911,12 @@ class MongoDBHandler:
         try:
             result = self.db["Products"].update_one(
                 {"_id": ObjectId(product_id)},
-                {"$inc": {"qte": quantity_change}}
+                {"$inc": {"qte": quantity_change}, "$set": {"updated_at": datetime.now()}}
             )
             if result.matched_count == 0:
                 return {"status": "error", "message": f"Product with ID {product_id} not found."}
 
+            self.emit_change("Products", "update", product_id)
             return {"status": "success", "message": "Quantity updated successfully."}
         except Exception as err:
             logger.error(f"Error updating product quantity: {err}")
@@ -319,68 +925,98 @@ class MongoDBHandler:
     # *************************************************************
     # Order Methods
     # *************************************************************
-    def create_order(self, customer_id, products, order_date=None, status="pending"):
+    @queue_when_offline
+    def create_order(self, customer_id, products, order_date=None, status="pending", expected_prices=None,
+                     order_id=None):
+        """
+        Creates an order once the whole cart was checked (one query, see cart.check_cart)
+        and its stock taken (see place_order).
+
+        :param customer_id: The customer ID.
+        :param products: [{"product_id": str, "quantity": int}, ...]
+        :param order_date: The order date (default: now).
+        :param status: The order status.
+        :param expected_prices: {product_id: price} shown in the cart; when a price changed
+                                the order is not created and the changes are returned.
+        :param order_id: The _id of the order (set by queue_when_offline), default a new one.
+        :return: {"status": "success", "order_id"} | {"status": "warning", "price_changes": [...]} | error
+        """
         try:
             if len(products) == 0:
                 logger.error("No products selected for this order")
                 return {"status": "error", "message": "عليك إضافة السلعة إلالطلبية"}
 
-            total_price = 0
-            product_updates = []    # Keep track of quantity updates to apply after
-            for product in products:
-                product_id = product["product_id"]
-                quantity = product["quantity"]
-
-                product_response = self.db["Products"].find_one({"_id": ObjectId(product_id)}, {"price": 1, "qte": 1})
-                if not product_response:
-                    return {"status": "error", "message": f"Product with ID {product_id} not found."}
-
-                price = Decimal(product_response["price"].to_decimal())
-                # Check Quantity in Stock if Available
-                available_quantity = product_response.get("qte", 0)
-                if quantity > available_quantity:
-                    return {
-                        "status": "error",
-                        "message": f"insufficient stock for product with ID {product_id}. Available: {available_quantity}"
-                    }
-                # Calculate total price
-                total_price += price * quantity
-
-                # Prepare quantity update but do not apply it yet
-                product_updates.append((product_id, -quantity))
-
-            order = {
-                "customer_id": ObjectId(customer_id),
-                "products": products,
-                "status": status,
-                "order_date": order_date if order_date else datetime.now(),
-                "total_price": Decimal128(total_price),
-                "created_at": datetime.now(),
-                "updated_at": datetime.now()
+            quantities = cart.cart_quantities(products)
+            found = {
+                str(product["_id"]): product
+                for product in self.db["Products"].find(cart.cart_query(quantities), cart.CART_PROJECTION)
             }
-
-            result = self.db["Orders"].insert_one(order)
-            # If order insertion is successful, update product quantities
-            for product_id, quantity_change in product_updates:
-                update_response = self.update_product_quantity(product_id, quantity_change)
-                if update_response["status"] != "success":
-                    # Log the failure but continue
-                    logger.error(f"Failed to update quantity for product {product_id}: {update_response['message']}")
-
-            logger.info(f"Order created successfully with ID: {result.inserted_id}")
-            return {"status": "success", "order_id": str(result.inserted_id)}
+            response = cart.problems_response(cart.check_cart(quantities, found, expected_prices))
+            if response is not None:
+                logger.warning(f"Order not created: {response}")
+                return response
+
+            order = cart.new_order(customer_id, quantities, found, status, order_date, order_id)
+            order_id = self.place_order(order, quantities)
+            if order_id is None:
+                logger.warning("Order not created: the stock changed after the cart was checked.")
+                return dict(cart.STOCK_CHANGED)
+
+            self.emit_change("Orders", "insert", order_id)
+            for product_id in quantities:
+                self.emit_change("Products", "update", product_id)
+            logger.info(f"Order created successfully with ID: {order_id}")
+            return {"status": "success", "order_id": str(order_id)}
 
         except Exception as err:
             logger.error(f"Error creating order: {err}")
             return {"status": "error", "message": str(err)}
 
+    def place_order(self, order, quantities):
+        """
+        Takes the stock of every line (only while it covers the quantity) then inserts the
+        order, all or nothing. On a replica set: one transaction with a single bulk_write of
+        the decrements. On a standalone server: line by line, the lines already taken are
+        given back when one fails.
+
+        :param quantities: {product_id: quantity} of the order.
+        :return: The _id of the order, None when a line lacks stock (nothing is written).
+        """
+        now = datetime.now()
+        if self.supports_transactions():
+            with self.client.start_session() as session, session.start_transaction():
+                result = self.db["Products"].bulk_write([
+                    UpdateOne(*cart.decrement_stock(product_id, quantity, now))
+                    for product_id, quantity in quantities.items()
+                ], session=session)
+                if result.matched_count < len(quantities):
+                    session.abort_transaction()
+                    return None
+                return self.db["Orders"].insert_one(order, session=session).inserted_id
+
+        taken = []
+        try:
+            for product_id, quantity in quantities.items():
+                if self.db["Products"].update_one(*cart.decrement_stock(product_id, quantity, now)).matched_count == 0:
+                    return None
+                taken.append(product_id)
+            order_id = self.db["Orders"].insert_one(order).inserted_id
+            taken = []
+            return order_id
+        finally:
+            if taken:
+                self.db["Products"].bulk_write([
+                    UpdateOne(*cart.restore_stock(product_id, quantities[product_id], now)) for product_id in taken
+                ], ordered=False)
+
     def fetch_orders(self, query=None, projection=None, limit=0, sort=None):
         """
         Fetches orders from the Orders collection.
         """
         return self.fetch_documents("Orders", query, projection, limit, sort)
 
-    def fetch_orders_with_customer_names(self, query=None, projection=None, limit=0, sort=None):
+    def fetch_orders_with_customer_names(self, query=None, projection=None, limit=0, sort=None, join="server",
+                                         cache=True):
         """
         Fetches orders from the database and includes customer names.
 
@@ -388,51 +1024,109 @@ class MongoDBHandler:
         :param projection: Fields to include or exclude. Default is None (include all).
         :param limit: Maximum number of documents to fetch. Default is 0 (no limit).
         :param sort: Sort order as a list of tuples (e.g., [("order_date", -1)]).
+        :param join: ( server | client ) server: $lookup in the aggregation pipeline,
+                     client: fetch the orders then resolve the names from a cached map.
+        :param cache: False reads the database even if the result is in the query cache.
         :return: List of fetched orders with customer names.
         """
-        try:
-            pipeline = [
-                {"$match": query or {}},  # Filter orders based on the query
-                {
-                    "$lookup": {
-                        "from": "Customers",  # The name of the Customers collection
-                        "localField": "customer_id",  # The field in Orders to match
-                        "foreignField": "_id",  # The field in Customers to match
-                        "as": "customer_details"  # Alias for joined customer details
-                    }
-                },
-                {
-                    "$addFields": {
-                        "customer_name": {
-                            "$concat": [
-                                {"$arrayElemAt": ["$customer_details.first_name", 0]},
-                                " ",
-                                {"$arrayElemAt": ["$customer_details.last_name", 0]}
-                            ]
-                        }
-                    }
-                },
-                {"$unset": "customer_details"}  # Remove the raw customer details after extracting name
-            ]
-
-            # Apply the projection in the aggregation pipeline
-            if projection:
-                pipeline.append({"$project": projection})
+        def read():
+            if self.replica is not None:
+                return self.replica.fetch_orders_with_customer_names(query, projection, sort, limit)
 
-            if sort:
-                pipeline.append({"$sort": dict(sort)})
+            if join == "client":
+                orders = self.client_join_orders(query, projection, limit, sort)
+                if orders is not None:
+                    return orders
 
-            if limit > 0:
-                pipeline.append({"$limit": limit})
+            pipeline = pipelines.orders_with_customer_names(query, projection, sort, limit)
 
             # Execute the aggregation pipeline
             orders = list(self.db["Orders"].aggregate(pipeline))
             logger.info("Fetched orders with customer names successfully.")
+            return orders
+
+        try:
+            key = make_key("orders", query, projection, limit, sort, join)
+            orders = self.query_cache.read(key, ("Orders", "Customers"), read, cache)
             return {"status": "success", "orders": orders}
         except Exception as err:
             logger.error(f"Error fetching orders: {err}")
             return {"status": "error", "message": str(err)}
 
+    def client_join_orders(self, query=None, projection=None, limit=0, sort=None):
+        """
+        Hash join on the client: one find on Orders, then the customer names are
+        stitched from `customer_names` (misses are loaded with a single $in query).
+
+        :return: The orders, or None when the request needs the server join
+                 (sort on customer_name or computed projection).
+        """
+        if isinstance(projection, (list, tuple)):
+            projection = {field: 1 for field in projection}
+        if any(field == pipelines.CUSTOMER_NAME for field, _ in sort or []):
+            return None
+        if projection and not pipelines.is_simple_projection(projection):
+            return None
+
+        order_fields, join, drop_after_join = pipelines.split_customer_name_projection(projection)
+        cursor = self.db["Orders"].find(query or {}, order_fields or None)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit > 0:
+            cursor = cursor.limit(limit)
+        orders = list(cursor)
+        if not join:
+            return orders
+
+        names = self.resolve_customer_names({order.get("customer_id") for order in orders})
+        for order in orders:
+            order[pipelines.CUSTOMER_NAME] = names.get(order.get("customer_id"))
+            for field in drop_after_join:
+                order.pop(field, None)
+        logger.info("Fetched orders with customer names successfully (client join).")
+        return orders
+
+    def resolve_customer_names(self, customer_ids):
+        """
+        Map customer ids to "first last", loading only the ids missing from the cache.
+
+        :param customer_ids: Iterable of customer ObjectIds.
+        :return: {customer_id: name}; the name is None when the customer does not exist
+                 or misses a name field (same as $concat on the server).
+        """
+        customer_ids = {customer_id for customer_id in customer_ids if customer_id is not None}
+        missing = [customer_id for customer_id in customer_ids if customer_id not in self.customer_names]
+        if missing:
+            if self.replica is not None:
+                found = self.replica.get_many("Customers", missing)
+            else:
+                found = self.db["Customers"].find({"_id": {"$in": missing}}, {"first_name": 1, "last_name": 1})
+            for customer in found:
+                first_name, last_name = customer.get("first_name"), customer.get("last_name")
+                if isinstance(first_name, str) and isinstance(last_name, str):
+                    self.customer_names[customer["_id"]] = f"{first_name} {last_name}"
+                else:
+                    self.customer_names[customer["_id"]] = None
+        return {customer_id: self.customer_names.get(customer_id) for customer_id in customer_ids}
+
+    def explain_orders_with_customer_names(self, query=None, projection=None, limit=0, sort=None,
+                                           verbosity="queryPlanner"):
+        """
+        Explain the pipeline used by fetch_orders_with_customer_names (always on the server).
+
+        :param verbosity: ( queryPlanner | executionStats | allPlansExecution )
+        :return: The pipeline that was built and the server's explain output.
+        """
+        try:
+            pipeline = pipelines.orders_with_customer_names(query, projection, sort, limit)
+            plan = self.db.command(
+                "explain", {"aggregate": "Orders", "pipeline": pipeline, "cursor": {}}, verbosity=verbosity
+            )
+            return {"status": "success", "pipeline": pipeline, "explain": plan}
+        except Exception as err:
+            logger.error(f"Error explaining orders pipeline: {err}")
+            return {"status": "error", "message": str(err)}
+
     def calculate_total_price(self, products):
         """
         Calculates the total price of an order.
@@ -447,6 +1141,7 @@ class MongoDBHandler:
                 logger.warning(f"Product {product['product_id']} not found.")
         return total_price
 
+    @queue_when_offline
     def cancel_order(self, order_id):
         """
         Handles the cancellation of an order and updates product quantities.
@@ -467,11 +1162,13 @@ class MongoDBHandler:
 
                 update_result = self.db["Products"].update_one(
                     {"_id": ObjectId(product_id)},
-                    {"$inc": {"qte": quantity}}
+                    {"$inc": {"qte": quantity}, "$set": {"updated_at": datetime.now()}}
                 )
 
                 if update_result.modified_count == 0:
                     logger.warning(f"Product with ID {product_id} not found or could not be updated.")
+                else:
+                    self.emit_change("Products", "update", product_id)
 
             # Update the order status to 'cancelled'
             update_status = self.db["Orders"].update_one(
@@ -480,6 +1177,7 @@ class MongoDBHandler:
             )
 
             if update_status.modified_count > 0:
+                self.emit_change("Orders", "update", order_id)
                 logger.info(f"Order {order_id} cancelled successfully.")
                 return {"status": "success", "message": "Order cancelled and product quantities updated."}
 
@@ -506,6 +1204,7 @@ class MongoDBHandler:
             "is_active": False,
             "client_status": client_status
         }
+        customer["search_keys"] = customer_search_keys(customer)
         return self.add_document("Customers", customer)
 
     def fetch_customers(self, query=None, projection=None, limit=0, sort=None):
@@ -514,22 +1213,24 @@ class MongoDBHandler:
         """
         return self.fetch_documents("Customers", query, projection, limit, sort)
 
-    def fetch_customer_orders(self, customer_id):
+    def fetch_customer_orders(self, customer_id, cache=True):
         """
         Fetch all orders for a given customer ID.
 
         :param customer_id: The ID of the customer.
+        :param cache: False reads the database even if the orders are in the query cache.
         :return: List of orders or an error message.
         """
         try:
             projection = {"_id": 1, "order_date": 1, "status": 1, "total_price": 1}
-            orders = list(self.db["Orders"].find({"customer_id": ObjectId(customer_id)}, projection))
+            orders = self.cached_find("Orders", {"customer_id": ObjectId(customer_id)}, projection, cache=cache)
             logger.info(f"Fetch all orders for customer({customer_id})")
             return {"status": "success", "orders": orders}
         except Exception as e:
             logger.error(f"Error fetching order for Customer({customer_id})\n{e}")
             return {"status": "error", "message": str(e)}
 
+    @queue_when_offline
     def delete_customer_and_orders(self, customer_id):
         """
         Deletes a customer and all their associated orders.
@@ -541,12 +1242,20 @@ class MongoDBHandler:
             customer_id = ObjectId(customer_id)
 
             # Delete associated orders
+            order_ids = [order["_id"] for order in self.db["Orders"].find({"customer_id": customer_id}, {"_id": 1})]
             order_result = self.db["Orders"].delete_many({"customer_id": customer_id})
+            for order_id in order_ids:
+                self.emit_change("Orders", "delete", order_id)
 
             # Delete the customer
             customer_result = self.db["Customers"].delete_one({"_id": customer_id})
 
+            if self.replica is not None:
+                self.replica.delete_documents("Customers", [customer_id])
+                self.replica.delete_documents("Orders", order_ids)
+
             if customer_result.deleted_count > 0:
+                self.emit_change("Customers", "delete", customer_id)
                 logger.info(f"Customer {customer_id} deleted successfully.")
                 logger.info(f"Deleted {order_result.deleted_count} associated orders.")
                 return {
@@ -565,72 +1274,59 @@ class MongoDBHandler:
     #       => Statistics
     # *************************************************************
 
-    def generate_statistics(self):
+    def generate_statistics(self, cache=True):
         """
         Generate all required statistics for the dashboard widget, excluding cancelled orders.
 
+        :param cache: False computes the statistics even if they are in the query cache.
         :return: Dictionary containing statistics for products, orders, and customers.
         """
-        try:
-            # Product Statistics
-            products_stats = {
-                "total_products": self.db["Products"].count_documents({}),
-                "total_quantity": self.db["Products"].aggregate([
-                    {"$group": {"_id": None, "total_quantity": {"$sum": "$qte"}}}
-                ]).next()["total_quantity"],
-                "top_products": list(self.db["Products"].find({}, {"name": 1, "qte": 1}).sort("qte", -1).limit(5)),
-            }
-
-            # Order Statistics (excluding cancelled orders)
-            orders_stats = {
-                "total_orders": self.db["Orders"].count_documents({"status": {"$ne": "cancelled"}}),
-                "total_revenue": self.db["Orders"].aggregate([
-                    {"$match": {"status": {"$ne": "cancelled"}}},  # Exclude cancelled orders
-                    {"$group": {"_id": None, "total_revenue": {"$sum": "$total_price"}}}
-                ]).next()["total_revenue"],
-                "orders_by_status": list(self.db["Orders"].aggregate([
-                    {"$match": {"status": {"$ne": "cancelled"}}},  # Exclude cancelled orders
-                    {"$group": {"_id": "$status", "count": {"$sum": 1}}}
-                ])),
-                "top_customers": list(self.db["Orders"].aggregate([
-                    {"$match": {"status": {"$ne": "cancelled"}}},  # Exclude cancelled orders
-                    {"$group": {"_id": "$customer_id", "order_count": {"$sum": 1}}},
-                    {"$sort": {"order_count": -1}},
-                    {"$limit": 5},
-                    {"$lookup": {
-                        "from": "Customers",
-                        "localField": "_id",
-                        "foreignField": "_id",
-                        "as": "customer_details"
-                    }},
-                    {"$project": {
-                        "customer_name": {"$concat": [
-                            {"$arrayElemAt": ["$customer_details.first_name", 0]},
-                            " ",
-                            {"$arrayElemAt": ["$customer_details.last_name", 0]},
-                        ]},
-                        "order_count": 1
-                    }},
-                ])),
-            }
-
-            # Customer Statistics
-            customers_stats = {
-                "total_customers": self.db["Customers"].count_documents({}),
-                "active_customers": self.db["Customers"].count_documents({"is_active": True}),
-                "trusted_customers": list(self.db["Customers"].find(
-                    {"client_status": "trusted"}, {"first_name": 1, "last_name": 1}).limit(5)),
-            }
+        if self.replica is not None and not self.online:
+            return self.replica.generate_statistics()
 
-            return {
-                "products": products_stats,
-                "orders": orders_stats,
-                "customers": customers_stats,
-            }
+        try:
+            return self.query_cache.read(
+                make_key("statistics"), WATCHED_COLLECTIONS, self.read_statistics, cache
+            )
         except Exception as e:
             logger.error(f"Error generating statistics: {e}")
             return {}
 
+    def read_statistics(self):
+        """The statistics of generate_statistics, computed by the server."""
+        # Product Statistics
+        products_stats = {
+            "total_products": self.db["Products"].count_documents({}),
+            "total_quantity": self.db["Products"].aggregate(
+                pipelines.TOTAL_QUANTITY_PIPELINE
+            ).next()["total_quantity"],
+            "top_products": list(self.db["Products"].find({}, {"name": 1, "qte": 1}).sort("qte", -1).limit(5)),
+        }
+
+        # Order Statistics (excluding cancelled orders)
+        orders_stats = {
+            "total_orders": self.db["Orders"].count_documents(pipelines.NOT_CANCELLED),
+            "total_revenue": self.db["Orders"].aggregate(
+                pipelines.TOTAL_REVENUE_PIPELINE
+            ).next()["total_revenue"],
+            "orders_by_status": list(self.db["Orders"].aggregate(pipelines.ORDERS_BY_STATUS_PIPELINE)),
+            "top_customers": list(self.db["Orders"].aggregate(pipelines.TOP_CUSTOMERS_PIPELINE)),
+        }
+
+        # Customer Statistics
+        customers_stats = {
+            "total_customers": self.db["Customers"].count_documents({}),
+            "active_customers": self.db["Customers"].count_documents({"is_active": True}),
+            "trusted_customers": list(self.db["Customers"].find(
+                {"client_status": "trusted"}, {"first_name": 1, "last_name": 1}).limit(5)),
+        }
+
+        return {
+            "products": products_stats,
+            "orders": orders_stats,
+            "customers": customers_stats,
+        }
+
 
 if __name__ == "__main__":
     # Example usage
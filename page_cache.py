@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Last rendered rows of the main tables, saved on exit and painted on start
+# ----------------------------------------------------------------------------
+import hashlib
+import mmap
+import os
+import struct
+from datetime import datetime
+
+from logger import logger
+
+PAGE_CACHE_PATH = "page_cache.bin"
+MAGIC = b"TLBP"
+FORMAT_VERSION = 2
+
+# File layout (little endian):
+#   header   magic, format version, number of tables
+#   entries  one per table: name, columns digest, saved_at, rows, columns, offset of its block,
+#            offset of its drawn flags (0: every row is drawn)
+#   blocks   per table: (rows * columns + 1) uint32 cell offsets, the UTF-8 text of the cells,
+#            then one byte per row for a lazily filled table (0: only the _id of the row is saved)
+HEADER = struct.Struct("<4sHH")
+ENTRY = struct.Struct("<16s8sdIIQQ")
+OFFSET = struct.Struct("<I")
+
+
+def columns_digest(fields):
+    """The cached rows of a table are dropped when its columns change (TableSpec.fields)."""
+    return hashlib.blake2b("\0".join(fields).encode(), digest_size=8).digest()
+
+
+class CachedTable:
+    """
+    The rows of one table, read from the mapped file when they are accessed.
+    """
+
+    def __init__(self, buffer, saved_at, rows, columns, offset, flags=0):
+        self.buffer = buffer
+        self.saved_at = saved_at
+        self.rows = rows
+        self.columns = columns
+        self.offsets = offset
+        self.text = offset + (rows * columns + 1) * OFFSET.size
+        self.flags = flags
+
+    @property
+    def lazy(self):
+        """The table was filled on scroll: some rows were never drawn (see drawn)."""
+        return self.flags != 0
+
+    def drawn(self, row):
+        """False for a row saved with its _id only (first column)."""
+        return not self.flags or self.buffer[self.flags + row] != 0
+
+    def cell(self, row, column):
+        index = row * self.columns + column
+        start, = OFFSET.unpack_from(self.buffer, self.offsets + index * OFFSET.size)
+        end, = OFFSET.unpack_from(self.buffer, self.offsets + (index + 1) * OFFSET.size)
+        return bytes(self.buffer[self.text + start:self.text + end]).decode("utf-8")
+
+    def row(self, row):
+        return [self.cell(row, column) for column in range(self.columns)]
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        return (self.row(row) for row in range(self.rows))
+
+
+class PageCache:
+    """
+    A read-only mapping of the page cache file. Close it once the rows are painted:
+    the file is replaced on exit.
+    """
+
+    def __init__(self, path, schemas):
+        """
+        :param path: The page cache file.
+        :param schemas: {table_name: fields}; a table saved with other columns is skipped.
+        :raise: OSError | ValueError when the file is missing, of another version or truncated.
+        """
+        self.tables = {}
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, count = HEADER.unpack_from(self.buffer, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported page cache format {magic!r} v{version}")
+            for index in range(count):
+                name, digest, saved_at, rows, columns, offset, flags = ENTRY.unpack_from(
+                    self.buffer, HEADER.size + index * ENTRY.size
+                )
+                name = name.rstrip(b"\0").decode()
+                if name not in schemas or digest != columns_digest(schemas[name]):
+                    continue
+                table = CachedTable(self.buffer, datetime.fromtimestamp(saved_at), rows, columns, offset, flags)
+                last, = OFFSET.unpack_from(self.buffer, table.offsets + rows * columns * OFFSET.size)
+                if table.text + last > len(self.buffer) or (flags and flags + rows > len(self.buffer)):
+                    raise ValueError(f"Truncated page cache (table {name})")
+                self.tables[name] = table
+        except (struct.error, ValueError):
+            self.close()
+            raise
+
+    @classmethod
+    def open(cls, path, schemas):
+        """The page cache, or None when there is no usable file."""
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls(path, schemas)
+        except (OSError, ValueError, struct.error) as err:
+            logger.warning(f"Ignoring the page cache {path}: {err}")
+            return None
+
+    def close(self):
+        self.tables = {}
+        self.buffer.close()
+
+
+def save(path, tables):
+    """
+    Write the page cache (a temporary file replaces the old one).
+
+    :param tables: {table_name: (fields, saved_at, rows, drawn)}; rows are lists of the displayed
+                   texts, drawn is None or one bool per row of a lazily filled table (False: the
+                   row holds its _id only).
+    """
+    entries, blocks = [], []
+    offset = HEADER.size + len(tables) * ENTRY.size
+    for name, (fields, saved_at, rows, drawn) in tables.items():
+        cells = [str(value).encode("utf-8") for row in rows for value in row]
+        positions, position = [], 0
+        for cell in cells:
+            positions.append(position)
+            position += len(cell)
+        positions.append(position)
+        block = struct.pack(f"<{len(positions)}I", *positions) + b"".join(cells)
+        flags = 0
+        if drawn is not None:
+            flags = offset + len(block)
+            block += bytes(1 if row_drawn else 0 for row_drawn in drawn)
+        entries.append(ENTRY.pack(
+            name.encode(), columns_digest(fields), saved_at.timestamp(), len(rows), len(fields), offset, flags
+        ))
+        blocks.append(block)
+        offset += len(block)
+
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(tables)))
+        file.writelines(entries)
+        file.writelines(blocks)
+    os.replace(temporary, path)
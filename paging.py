@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Keyset pagination of the sorted tables
+# ----------------------------------------------------------------------------
+
+PAGE_SIZE = 200     # rows loaded per page
+
+
+def page_sort(field, direction=1):
+    """
+    The sort of a page: `field` then `_id` so that every row has a unique position.
+
+    :param field: The sorted field.
+    :param direction: 1 (ascending) or -1 (descending).
+    :return: Sort order as a list of tuples.
+    """
+    if field == "_id":
+        return [("_id", direction)]
+    return [(field, direction), ("_id", direction)]
+
+
+def keyset_query(query, field, direction, last=None):
+    """
+    Restrict `query` to the rows placed after `last` in the page_sort order.
+    The server walks the (field, _id) index from that position: no skip.
+
+    Null/missing values are ordered first (ascending) like MongoDB does,
+    and range operators never match them, so they get their own branch.
+
+    :param query: The filter of the table (dict or None).
+    :param field: The sorted field.
+    :param direction: 1 (ascending) or -1 (descending).
+    :param last: The last row of the previous page (mapping with _id and field), None for the first page.
+    :return: The query of the next page.
+    """
+    if last is None:
+        return query or {}
+
+    after = "$gt" if direction > 0 else "$lt"
+    last_id = last["_id"]
+    value = last.get(field) if field != "_id" else last_id
+
+    if field == "_id":
+        condition = {"_id": {after: last_id}}
+    elif value is None:
+        branches = [{field: None, "_id": {after: last_id}}]
+        if direction > 0:
+            branches.append({field: {"$ne": None}})
+        condition = {"$or": branches}
+    else:
+        branches = [{field: {after: value}}, {field: value, "_id": {after: last_id}}]
+        if direction < 0:
+            branches.append({field: None})
+        condition = {"$or": branches}
+
+    return {"$and": [query, condition]} if query else condition
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Aggregation pipelines shared by MongoDBHandler and AsyncMongoDBHandler
+# ----------------------------------------------------------------------------
+
+NOT_CANCELLED = {"status": {"$ne": "cancelled"}}
+
+# *************************************************************
+#       => Statistics
+# *************************************************************
+TOTAL_QUANTITY_PIPELINE = [
+    {"$group": {"_id": None, "total_quantity": {"$sum": "$qte"}}}
+]
+
+TOTAL_REVENUE_PIPELINE = [
+    {"$match": NOT_CANCELLED},  # Exclude cancelled orders
+    {"$group": {"_id": None, "total_revenue": {"$sum": "$total_price"}}}
+]
+
+ORDERS_BY_STATUS_PIPELINE = [
+    {"$match": NOT_CANCELLED},  # Exclude cancelled orders
+    {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+]
+
+TOP_CUSTOMERS_PIPELINE = [
+    {"$match": NOT_CANCELLED},  # Exclude cancelled orders
+    {"$group": {"_id": "$customer_id", "order_count": {"$sum": 1}}},
+    {"$sort": {"order_count": -1}},
+    {"$limit": 5},
+    {"$lookup": {
+        "from": "Customers",
+        "localField": "_id",
+        "foreignField": "_id",
+        "as": "customer_details"
+    }},
+    {"$project": {
+        "customer_name": {"$concat": [
+            {"$arrayElemAt": ["$customer_details.first_name", 0]},
+            " ",
+            {"$arrayElemAt": ["$customer_details.last_name", 0]},
+        ]},
+        "order_count": 1
+    }},
+]
+
+
+# *************************************************************
+#       => Orders
+# *************************************************************
+CUSTOMER_NAME = "customer_name"
+
+# The join only reads the two name fields of the customer
+CUSTOMER_LOOKUP = {
+    "$lookup": {
+        "from": "Customers",  # The name of the Customers collection
+        "localField": "customer_id",  # The field in Orders to match
+        "foreignField": "_id",  # The field in Customers to match (uses the _id index)
+        "pipeline": [{"$project": {"_id": 0, "first_name": 1, "last_name": 1}}],
+        "as": "customer_details"  # Alias for joined customer details
+    }
+}
+
+ADD_CUSTOMER_NAME = {
+    "$addFields": {
+        CUSTOMER_NAME: {
+            "$concat": [
+                {"$arrayElemAt": ["$customer_details.first_name", 0]},
+                " ",
+                {"$arrayElemAt": ["$customer_details.last_name", 0]}
+            ]
+        }
+    }
+}
+
+
+def is_simple_projection(projection):
+    """True if the projection only includes/excludes fields (no expressions)."""
+    return all(value in (0, 1, True, False) for value in projection.values())
+
+
+def split_customer_name_projection(projection):
+    """
+    Split a simple orders projection that may mention customer_name.
+
+    :param projection: Fields to include or exclude (dict), or None.
+    :return: (projection on the Orders fields, whether customer_name is needed,
+              fields to drop once the name is computed)
+    """
+    projection = projection or {}
+    include = any(value for field, value in projection.items() if field != "_id")
+    order_fields = {field: value for field, value in projection.items() if field != CUSTOMER_NAME}
+    if include:
+        join = bool(projection.get(CUSTOMER_NAME))
+    else:
+        join = projection.get(CUSTOMER_NAME) not in (0, False)
+
+    # The join needs customer_id: keep it until the name is computed
+    drop_after_join = []
+    if join and order_fields:
+        if include and not order_fields.get("customer_id"):
+            order_fields["customer_id"] = 1
+            drop_after_join.append("customer_id")
+        elif not include and order_fields.get("customer_id", 1) in (0, False):
+            del order_fields["customer_id"]
+            drop_after_join.append("customer_id")
+    return order_fields, join, drop_after_join
+
+
+def orders_with_customer_names(query=None, projection=None, sort=None, limit=0):
+    """
+    Build the pipeline returning orders with a `customer_name` field.
+
+    The result is the same as joining every matching order and then applying
+    projection, sort and limit, but the stages are reordered when possible:
+    $sort/$limit run before the $lookup (unless sorting on customer_name),
+    the order fields are projected before the join, and the join is skipped
+    when customer_name is not requested.
+
+    :param query: Filter criteria for orders.
+    :param projection: Fields to include or exclude (dict or list of field names).
+    :param sort: Sort order as a list of tuples (e.g., [("order_date", -1)]).
+    :param limit: Maximum number of documents (0 = no limit).
+    :return: The aggregation pipeline (list of stages).
+    """
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+
+    pipeline = [{"$match": query or {}}]  # Filter orders based on the query
+
+    sort_stages = []
+    if sort:
+        sort_stages.append({"$sort": dict(sort)})
+    if limit > 0:
+        sort_stages.append({"$limit": limit})
+
+    # Sorting on the joined field needs the join first
+    sort_after_join = any(field == CUSTOMER_NAME for field, _ in sort or [])
+    if not sort_after_join:
+        pipeline.extend(sort_stages)
+
+    if projection and not is_simple_projection(projection):
+        # Computed fields may use customer_name: keep the original stage order
+        pipeline += [CUSTOMER_LOOKUP, ADD_CUSTOMER_NAME, {"$unset": "customer_details"}]
+        if sort_after_join:
+            pipeline.extend(sort_stages)
+        pipeline.append({"$project": projection})
+        return pipeline
+
+    order_fields, join, drop_after_join = split_customer_name_projection(projection)
+    if order_fields:
+        pipeline.append({"$project": order_fields})
+
+    if not join:
+        if sort_after_join:
+            pipeline.extend(sort_stages)
+        return pipeline
+
+    pipeline += [CUSTOMER_LOOKUP, ADD_CUSTOMER_NAME, {"$unset": ["customer_details"] + drop_after_join}]
+    if sort_after_join:
+        pipeline.extend(sort_stages)
+    return pipeline
+
+
+if __name__ == "__main__":
+    # Benchmark: python pipelines.py --orders 1000000
+    import argparse
+    import random
+    import time
+    from datetime import datetime, timedelta
+
+    import pymongo
+    from bson.decimal128 import Decimal128
+
+    from logger import logger
+
+    def join_then_project(query=None, projection=None, sort=None, limit=0):
+        """The previous pipeline: join every matching order, then project/sort/limit."""
+        pipeline = [
+            {"$match": query or {}},
+            {"$lookup": {"from": "Customers", "localField": "customer_id",
+                         "foreignField": "_id", "as": "customer_details"}},
+            ADD_CUSTOMER_NAME,
+            {"$unset": "customer_details"},
+        ]
+        if projection:
+            pipeline.append({"$project": projection})
+        if sort:
+            pipeline.append({"$sort": dict(sort)})
+        if limit > 0:
+            pipeline.append({"$limit": limit})
+        return pipeline
+
+    parser = argparse.ArgumentParser(description="Benchmark the orders/customers join.")
+    parser.add_argument("--orders", type=int, default=1_000_000, help="number of orders (default: 1000000)")
+    parser.add_argument("--customers", type=int, default=10_000, help="number of customers (default: 10000)")
+    parser.add_argument("--limits", type=int, nargs="+", default=[50, 5000, 100000],
+                        help="page sizes to compare (default: 50 5000 100000)")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection URI")
+    parser.add_argument("--database", default="elSel3a_benchmark", help="benchmark database (dropped and re-seeded)")
+    args = parser.parse_args()
+
+    db = pymongo.MongoClient(args.uri)[args.database]
+    if db["Orders"].estimated_document_count() != args.orders:
+        logger.info(f"Seeding {args.customers} customers and {args.orders} orders in {args.database}...")
+        db["Customers"].drop()
+        db["Orders"].drop()
+        customer_ids = db["Customers"].insert_many(
+            {"first_name": f"first{i}", "last_name": f"last{i}", "client_status": "new"}
+            for i in range(args.customers)
+        ).inserted_ids
+        start_date = datetime.now() - timedelta(days=365)
+        batch = []
+        for i in range(args.orders):
+            batch.append({
+                "customer_id": random.choice(customer_ids),
+                "status": random.choice(["pending", "shipped", "delivered", "cancelled"]),
+                "order_date": start_date + timedelta(seconds=i * 30),
+                "total_price": Decimal128(str(random.randint(100, 100000))),
+                "created_at": start_date + timedelta(seconds=i * 30),
+                "products": [],
+            })
+            if len(batch) == 10_000:
+                db["Orders"].insert_many(batch, ordered=False)
+                batch.clear()
+        if batch:
+            db["Orders"].insert_many(batch, ordered=False)
+        db["Orders"].create_index("created_at")
+
+    from mongo_handler import MongoDBHandler
+    handler = MongoDBHandler(uri=args.uri, database=args.database)
+
+    def timed(name, run):
+        start = time.perf_counter()
+        count = len(run())
+        logger.info(f"{name:>26}: {count} orders in {time.perf_counter() - start:.3f}s")
+
+    projection = {"_id": 1, "customer_id": 1, "order_date": 1, "status": 1, "total_price": 1, CUSTOMER_NAME: 1}
+    for limit in args.limits:
+        request = {"projection": projection, "sort": [("created_at", -1)], "limit": limit}
+        logger.info(f"Page of {limit} orders")
+        timed("join then project", lambda: list(db["Orders"].aggregate(join_then_project(**request), allowDiskUse=True)))
+        timed("server join (optimized)", lambda: list(db["Orders"].aggregate(orders_with_customer_names(**request))))
+        # cache=False: the names map is timed, not the query cache
+        handler.customer_names.clear()
+        timed("client join (cold cache)",
+              lambda: handler.fetch_orders_with_customer_names(join="client", cache=False, **request)["orders"])
+        timed("client join (warm cache)",
+              lambda: handler.fetch_orders_with_customer_names(join="client", cache=False, **request)["orders"])
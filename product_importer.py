@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Streaming import of supplier spreadsheets (CSV/XLSX) into Products
+# ----------------------------------------------------------------------------
+import csv
+import os
+from decimal import Decimal, InvalidOperation
+
+from bson.decimal128 import Decimal128
+
+from logger import logger
+import arabic_dict as arabic
+
+PRODUCT_FIELDS = ("name", "ref", "description", "price", "qte", "category", "supplier", "is_active")
+REQUIRED_FIELDS = ("ref", "name", "price")
+
+# Supplier sheets may use the Arabic column names displayed in the application
+HEADER_ALIASES = {label: key for key, label in arabic.arabic_mapping.items() if key in PRODUCT_FIELDS}
+
+
+class ProductImporter:
+    """
+    Streams rows out of a CSV/XLSX file, normalizes them and upserts them
+    in batches through MongoDBHandler.bulk_upsert_products.
+    """
+
+    def __init__(self, db_handler, batch_size=5000):
+        """
+        :param db_handler: A connected MongoDBHandler instance.
+        :param batch_size: Number of rows sent to MongoDB in one bulk_write.
+        """
+        self.db_handler = db_handler
+        self.batch_size = batch_size
+
+    # *************************************************************
+    # Parsing
+    # *************************************************************
+    def read_rows(self, path):
+        """
+        Yield the rows of a spreadsheet one at a time as dictionaries.
+
+        :param path: Path to a .csv or .xlsx file.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            yield from self._read_csv(path)
+        elif extension in (".xlsx", ".xlsm"):
+            yield from self._read_xlsx(path)
+        else:
+            raise ValueError(f"Unsupported file type: {extension}")
+
+    def _read_csv(self, path):
+        with open(path, newline="", encoding="utf-8-sig") as csv_file:
+            reader = csv.reader(csv_file)
+            headers = [self.normalize_header(header) for header in next(reader, [])]
+            for values in reader:
+                yield dict(zip(headers, values))
+
+    def _read_xlsx(self, path):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ImportError("openpyxl is required to import .xlsx files: pip install openpyxl")
+
+        # read_only mode streams the sheet instead of loading it in memory
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            headers = [self.normalize_header(header) for header in next(rows, [])]
+            for values in rows:
+                yield dict(zip(headers, values))
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def normalize_header(header):
+        """
+        Map a spreadsheet header (English or Arabic) to a product field name.
+        """
+        header = str(header or "").strip()
+        return HEADER_ALIASES.get(header, header.lower())
+
+    # *************************************************************
+    # Validation
+    # *************************************************************
+    @staticmethod
+    def normalize_row(row):
+        """
+        Validate a raw row and convert it to the document stored in Products.
+
+        :param row: A dictionary as returned by read_rows.
+        :return: The normalized product dictionary.
+        :raise ValueError: If the row is missing a required field or has an invalid value.
+        """
+        product = {}
+        for field in PRODUCT_FIELDS:
+            value = row.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+            if value is None or value == "":
+                continue
+            product[field] = value
+
+        missing = [field for field in REQUIRED_FIELDS if field not in product]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+
+        product["ref"] = str(product["ref"])
+        product["name"] = str(product["name"])
+
+        try:
+            price = Decimal(str(product["price"]).replace(" ", ""))
+        except InvalidOperation:
+            raise ValueError(f"invalid price {product['price']!r}")
+        if not price.is_finite() or price < 0:
+            raise ValueError(f"invalid price {product['price']!r}")
+        product["price"] = Decimal128(price)
+
+        if "qte" in product:
+            try:
+                qte = Decimal(str(product["qte"]))
+            except InvalidOperation:
+                raise ValueError(f"invalid qte {product['qte']!r}")
+            if qte != qte.to_integral_value() or qte < 0:
+                raise ValueError(f"invalid qte {product['qte']!r}")
+            product["qte"] = int(qte)
+
+        if "is_active" in product and not isinstance(product["is_active"], bool):
+            product["is_active"] = str(product["is_active"]).lower() in ("1", "true", "yes", "مفعل")
+
+        return product
+
+    # *************************************************************
+    # Import
+    # *************************************************************
+    def import_file(self, path, progress_callback=None):
+        """
+        Import a spreadsheet into the Products collection.
+
+        :param path: Path to a .csv or .xlsx file.
+        :param progress_callback: Optional callable(processed_rows, failed_rows) called after each batch.
+        :return: A dictionary with the status and the import counters. Every error is
+                 {"line": ..., "ref": ..., "message": ...} (ref None when the row has none).
+        """
+        summary = {"processed": 0, "inserted": 0, "modified": 0, "failed": 0, "errors": []}
+        # ref => [line, product]: a ref repeated in a batch is one upsert of the merged rows,
+        # as if they were written one after the other (the last value of a field wins)
+        batch = {}
+
+        def fail(line_number, ref, message):
+            summary["failed"] += 1
+            summary["errors"].append({"line": line_number, "ref": ref, "message": message})
+
+        def flush():
+            lines = [line_number for line_number, _ in batch.values()]
+            response = self.db_handler.bulk_upsert_products([product for _, product in batch.values()])
+            if response["status"] == "error":
+                raise RuntimeError(response["message"])
+            summary["inserted"] += response["inserted"]
+            summary["modified"] += response["modified"]
+            for error in response["errors"]:
+                fail(lines[error["index"]], error["ref"], error["message"])
+            batch.clear()
+            if progress_callback:
+                progress_callback(summary["processed"], summary["failed"])
+
+        try:
+            # Line 1 is the header row
+            for line_number, row in enumerate(self.read_rows(path), start=2):
+                summary["processed"] += 1
+                try:
+                    product = self.normalize_row(row)
+                except ValueError as err:
+                    fail(line_number, str(row.get("ref") or "").strip() or None, str(err))
+                    continue
+
+                _, merged = batch.pop(product["ref"], (None, {}))
+                batch[product["ref"]] = (line_number, {**merged, **product})
+                if len(batch) >= self.batch_size:
+                    flush()
+
+            if batch:
+                flush()
+        except Exception as err:
+            logger.error(f"Error importing products from {path}: {err}")
+            return {"status": "error", "message": str(err), **summary}
+
+        logger.info(
+            f"Imported {path}: {summary['processed']} rows, {summary['inserted']} new, "
+            f"{summary['modified']} updated, {summary['failed']} failed."
+        )
+        return {"status": "success", **summary}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from mongo_handler import MongoDBHandler
+
+    parser = argparse.ArgumentParser(description="Import a supplier spreadsheet into the Products collection.")
+    parser.add_argument("path", help="CSV or XLSX file to import")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows per bulk write (default: 5000)")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection URI")
+    parser.add_argument("--database", default="elSel3a", help="database name")
+    args = parser.parse_args()
+
+    importer = ProductImporter(MongoDBHandler(uri=args.uri, database=args.database), batch_size=args.batch_size)
+
+    start = time.perf_counter()
+    response = importer.import_file(
+        args.path,
+        progress_callback=lambda processed, failed: logger.info(f"{processed} rows processed ({failed} failed)")
+    )
+    elapsed = time.perf_counter() - start
+
+    for error in response.get("errors", [])[:20]:
+        logger.warning(error)
+    if response["status"] == "success":
+        logger.info(f"{response['processed'] / max(elapsed, 1e-9):.0f} rows/s in {elapsed:.2f}s")
+    raise SystemExit(0 if response["status"] == "success" else 1)
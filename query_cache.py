@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Result cache of the MongoDBHandler reads, invalidated by collection versions
+# ----------------------------------------------------------------------------
+import re
+import time
+from collections import OrderedDict
+
+
+def normalize(value):
+    """
+    A hashable form of a query, projection or sort: the keys of a document are sorted
+    (their order does not change a filter), the order of a list is kept.
+    """
+    if isinstance(value, dict):
+        return ("doc", tuple(sorted((str(key), normalize(item)) for key, item in value.items())))
+    if isinstance(value, (list, tuple)):
+        return ("list", tuple(normalize(item) for item in value))
+    if isinstance(value, (set, frozenset)):
+        return ("set", tuple(sorted(repr(normalize(item)) for item in value)))
+    if isinstance(value, re.Pattern):
+        return ("regex", value.pattern, value.flags)
+    if isinstance(value, bool):
+        # True == 1 for Python, not for MongoDB
+        return ("bool", value)
+    return value
+
+
+def make_key(*parts):
+    """
+    The cache key of a read, e.g. make_key("find", collection, query, projection, sort, limit).
+    """
+    return normalize(parts)
+
+
+class QueryCache:
+    """
+    LRU of read results. An entry is stored with the versions of the collections it
+    was read from; every write bumps the version of its collection (see
+    MongoDBHandler.emit_change), so a result read before a write is never served
+    after it. Memory is bounded by the number of entries and of cached documents.
+    A cached result is served as a copy of its list and of its dict documents (one
+    level, see served): callers may set fields or sort the list, not edit nested values.
+    """
+
+    def __init__(self, max_entries=512, max_documents=50000, max_age=60):
+        """
+        :param max_entries: Maximum number of cached results.
+        :param max_documents: Maximum number of documents over all the cached results.
+        :param max_age: Seconds a result is served (changes made by other clients
+                        without change stream nor replica are seen after it).
+        """
+        self.max_entries = max_entries
+        self.max_documents = max_documents
+        self.max_age = max_age
+        self.enabled = True
+        self.entries = OrderedDict()    # key => (versions, expires, size, value)
+        self.versions = {}              # collection => int
+        self.documents = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, collections):
+        return tuple(self.versions.get(collection_name, 0) for collection_name in collections)
+
+    def bump(self, collection_name):
+        """The collection changed: its cached results are not served anymore."""
+        self.versions[collection_name] = self.versions.get(collection_name, 0) + 1
+
+    def get(self, key, collections):
+        """
+        :param collections: The collections the result depends on.
+        :return: (True, value) on a hit, (False, None) on a miss.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            versions, expires, _, value = entry
+            if versions == self.version(collections) and expires > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, value
+            self.remove(key)
+        self.misses += 1
+        return False, None
+
+    def put(self, key, collections, value, size=1, versions=None):
+        """
+        :param size: Number of documents of the value (results bigger than a
+                     quarter of max_documents are not cached).
+        :param versions: The versions when the read started (default: the current ones).
+        :return: False when the value is too big to be cached.
+        """
+        if size > self.max_documents // 4:
+            return False
+        self.remove(key)
+        if versions is None:
+            versions = self.version(collections)
+        self.entries[key] = (versions, time.monotonic() + self.max_age, size, value)
+        self.documents += size
+        while len(self.entries) > self.max_entries or self.documents > self.max_documents:
+            oldest = next(iter(self.entries))
+            self.remove(oldest)
+            self.evictions += 1
+        return True
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.documents -= entry[2]
+
+    def read(self, key, collections, read, cache=True):
+        """
+        The cached result of `read()`, or its result stored when it succeeds.
+
+        :param read: callable returning the documents (a list) or a result dictionary.
+        :param cache: False reads without the cache (the result is not stored either).
+        """
+        if not (cache and self.enabled):
+            return read()
+        found, value = self.get(key, collections)
+        if found:
+            return self.served(value)
+        # A write during the read leaves the entry outdated
+        versions = self.version(collections)
+        value = read()
+        if self.put(key, collections, value, len(value) if isinstance(value, list) else 1, versions):
+            return self.served(value)
+        return value
+
+    @staticmethod
+    def served(value):
+        """
+        The copy of a cached value given to a caller: the list and its dict documents
+        (e.g. orders getting their customer names). RawBSONDocuments and records are
+        not copied: they are not modified.
+        """
+        if isinstance(value, list):
+            return [dict(item) if type(item) is dict else item for item in value]
+        if type(value) is dict:
+            return dict(value)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.documents = 0
+
+    def stats(self):
+        """Hit rate metrics."""
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "documents": self.documents,
+        }
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Compact __slots__ records for the rows of the main tables
+# ----------------------------------------------------------------------------
+from table_specs import TABLE_SPECS
+
+
+class Record:
+    """
+    A document reduced to the displayed columns, stored in __slots__ (no per
+    instance __dict__). A field missing from the document is left unset.
+
+    Records support `field in record`, `record[field]` and `record.get(field)`
+    so they can be used wherever a table document is expected (TableSpec.row).
+    """
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+    @classmethod
+    def from_document(cls, document):
+        """Build a record from a decoded document (extra fields are ignored)."""
+        record = cls.__new__(cls)
+        for field in cls.__slots__:
+            if field in document:
+                setattr(record, field, document[field])
+        return record
+
+    def __contains__(self, field):
+        return field in self.__slots__ and hasattr(self, field)
+
+    def __getitem__(self, field):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field)
+
+    def get(self, field, default=None):
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__ if hasattr(self, field)}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class ProductRecord(Record):
+    __slots__ = tuple(TABLE_SPECS["Products"].fields)
+
+
+class CustomerRecord(Record):
+    __slots__ = tuple(TABLE_SPECS["Customers"].fields)
+
+
+class OrderRecord(Record):
+    __slots__ = tuple(TABLE_SPECS["Orders"].fields)
+
+
+RECORD_CLASSES = {"Products": ProductRecord, "Customers": CustomerRecord, "Orders": OrderRecord}
+
+
+if __name__ == "__main__":
+    # Memory benchmark: python records.py --count 1000000
+    import argparse
+    import gc
+    import tracemalloc
+    from decimal import Decimal
+    from bson.objectid import ObjectId
+
+    from logger import logger
+
+    parser = argparse.ArgumentParser(description="Compare the memory used by dict documents and records.")
+    parser.add_argument("--count", type=int, default=1_000_000, help="number of products (default: 1000000)")
+    args = parser.parse_args()
+
+    def documents():
+        for i in range(args.count):
+            yield {
+                "_id": ObjectId(), "name": f"product {i}", "ref": f"REF-{i}", "description": "",
+                "price": Decimal(i), "qte": i, "category": "cat", "supplier": "sup",
+                "created_at": None, "updated_at": None,
+            }
+
+    for name, build in (
+        ("dict", lambda: list(documents())),
+        ("ProductRecord", lambda: [ProductRecord.from_document(document) for document in documents()]),
+    ):
+        gc.collect()
+        tracemalloc.start()
+        rows = build()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        logger.info(f"{name:>14}: {current / 2 ** 20:,.1f} MiB kept, {peak / 2 ** 20:,.1f} MiB peak "
+                    f"for {len(rows)} products")
+        del rows
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       :
+# desc          : Columns of the main tables: projection, headers and row transform
+# ----------------------------------------------------------------------------
+import arabic_dict as arabic
+
+
+class TableSpec:
+    """
+    The columns displayed by one table. The same list drives the MongoDB
+    projection (only the displayed fields are fetched), the header labels
+    and the transformation of a document into a table row.
+    """
+
+    def __init__(self, table_name, columns, sortable=()):
+        """
+        :param table_name: ( Products | Customers | Orders )
+        :param columns: List of (field, transform, default); transform is an optional
+                        callable(value) and default is displayed when the field is missing.
+        :param sortable: The fields sorted by the server on a header click (each one has
+                         a (field, _id) index, see MongoDBHandler.ensure_indexes).
+        """
+        self.table_name = table_name
+        self.columns = columns
+        self.fields = [field for field, _, _ in columns]
+        self.headers = [arabic.table_headers[table_name][field] for field in self.fields]
+        self.projection = {field: 1 for field in self.fields}
+        self.sortable = tuple(sortable)
+
+    def row(self, doc):
+        """
+        Transform one document into the row displayed in the table.
+        """
+        values = []
+        for field, transform, default in self.columns:
+            if field not in doc:
+                values.append(default)
+            else:
+                values.append(transform(doc[field]) if transform else doc[field])
+        return values
+
+
+def display_status(value):
+    return arabic.status_mapping_en.get(value, "")
+
+
+TABLE_SPECS = {
+    "Products": TableSpec("Products", [
+        ("_id", None, ""),
+        ("name", None, ""),
+        ("ref", None, ""),
+        ("description", None, ""),
+        ("price", None, ""),
+        ("qte", None, ""),
+        ("category", None, ""),
+    ], sortable=("_id", "name", "ref", "price", "qte", "category")),
+    "Customers": TableSpec("Customers", [
+        ("_id", None, ""),
+        ("first_name", None, ""),
+        ("last_name", None, ""),
+        ("phone", None, ""),
+        ("email", None, ""),
+        ("address", None, ""),
+        ("is_active", display_status, ""),
+        ("client_status", display_status, ""),
+    ], sortable=("_id", "first_name", "last_name", "phone", "email", "client_status")),
+    "Orders": TableSpec("Orders", [
+        ("_id", None, ""),
+        ("customer_name", None, "غير مسجل"),
+        ("order_date", lambda value: value.strftime('%Y - %m - %d'), ""),
+        ("status", display_status, ""),
+        ("total_price", None, ""),
+    ], sortable=("_id", "order_date", "status", "total_price")),     # customer_name is computed: not indexable
+}
+
+
+if __name__ == "__main__":
+    # Measure the bytes transferred for each table: full documents vs. displayed columns
+    import argparse
+    import bson
+    import pymongo
+
+    from logger import logger
+    import pipelines
+
+    parser = argparse.ArgumentParser(description="Compare the size of full and projected table documents.")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB connection URI")
+    parser.add_argument("--database", default="elSel3a", help="database name")
+    args = parser.parse_args()
+
+    db = pymongo.MongoClient(args.uri)[args.database]
+
+    def total_size(documents):
+        return sum(len(bson.encode(document)) for document in documents)
+
+    for table_name, spec in TABLE_SPECS.items():
+        if table_name == "Orders":
+            full = db["Orders"].aggregate(pipelines.orders_with_customer_names())
+            projected = db["Orders"].aggregate(pipelines.orders_with_customer_names(projection=spec.projection))
+        else:
+            full = db[table_name].find({})
+            projected = db[table_name].find({}, spec.projection)
+        full_size, projected_size = total_size(full), total_size(projected)
+        reduction = 100 * (1 - projected_size / full_size) if full_size else 0
+        logger.info(f"{table_name}: {full_size} bytes -> {projected_size} bytes ({reduction:.1f}% less)")
@@ -0,0 +1,69 @@
+# The application modules live at the root of the repository
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from bson.objectid import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongo_handler  # noqa: E402
+from local_replica import LocalReplica, match  # noqa: E402
+from query_cache import QueryCache  # noqa: E402
+
+
+class FakeCollection:
+    """
+    The find of a pymongo collection over a list of documents (replica sync), and the
+    top level $set/$inc writes of create_order.
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query=None, projection=None, batch_size=None):
+        return [dict(document) for document in self.documents if match(document, query or {})]
+
+    def insert_one(self, document, session=None):
+        document.setdefault("_id", ObjectId())
+        self.documents.append(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    def update_one(self, query, update, session=None):
+        for document in self.documents:
+            if match(document, query):
+                document.update(update.get("$set", {}))
+                for field, step in update.get("$inc", {}).items():
+                    document[field] = document.get(field, 0) + step
+                return SimpleNamespace(matched_count=1)
+        return SimpleNamespace(matched_count=0)
+
+    def bulk_write(self, operations, ordered=True, session=None):
+        matched = sum(self.update_one(operation._filter, operation._doc).matched_count for operation in operations)
+        return SimpleNamespace(matched_count=matched)
+
+
+@pytest.fixture
+def handler(tmp_path):
+    """
+    A MongoDBHandler reading from a local replica, without a server: the collections
+    of handler.server are pulled by sync_replica. handler.events lists the changes.
+    """
+    handler = object.__new__(mongo_handler.MongoDBHandler)
+    handler.replica = LocalReplica(str(tmp_path / "replica.db"))
+    handler.server = {"Products": [], "Customers": [], "Orders": []}
+    handler.db = {name: FakeCollection(documents) for name, documents in handler.server.items()}
+    handler.query_cache = QueryCache()
+    handler.customer_names = {}
+    handler.transactions = False
+    handler.change_listeners = []
+    handler.pending_changes = []
+    handler.online = True
+    handler.sync_count = 0
+    handler.ping = lambda: True
+    handler.replay_pending_writes = lambda: None
+    handler.events = []
+    handler.add_change_listener(handler.events.append)
+    yield handler
+    handler.replica.close()
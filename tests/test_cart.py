@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+from bson.objectid import ObjectId
+
+from cart import Cart, cart_quantities, check_cart, problems_response
+
+
+def test_a_product_added_again_adds_to_its_line():
+    cart = Cart()
+    first, second = {"_id": ObjectId(), "name": "a", "price": 2.5}, {"_id": ObjectId(), "price": Decimal("4")}
+    cart.add(first)
+    cart.add(second, 2)
+    cart.add(first, 3)
+
+    assert len(cart) == 2
+    assert cart.quantity(str(first["_id"])) == 4
+    assert cart.row(str(second["_id"])) == 1
+    assert [line.name for line in cart] == ["a", "غير معروف"]
+    assert cart.total == Decimal("18")
+    assert cart.order_products() == [
+        {"product_id": str(first["_id"]), "quantity": 4}, {"product_id": str(second["_id"]), "quantity": 2},
+    ]
+
+    cart.remove(str(first["_id"]))
+    assert cart.quantity(str(first["_id"])) == 0
+    assert cart.total == Decimal("8")
+
+
+def test_price_changes_reported_by_create_order_are_applied():
+    cart = Cart()
+    product = {"_id": ObjectId(), "name": "a", "price": Decimal("3")}
+    cart.add(product, 2)
+    product_id = str(product["_id"])
+    assert cart.expected_prices() == {product_id: Decimal("3")}
+
+    cart.apply_prices([
+        {"product_id": product_id, "expected": Decimal("3"), "current": Decimal("3.5")},
+        {"product_id": str(ObjectId()), "expected": Decimal("1"), "current": Decimal("2")},
+    ])
+    assert cart.expected_prices() == {product_id: Decimal("3.5")}
+    assert cart.total == Decimal("7")
+
+    cart.clear()
+    assert len(cart) == 0 and cart.total == 0
+
+
+def test_check_cart_reports_every_problem():
+    known, short = str(ObjectId()), str(ObjectId())
+    missing = str(ObjectId())
+    quantities = cart_quantities([
+        {"product_id": known, "quantity": 1}, {"product_id": short, "quantity": 2},
+        {"product_id": short, "quantity": 2}, {"product_id": missing, "quantity": 1},
+    ])
+    found = {
+        known: {"name": "a", "price": Decimal("3"), "qte": 1},
+        short: {"name": "b", "price": Decimal("1"), "qte": 3},
+    }
+    problems = check_cart(quantities, found, {known: Decimal("2"), short: Decimal("1")})
+
+    assert problems["missing"] == [missing]
+    assert problems["stock"] == [{"product_id": short, "name": "b", "quantity": 4, "available": 3}]
+    assert [change["product_id"] for change in problems["price_changes"]] == [known]
+    assert problems_response(problems)["status"] == "error"
+    assert problems_response({"missing": [], "stock": [], "price_changes": []}) is None
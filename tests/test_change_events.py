@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+
+def product(**fields):
+    return {"_id": ObjectId(), "name": "p", "qte": 1, "updated_at": datetime(2024, 1, 1), **fields}
+
+
+def test_sync_replica_is_silent_without_changes(handler):
+    handler.server["Products"].append(product())
+    assert handler.sync_replica()["pulled"] == 1
+    assert [event["operation"] for event in handler.events] == ["insert"]
+
+    version = handler.query_cache.version(("Products",))
+    assert handler.sync_replica()["pulled"] == 0
+    assert len(handler.events) == 1
+    assert handler.query_cache.version(("Products",)) == version
+
+
+def test_stream_change_already_pulled_is_not_notified_again(handler):
+    document = product()
+    handler.server["Products"].append(document)
+    handler.sync_replica()
+    handler.events.clear()
+
+    change = {"collection": "Products", "operation": "update", "document_id": document["_id"], "document": document}
+    handler.handle_stream_change(change)
+    assert handler.events == []
+
+    changed = dict(document, qte=5)
+    handler.handle_stream_change(dict(change, document=changed))
+    handler.handle_stream_change(dict(change, document=changed))
+    assert len(handler.events) == 1
+
+    delete = {"collection": "Products", "operation": "delete", "document_id": document["_id"]}
+    handler.handle_stream_change(delete)
+    handler.handle_stream_change(delete)
+    assert [event["operation"] for event in handler.events] == ["update", "delete"]
+
+
+def test_sync_replica_takes_the_answer_of_a_ping_made_elsewhere(handler):
+    def ping():
+        raise AssertionError("pinged on the calling thread")
+    handler.ping = ping
+    handler.ensure_indexes = lambda: None
+    handler.server["Products"].append(product())
+
+    assert handler.sync_replica(reachable=False)["status"] == "warning"
+    assert not handler.online
+    assert handler.sync_replica(reachable=True)["pulled"] == 1
+    assert handler.online
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+from detail_cache import DetailCache
+
+
+def add_product(handler):
+    product = {"_id": ObjectId(), "name": "a", "qte": 1, "updated_at": datetime(2024, 1, 1)}
+    handler.server["Products"].append(product)
+    handler.sync_replica()
+    return product
+
+
+def test_prefetch_stores_the_selected_document(handler):
+    product = add_product(handler)
+    cache = DetailCache(handler)
+    handler.add_change_listener(cache.on_change)
+
+    cache.prefetch("Products", str(product["_id"]))
+    assert cache.cached("Products", product["_id"])["name"] == "a"
+    cache.prefetch("Products", str(ObjectId()))     # missing: nothing stored, no error
+    assert len(cache.documents) == 1
+
+
+def test_a_background_read_older_than_a_change_is_dropped(handler):
+    product = add_product(handler)
+    cache = DetailCache(handler)
+    handler.add_change_listener(cache.on_change)
+
+    changes = cache.changes
+    response = cache.read("Products", product["_id"], cache=False)
+    handler.emit_change("Products", "update", product["_id"])
+    handler.flush_changes()
+    cache.prefetched("Products", str(product["_id"]), changes, response)
+    assert cache.cached("Products", product["_id"]) is None
+
+    cache.prefetched("Products", str(product["_id"]), cache.changes, response)
+    assert cache.cached("Products", product["_id"]) is not None
+
+
+def test_a_change_drops_the_cached_document(handler):
+    product = add_product(handler)
+    cache = DetailCache(handler)
+    handler.add_change_listener(cache.on_change)
+
+    assert cache.get("Products", str(product["_id"]))["document"]["name"] == "a"
+    product.update(name="b", updated_at=datetime(2024, 1, 2))
+    handler.sync_replica()
+    assert cache.cached("Products", product["_id"]) is None
+    assert cache.get("Products", str(product["_id"]))["document"]["name"] == "b"
+    assert list(cache.documents) == [("Products", product["_id"])]
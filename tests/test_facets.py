@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+import facets
+
+
+def add_products(handler):
+    rows = [
+        ("food", "A", True, 0), ("food", "A", True, 5), ("food", "B", False, 50),
+        ("tools", "B", True, 150), ("tools", None, True, 12), ("toys", "A", False, "n/a"),
+    ]
+    for category, supplier, is_active, qte in rows:
+        product = {"_id": ObjectId(), "category": category, "is_active": is_active, "qte": qte,
+                   "updated_at": datetime(2024, 1, 1)}
+        if supplier is not None:
+            product["supplier"] = supplier
+        handler.server["Products"].append(product)
+    handler.sync_replica()
+
+
+def test_counts_without_filters(handler):
+    add_products(handler)
+    counts = handler.fetch_product_facets(cache=False)["facets"]
+    assert counts["category"] == [("food", 3), ("tools", 2), ("toys", 1)]
+    assert counts["supplier"] == [("A", 3), ("B", 2)]
+    assert dict(counts["is_active"]) == {True: 4, False: 2}
+    # A qte that is not a number is in no stock range
+    assert counts["stock"] == [("out", 1), ("low", 1), ("available", 2), ("high", 1)]
+
+
+def test_a_facet_ignores_its_own_selection(handler):
+    add_products(handler)
+    filters = {"category": ["food"], "stock": ["low", "available"]}
+    counts = handler.fetch_product_facets(filters, cache=False)["facets"]
+    assert counts["category"] == [("food", 2), ("tools", 1)]
+    assert counts["supplier"] == [("A", 1), ("B", 1)]
+    assert dict(counts["is_active"]) == {True: 1, False: 1}
+    assert counts["stock"] == [("out", 1), ("low", 1), ("available", 1), ("high", 0)]
+
+
+def test_replica_counts_match_the_aggregation_shape(handler):
+    add_products(handler)
+    filters = {"is_active": [True], "supplier": ["A", "B"]}
+    result = facets.count_replica(handler.replica, filters)
+    assert set(result) == set(facets.FACET_FIELDS) | {facets.STOCK}
+    assert all(set(group) == {"_id", "count"} for groups in result.values() for group in groups)
+    assert result["stock"] == [{"_id": "out", "count": 1}, {"_id": "low", "count": 1},
+                               {"_id": "high", "count": 1}]
@@ -0,0 +1,216 @@
+import random
+import sqlite3
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import bson
+import pytest
+from bson.objectid import ObjectId
+
+import local_replica
+from conftest import FakeCollection
+from bson_codecs import CODEC_OPTIONS
+from local_replica import LocalReplica, literal_prefix, match, sort_documents
+from paging import page_sort
+
+BASE = datetime(2024, 1, 1)
+
+
+def make_products(count=300, seed=1):
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        product = {
+            "_id": ObjectId(),
+            "name": rng.choice(["alpha", "beta", "Alp", "al.x", "gamma"]) + str(i % 7),
+            "ref": f"R{i:04d}",
+            "price": Decimal(rng.choice(["0.1", "1.5", "2", "10"])),
+            "qte": rng.choice([0, 1, 5, 10, 50, 100, 200]),
+            "is_active": rng.choice([True, False]),
+            "updated_at": BASE + timedelta(seconds=rng.randint(0, 1000)),
+        }
+        category = rng.choice(["a", "b", "ab", None])
+        if category is not None or rng.random() < 0.5:
+            product["category"] = category
+        if rng.random() < 0.05:
+            product["price"] = "free"
+        products.append(product)
+    return products
+
+
+@pytest.fixture
+def products():
+    return make_products()
+
+
+@pytest.fixture
+def replica(tmp_path, products):
+    replica = LocalReplica(str(tmp_path / "replica.db"))
+    replica.upsert_documents("Products", products)
+    yield replica
+    replica.close()
+
+
+def ids(documents):
+    return [str(document["_id"]) for document in documents]
+
+
+# *************************************************************
+# Python matcher
+# *************************************************************
+def test_match_operators():
+    document = {"name": "alpha", "qte": 5, "tags": ["x", "y"], "price": Decimal("2.5")}
+    assert match(document, {"name": "alpha", "qte": {"$gte": 5, "$lt": 6}})
+    assert match(document, {"tags": "x"})
+    assert match(document, {"tags": {"$regex": "^y"}})
+    assert match(document, {"missing": None})
+    assert match(document, {"$or": [{"name": "beta"}, {"price": {"$gt": 2}}]})
+    assert not match(document, {"name": {"$nin": ["alpha"]}})
+    assert not match(document, {"name": {"$regex": "^AL"}})
+    assert match(document, {"name": {"$regex": "^AL", "$options": "i"}})
+    assert not match(document, {"qte": {"$gt": "a"}})
+
+
+def test_sort_documents_orders_types_like_mongodb():
+    documents = [{"v": "text"}, {"v": 2}, {}, {"v": datetime(2024, 1, 1)}, {"v": True}, {"v": ObjectId()}]
+    kinds = [type(document.get("v")).__name__ for document in sort_documents(documents, [("v", 1)])]
+    assert kinds == ["NoneType", "int", "str", "ObjectId", "bool", "datetime"]
+
+
+def test_literal_prefix():
+    assert literal_prefix("^abc") == "abc"
+    assert literal_prefix("^a\\.b\\ c") == "a.b c"
+    assert literal_prefix("^") == ""
+    assert literal_prefix("abc") is None
+    assert literal_prefix("^a.c") is None
+    assert literal_prefix("^a\\d") is None
+
+
+# *************************************************************
+# SQL pushdown: same results as the Python matcher
+# *************************************************************
+QUERIES = [
+    {},
+    {"category": "a"},
+    {"category": None},
+    {"category": {"$ne": None}},
+    {"category": {"$in": ["a", None]}},
+    {"category": {"$nin": ["a", None]}},
+    {"category": {"$nin": ["a"]}},
+    {"category": {"$exists": True}},
+    {"price": {"$gt": 1.5}},
+    {"price": {"$gte": Decimal("2")}},
+    {"price": {"$lt": 10}},
+    {"qte": {"$gte": 10, "$lt": 100}},
+    {"is_active": True},
+    {"name": {"$regex": "^al"}},
+    {"name": {"$regex": "^al\\.x"}},
+    {"name": {"$regex": "^AL", "$options": "i"}},
+    {"name": {"$regex": "pha"}},
+    {"updated_at": {"$gte": BASE + timedelta(seconds=500)}},
+    {"description": None},
+    {"$or": [{"name": {"$regex": "^be"}}, {"ref": {"$regex": "^R01"}}]},
+    {"$or": [{"category": "a"}, {"description": "x"}]},
+    {"$and": [{"category": {"$in": ["a", "b"]}}, {"$or": [{"qte": {"$lt": 1}}, {"qte": {"$gte": 100}}]}]},
+    {"ref": {"$in": [f"R{i:04d}" for i in range(0, 2000, 2)]}},
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_find_matches_python(replica, products, query):
+    expected = {str(product["_id"]) for product in products if match(product, query)}
+    assert set(ids(replica.find("Products", query))) == expected
+    assert replica.count("Products", query) == len(expected)
+
+
+def test_find_by_ids(replica, products):
+    wanted = [product["_id"] for product in products[:40]]
+    assert set(ids(replica.find("Products", {"_id": {"$in": wanted}}))) == set(map(str, wanted))
+    assert ids(replica.find("Products", {"_id": wanted[3]})) == [str(wanted[3])]
+
+
+@pytest.mark.parametrize("sort", [[("name", 1), ("_id", 1)], [("qte", -1), ("_id", 1)], [("category", 1), ("_id", -1)]])
+def test_sort_and_limit(replica, products, sort):
+    expected = sort_documents(list(products), sort)[:30]
+    assert ids(replica.find("Products", sort=sort, limit=30)) == ids(expected)
+
+
+@pytest.mark.parametrize("field", ["name", "qte", "category", "updated_at", "_id"])
+@pytest.mark.parametrize("direction", [1, -1])
+def test_find_page_walks_the_sort_order(replica, products, field, direction):
+    expected = sort_documents(list(products), page_sort(field, direction))
+    rows, last = [], None
+    while True:
+        page = replica.find_page("Products", {}, field, direction, last, 40)
+        rows.extend(page)
+        if len(page) < 40:
+            break
+        last = page[-1]
+    assert ids(rows) == ids(expected)
+
+
+def test_group_count(replica, products):
+    query = {"qte": {"$gte": 10}}
+    expected = {}
+    for product in products:
+        if match(product, query):
+            expected[product.get("category")] = expected.get(product.get("category"), 0) + 1
+    groups = replica.group_count("Products", "category", query)
+    assert {group["_id"]: group["count"] for group in groups} == expected
+    assert [group["count"] for group in groups] == sorted(expected.values(), reverse=True)
+
+
+def test_key_fields_match_array_elements(tmp_path):
+    replica = LocalReplica(str(tmp_path / "replica.db"))
+    customers = [
+        {"_id": ObjectId(), "search_keys": ["ali", "ben", "0555"]},
+        {"_id": ObjectId(), "search_keys": ["alia", "0666"]},
+        {"_id": ObjectId()},
+    ]
+    replica.upsert_documents("Customers", customers)
+    assert len(replica.find("Customers", {"search_keys": {"$regex": "^al"}})) == 2
+    assert len(replica.find("Customers", {"search_keys": "0666"})) == 1
+    customers[1]["search_keys"] = ["zed"]
+    replica.upsert_documents("Customers", [customers[1]])
+    assert len(replica.find("Customers", {"search_keys": {"$regex": "^al"}})) == 1
+    replica.delete_documents("Customers", [customers[0]["_id"]])
+    assert replica.find("Customers", {"search_keys": {"$regex": "^al"}}) == []
+    replica.close()
+
+
+def test_old_replica_files_are_indexed_on_open(tmp_path, products):
+    path = str(tmp_path / "replica.db")
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE "Products" (_id TEXT PRIMARY KEY, doc BLOB NOT NULL)')
+    connection.executemany(
+        'INSERT INTO "Products" VALUES (?, ?)',
+        [(str(product["_id"]), bson.encode(product, codec_options=CODEC_OPTIONS)) for product in products]
+    )
+    connection.commit()
+    connection.close()
+
+    replica = LocalReplica(path)
+    expected = [product for product in products if product.get("category") == "a"]
+    assert set(ids(replica.find("Products", {"category": "a"}))) == set(ids(expected))
+    columns = {row[1] for row in replica.connection.execute('PRAGMA table_info("Products")')}
+    assert set(local_replica.INDEXED_FIELDS["Products"]) <= columns
+    replica.close()
+
+
+# *************************************************************
+# Synchronization
+# *************************************************************
+def test_sync_reports_only_real_changes(tmp_path, products):
+    replica = LocalReplica(str(tmp_path / "replica.db"))
+    db = {"Products": FakeCollection(products), "Customers": FakeCollection([]), "Orders": FakeCollection([])}
+
+    first = replica.sync(db)
+    assert len(first) == len(products) and {operation for _, operation, _ in first} == {"insert"}
+    # The overlap reads the newest documents again: nothing changed
+    assert replica.sync(db) == []
+
+    newest = max(products, key=lambda product: product["updated_at"])
+    newest["qte"] += 1
+    assert replica.sync(db) == [("Products", "update", str(newest["_id"]))]
+    assert replica.sync(db) == []
+    replica.close()
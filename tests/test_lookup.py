@@ -0,0 +1,76 @@
+from datetime import datetime
+from decimal import Decimal
+
+from bson.objectid import ObjectId
+
+from lookup import CustomerLookup, ProductLookup, RefIndex, customer_search_keys
+
+
+def add_products(handler, count=50):
+    products = [
+        {"_id": ObjectId(), "name": f"product {i:02d}", "ref": f"REF-{i:03d}", "qte": 10,
+         "price": Decimal("2.50"), "updated_at": datetime(2024, 1, 1)}
+        for i in range(count)
+    ]
+    handler.server["Products"].extend(products)
+    handler.sync_replica()
+    return products
+
+
+def test_ref_index_reads_a_reference_once_and_follows_changes(handler):
+    products = add_products(handler)
+    index = RefIndex(handler)
+    handler.add_change_listener(index.on_change)
+
+    assert index.lookup("REF-007")["_id"] == products[7]["_id"]
+    assert list(index.products) == ["REF-007"]      # nothing else is loaded
+    assert index.lookup("UNKNOWN") is None
+
+    products[7]["qte"] = 3
+    products[7]["updated_at"] = datetime(2024, 1, 2)
+    handler.sync_replica()
+    assert index.lookup("REF-007")["qte"] == 3
+
+    handler.server["Products"].remove(products[7])
+    handler.replica.delete_documents("Products", [products[7]["_id"]])
+    handler.emit_change("Products", "delete", products[7]["_id"])
+    handler.flush_changes()
+    assert index.lookup("REF-007") is None
+
+
+def test_product_lookup_prefix(handler):
+    add_products(handler)
+    lookup = ProductLookup(handler, limit=5)
+    assert [product["name"] for product in lookup.search("product 1")] == [f"product {i}" for i in range(10, 15)]
+    assert [product["ref"] for product in lookup.search("REF-04")] == [f"REF-04{i}" for i in range(5)]
+    assert lookup.search("none") == []
+
+    # The recently used products come first
+    lookup.remember(lookup.search("REF-049")[0])
+    assert lookup.search("product 4")[0]["ref"] == "REF-049"
+
+
+def test_customer_lookup_by_name_or_phone(handler):
+    customers = [
+        {"_id": ObjectId(), "first_name": "أحمد", "last_name": "بن علي", "phone": "0555 12 34 56"},
+        {"_id": ObjectId(), "first_name": "Amina", "last_name": "Saidi", "phone": "0666"},
+    ]
+    for customer in customers:
+        customer["search_keys"] = customer_search_keys(customer)
+        customer["updated_at"] = datetime(2024, 1, 1)
+    handler.server["Customers"].extend(customers)
+    handler.sync_replica()
+
+    lookup = CustomerLookup(handler)
+    assert [customer["_id"] for customer in lookup.search("احمد")] == [customers[0]["_id"]]
+    assert [customer["_id"] for customer in lookup.search("saidi am")] == [customers[1]["_id"]]
+    assert [customer["_id"] for customer in lookup.search("0555 12")] == [customers[0]["_id"]]
+
+
+def test_customer_lookup_returns_each_customer_once(handler):
+    customer = {"_id": ObjectId(), "first_name": "sami", "last_name": "samir", "phone": ""}
+    customer["search_keys"] = customer_search_keys(customer)    # "sami samir" and "samir sami"
+    customer["updated_at"] = datetime(2024, 1, 1)
+    handler.server["Customers"].append(customer)
+    handler.sync_replica()
+    assert len(CustomerLookup(handler).search("sam")) == 1
@@ -0,0 +1,62 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from bson.objectid import ObjectId
+
+
+@pytest.fixture
+def offline(handler):
+    product = {"_id": ObjectId(), "name": "p", "price": Decimal("2.5"), "qte": 5, "updated_at": datetime(2024, 1, 1)}
+    handler.server["Products"].append(product)
+    handler.server["Customers"].append({"_id": ObjectId(), "first_name": "a", "last_name": "b"})
+    handler.sync_replica()
+    handler.events.clear()
+    handler.online = False
+    return handler
+
+
+def test_an_offline_update_shows_in_the_replica(offline):
+    product_id = offline.server["Products"][0]["_id"]
+    response = offline.update_document("Products", str(product_id), {"name": "new"})
+
+    assert response["status"] == "success" and response["queued"]
+    assert offline.replica.get_many("Products", [product_id])[0]["name"] == "new"
+    assert offline.server["Products"][0]["name"] == "p"
+    assert [write[1] for write in offline.replica.pending_writes()] == ["update_document"]
+    assert [(event["operation"], event["document_id"]) for event in offline.events] == [("update", product_id)]
+
+
+def test_an_offline_insert_is_replayed_with_its_id(offline):
+    response = offline.add_document("Products", {"name": "q", "qte": 1})
+
+    product_id = ObjectId(response["id"])
+    assert offline.replica.get_many("Products", [product_id])
+    (_, _, args, _), = offline.replica.pending_writes()
+    assert args[1]["_id"] == product_id
+
+
+def test_a_refused_offline_write_is_not_queued(offline):
+    response = offline.update_document("Products", str(ObjectId()), {"name": "new"})
+
+    assert response["status"] == "error"
+    assert offline.replica.pending_writes() == []
+
+
+def test_an_offline_order_takes_the_local_stock(offline):
+    product_id = offline.server["Products"][0]["_id"]
+    customer_id = offline.server["Customers"][0]["_id"]
+    response = offline.create_order(customer_id, [{"product_id": str(product_id), "quantity": 2}])
+
+    assert response["status"] == "success"
+    assert offline.replica.get_many("Products", [product_id])[0]["qte"] == 3
+    order, = offline.replica.get_many("Orders", [ObjectId(response["order_id"])])
+    assert order["customer_id"] == customer_id
+    (_, method, _, kwargs), = offline.replica.pending_writes()
+    assert method == "create_order" and kwargs["order_id"] == order["_id"]
+    assert offline.server["Orders"] == [] and offline.server["Products"][0]["qte"] == 5
+
+    response = offline.create_order(customer_id, [{"product_id": str(product_id), "quantity": 4}])
+    assert response["status"] == "error"
+    assert offline.replica.get_many("Products", [product_id])[0]["qte"] == 3
+    assert len(offline.replica.pending_writes()) == 1
@@ -0,0 +1,64 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from bson.objectid import ObjectId
+
+
+@pytest.fixture
+def products(handler):
+    products = [
+        {"_id": ObjectId(), "name": f"p{i}", "price": Decimal("2.5"), "qte": 5, "updated_at": datetime(2024, 1, 1)}
+        for i in range(2)
+    ]
+    handler.server["Products"].extend(products)
+    handler.server["Customers"].append({"_id": ObjectId(), "first_name": "a", "last_name": "b"})
+    handler.sync_replica()
+    return products
+
+
+def order_lines(products, *quantities):
+    return [{"product_id": str(product["_id"]), "quantity": quantity} for product, quantity in zip(products, quantities)]
+
+
+def test_an_order_takes_the_stock_of_its_lines(handler, products):
+    customer_id = handler.server["Customers"][0]["_id"]
+    lines = order_lines(products, 2, 5) + order_lines(products, 1)
+    response = handler.create_order(customer_id, lines)
+
+    assert response["status"] == "success"
+    order, = handler.server["Orders"]
+    assert order["products"] == [
+        {"product_id": str(products[0]["_id"]), "quantity": 3}, {"product_id": str(products[1]["_id"]), "quantity": 5},
+    ]
+    assert order["total_price"].to_decimal() == Decimal("20")
+    assert [product["qte"] for product in products] == [2, 0]
+    assert handler.replica.get_many("Orders", [order["_id"]])
+
+
+def test_nothing_is_written_when_a_price_changed(handler, products):
+    customer_id = handler.server["Customers"][0]["_id"]
+    expected = {str(products[0]["_id"]): Decimal("2")}
+    response = handler.create_order(customer_id, order_lines(products, 1), expected_prices=expected)
+
+    assert response["status"] == "warning"
+    assert response["price_changes"][0]["current"] == Decimal("2.5")
+    assert handler.server["Orders"] == [] and products[0]["qte"] == 5
+
+
+def test_stock_taken_after_the_check_cancels_the_order(handler, products):
+    customer_id = handler.server["Customers"][0]["_id"]
+    collection = handler.db["Products"]
+    find = collection.find
+
+    def find_then_sell(query=None, projection=None, batch_size=None):
+        documents = find(query, projection, batch_size)
+        products[1]["qte"] = 1      # another client sold the stock meanwhile
+        return documents
+    collection.find = find_then_sell
+
+    response = handler.create_order(customer_id, order_lines(products, 2, 3))
+    assert response["status"] == "error"
+    assert handler.server["Orders"] == []
+    # The line taken before the failing one is given back
+    assert [product["qte"] for product in products] == [5, 1]
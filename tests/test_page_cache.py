@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import page_cache
+from page_cache import PageCache
+
+FIELDS = ("_id", "name", "price")
+SAVED_AT = datetime(2024, 5, 1, 12, 30)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "page_cache.bin")
+    rows = [["1", "قلم", "10.5"], ["2", "", "0"], ["3", "ورق A4", "250"]]
+    page_cache.save(path, {"Products": (FIELDS, SAVED_AT, rows, None)})
+
+    cache = PageCache.open(path, {"Products": FIELDS})
+    table = cache.tables["Products"]
+    assert list(table) == rows
+    assert table.saved_at == SAVED_AT
+    assert table.cell(2, 1) == "ورق A4"
+    assert not table.lazy and all(table.drawn(row) for row in range(len(table)))
+    cache.close()
+
+
+def test_lazy_rows_keep_their_place(tmp_path):
+    path = str(tmp_path / "page_cache.bin")
+    rows = [["1", "a", "1"], ["2", "", ""], ["3", "c", "3"]]
+    page_cache.save(path, {"Orders": (FIELDS, SAVED_AT, rows, [True, False, True])})
+
+    cache = PageCache.open(path, {"Orders": FIELDS})
+    table = cache.tables["Orders"]
+    assert table.lazy
+    assert [table.drawn(row) for row in range(len(table))] == [True, False, True]
+    assert [table.cell(row, 0) for row in range(len(table))] == ["1", "2", "3"]
+    cache.close()
+
+
+def test_changed_columns_are_skipped(tmp_path):
+    path = str(tmp_path / "page_cache.bin")
+    page_cache.save(path, {
+        "Products": (FIELDS, SAVED_AT, [["1", "a", "1"]], None),
+        "Customers": (("_id", "name"), SAVED_AT, [["1", "b"]], None),
+    })
+    cache = PageCache.open(path, {"Products": FIELDS, "Customers": ("_id", "first_name")})
+    assert list(cache.tables) == ["Products"]
+    cache.close()
+
+
+def test_unusable_files_are_ignored(tmp_path):
+    path = str(tmp_path / "page_cache.bin")
+    assert PageCache.open(path, {"Products": FIELDS}) is None
+
+    page_cache.save(path, {"Products": (FIELDS, SAVED_AT, [["1", "a" * 100, "1"]], None)})
+    with open(path, "rb") as file:
+        content = file.read()
+    with open(path, "wb") as file:
+        file.write(content[:-50])
+    assert PageCache.open(path, {"Products": FIELDS}) is None
+
+    with open(path, "wb") as file:
+        file.write(b"TLBP\x01\x00\x00\x00")
+    assert PageCache.open(path, {"Products": FIELDS}) is None
@@ -0,0 +1,69 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from bson.objectid import ObjectId
+
+
+def walk(handler, collection_name, sort_field, direction, page_size=7):
+    """Every page of a table: the rows in order and the number of pages."""
+    rows, after, pages = [], None, 0
+    while True:
+        response = handler.fetch_page(collection_name, sort_field=sort_field, direction=direction,
+                                      after=after, page_size=page_size)
+        assert response["status"] == "success"
+        rows.extend(response["documents"])
+        pages += 1
+        if not response["has_more"]:
+            return rows, pages
+        after = response["documents"][-1]
+
+
+@pytest.fixture
+def products(handler):
+    products = []
+    for i in range(30):
+        product = {"_id": ObjectId(), "name": f"product {i % 9}", "ref": f"REF-{i:03d}",
+                   "price": Decimal(i % 4), "updated_at": datetime(2024, 1, 1)}
+        if i % 5:
+            product["qte"] = i % 6      # missing qte: null first
+        products.append(product)
+    handler.server["Products"].extend(products)
+    handler.sync_replica()
+    return products
+
+
+@pytest.mark.parametrize("sort_field", ["_id", "name", "qte", "price"])
+@pytest.mark.parametrize("direction", [1, -1])
+def test_pages_follow_the_sort_order(handler, products, sort_field, direction):
+    rows, pages = walk(handler, "Products", sort_field, direction)
+    assert pages == 5
+
+    def key(product):
+        value = product.get(sort_field)
+        return (value is not None, value if value is not None else 0, product["_id"])
+    expected = sorted(products, key=key, reverse=direction < 0)
+    assert [row["_id"] for row in rows] == [product["_id"] for product in expected]
+
+
+def test_orders_pages_carry_the_customer_names(handler):
+    customer = {"_id": ObjectId(), "first_name": "Amina", "last_name": "Saidi", "updated_at": datetime(2024, 1, 1)}
+    handler.server["Customers"].append(customer)
+    handler.server["Orders"].extend(
+        {"_id": ObjectId(), "customer_id": customer["_id"] if i % 2 else ObjectId(), "status": "pending",
+         "total_price": Decimal(i), "updated_at": datetime(2024, 1, 1)}
+        for i in range(10)
+    )
+    handler.sync_replica()
+
+    rows, _ = walk(handler, "Orders", "total_price", -1, page_size=4)
+    assert [row["total_price"] for row in rows] == [Decimal(i) for i in range(9, -1, -1)]
+    assert [row.get("customer_name") for row in rows] == ["Amina Saidi", None] * 5
+
+
+def test_a_page_is_read_once(handler, products):
+    first = handler.fetch_page("Products", sort_field="name", after=None, page_size=10)
+    misses = handler.query_cache.misses
+    second = handler.fetch_page("Products", sort_field="name", after=None, page_size=10)
+    assert handler.query_cache.misses == misses
+    assert [row["_id"] for row in second["documents"]] == [row["_id"] for row in first["documents"]]
@@ -0,0 +1,105 @@
+import csv
+from decimal import Decimal
+
+import pytest
+
+from product_importer import HEADER_ALIASES, ProductImporter
+
+
+class UpsertRecorder:
+    """The bulk_upsert_products of MongoDBHandler: records the batches, refuses the refs of `refused`."""
+
+    def __init__(self, refused=()):
+        self.batches = []
+        self.refused = set(refused)
+        self.refs = set()
+
+    def bulk_upsert_products(self, products):
+        self.batches.append(products)
+        errors = [
+            {"index": index, "ref": product["ref"], "message": "E11000 duplicate key"}
+            for index, product in enumerate(products) if product["ref"] in self.refused
+        ]
+        written = [product["ref"] for product in products if product["ref"] not in self.refused]
+        inserted = len(set(written) - self.refs)
+        self.refs.update(written)
+        return {"status": "warning" if errors else "success", "inserted": inserted,
+                "modified": len(written) - inserted, "errors": errors}
+
+
+def write_csv(path, rows, headers=("ref", "name", "price", "qte")):
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture
+def recorder():
+    return UpsertRecorder()
+
+
+def test_valid_rows_are_normalized(tmp_path, recorder):
+    path = write_csv(tmp_path / "products.csv", [("A1", " Milk ", "1 200.50", "3"), ("A2", "Tea", "4", "")])
+    response = ProductImporter(recorder).import_file(path)
+
+    assert response["status"] == "success"
+    assert (response["processed"], response["inserted"], response["failed"]) == (2, 2, 0)
+    milk, tea = recorder.batches[0]
+    assert milk["name"] == "Milk" and milk["price"].to_decimal() == Decimal("1200.50") and milk["qte"] == 3
+    assert "qte" not in tea
+
+
+def test_arabic_headers_are_mapped():
+    label = next(label for label, field in HEADER_ALIASES.items() if field == "price")
+    headers = [ProductImporter.normalize_header(header) for header in ("Ref", " NAME ", label)]
+    assert headers == ["ref", "name", "price"]
+
+
+def test_invalid_rows_are_reported_with_their_line(tmp_path, recorder):
+    rows = [("A1", "Milk", "abc", "1"), ("", "Tea", "2", "1"), ("A3", "Sugar", "2", "1.5"), ("A4", "Salt", "1", "2")]
+    response = ProductImporter(recorder).import_file(write_csv(tmp_path / "products.csv", rows))
+
+    assert response["status"] == "success"
+    assert (response["processed"], response["inserted"], response["failed"]) == (4, 1, 3)
+    assert [(error["line"], error["ref"]) for error in response["errors"]] == [(2, "A1"), (3, None), (4, "A3")]
+    assert response["errors"][1]["message"] == "missing ref"
+
+
+def test_a_duplicate_ref_is_one_upsert_of_the_last_values(tmp_path, recorder):
+    rows = [("A1", "Milk", "1", "5"), ("A2", "Tea", "2", "1"), ("A1", "Milk 1L", "3", "")]
+    response = ProductImporter(recorder).import_file(write_csv(tmp_path / "products.csv", rows))
+
+    assert (response["processed"], response["inserted"], response["failed"]) == (3, 2, 0)
+    batch, = recorder.batches
+    milk, = [product for product in batch if product["ref"] == "A1"]
+    assert milk["name"] == "Milk 1L" and milk["price"].to_decimal() == 3 and milk["qte"] == 5
+
+
+def test_rows_are_sent_in_batches(tmp_path, recorder):
+    rows = [(f"R{i}", f"product {i}", "1", "1") for i in range(7)] + [("R0", "product 0", "2", "1")]
+    progress = []
+    importer = ProductImporter(recorder, batch_size=3)
+    response = importer.import_file(write_csv(tmp_path / "products.csv", rows),
+                                    progress_callback=lambda processed, failed: progress.append(processed))
+
+    assert [len(batch) for batch in recorder.batches] == [3, 3, 2]
+    assert progress == [3, 6, 8]
+    # R0 of the last batch updates the product of the first batch
+    assert (response["inserted"], response["modified"]) == (7, 1)
+
+
+def test_refused_writes_are_reported_with_their_line(tmp_path):
+    recorder = UpsertRecorder(refused={"R4"})
+    rows = [(f"R{i}", f"product {i}", "1", "1") for i in range(6)]
+    response = ProductImporter(recorder, batch_size=4).import_file(write_csv(tmp_path / "products.csv", rows))
+
+    assert response["status"] == "success"
+    assert response["errors"] == [{"line": 6, "ref": "R4", "message": "E11000 duplicate key"}]
+    assert (response["inserted"], response["failed"]) == (5, 1)
+
+
+def test_unsupported_file_type(tmp_path, recorder):
+    response = ProductImporter(recorder).import_file(str(tmp_path / "products.txt"))
+    assert response["status"] == "error"
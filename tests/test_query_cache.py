@@ -0,0 +1,79 @@
+import query_cache
+from query_cache import QueryCache, make_key
+
+
+class Reads:
+    """A read callable counting its calls."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_a_write_to_a_collection_invalidates_its_results():
+    cache = QueryCache()
+    products = Reads([{"name": "a"}])
+    orders = Reads([{"total": 1}])
+    key = make_key("find", "Products", {"name": "a"})
+
+    cache.read(key, ("Products",), products)
+    cache.read(key, ("Products",), products)
+    cache.read("orders", ("Orders", "Customers"), orders)
+    assert (products.calls, orders.calls) == (1, 1)
+
+    cache.bump("Customers")
+    cache.read(key, ("Products",), products)
+    cache.read("orders", ("Orders", "Customers"), orders)
+    assert (products.calls, orders.calls) == (1, 2)
+    assert cache.stats()["hits"] == 2
+
+
+def test_a_result_expires_after_max_age(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(max_age=60)
+    read = Reads([1, 2])
+
+    cache.read("key", ("Products",), read)
+    now[0] += 59
+    cache.read("key", ("Products",), read)
+    assert read.calls == 1
+    now[0] += 2
+    cache.read("key", ("Products",), read)
+    assert read.calls == 2
+
+
+def test_callers_get_their_own_copy():
+    cache = QueryCache()
+    read = Reads([{"_id": 1}])
+
+    first = cache.read("key", ("Orders",), read)
+    first[0]["customer_name"] = "Amina"
+    first.append({"_id": 2})
+
+    assert cache.read("key", ("Orders",), read) == [{"_id": 1}]
+    assert read.calls == 1
+
+
+def test_uncached_results_are_returned_as_read():
+    cache = QueryCache(max_documents=40)
+    documents = [{"_id": index} for index in range(11)]
+    assert cache.read("big", ("Products",), Reads(documents)) is documents
+    assert cache.read("key", ("Products",), Reads(documents), cache=False) is documents
+    assert not cache.entries
+
+
+def test_the_documents_bound_evicts_the_oldest_results():
+    cache = QueryCache(max_documents=40)
+    for index in range(4):
+        cache.read(index, ("Products",), Reads([index] * 10))
+    cache.read(4, ("Products",), Reads([4] * 10))
+    assert list(cache.entries) == [1, 2, 3, 4]
+    assert cache.stats()["documents"] == 40
+    # Bigger than a quarter of max_documents: not cached
+    cache.read(5, ("Products",), Reads([5] * 11))
+    assert 5 not in cache.entries
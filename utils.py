@@ -1,6 +1,6 @@
 from datetime import datetime, date
 from PyQt5 import QtWidgets, QtGui, QtCore
-import qtawesome as qta
+import icons
 
 MENU_BUTTON_COLOR = "#ffffff"
 BUTTON_PLUS_COLOR = "#1abc9c"
@@ -28,29 +28,29 @@ class Utils:
             # Main Button Pages
             (
                 root.ui.buttonProductPage,
-                qta.icon('mdi.alpha-p-box', color=MENU_BUTTON_COLOR),
+                icons.icon('mdi.alpha-p-box', MENU_BUTTON_COLOR),
                 lambda: root.goto_page(page="Products")
             ),
             (
                 root.ui.buttonCustomerPage,
-                qta.icon('ph.users-three-light', color=MENU_BUTTON_COLOR),
+                icons.icon('ph.users-three-light', MENU_BUTTON_COLOR),
                 lambda: root.goto_page(page="Customers")
             ),
             (
                 root.ui.buttonOrderPage,
-                qta.icon('mdi6.clipboard', color=MENU_BUTTON_COLOR),
+                icons.icon('mdi6.clipboard', MENU_BUTTON_COLOR),
                 lambda: root.goto_page(page="Orders")
             ),
             (
                 root.ui.buttonStatisticsPage,
-                qta.icon('mdi6.chart-bar-stacked', color=MENU_BUTTON_COLOR),
+                icons.icon('mdi6.chart-bar-stacked', MENU_BUTTON_COLOR),
                 lambda: root.goto_page(page="Statistics")
             ),
 
             # Details Card Buttons
             (
                 root.ui.buttonCloseCard,
-                qta.icon('ri.close-fill', color="#227093"),
+                icons.icon('ri.close-fill', "#227093"),
                 root.ui.dockWidget.close
             ),
 
@@ -58,38 +58,43 @@ class Utils:
             (
                 # product details
                 root.ui.buttonProductDetails,
-                qta.icon('mdi6.information-variant', color=MENU_BUTTON_COLOR),
+                icons.icon('mdi6.information-variant', MENU_BUTTON_COLOR),
                 lambda: root.item_details(lineEditEnabled=False)
             ),
             (
                 # New Product
                 root.ui.buttonNewProduct,
-                qta.icon('ph.plus', color=BUTTON_PLUS_COLOR),
+                icons.icon('ph.plus', BUTTON_PLUS_COLOR),
                 root.new_product
             ),
             (
                 # Edit product
                 root.ui.buttonEditProduct,
-                qta.icon('mdi6.tooltip-edit', color=BUTTON_EDIT_COLOR),
+                icons.icon('mdi6.tooltip-edit', BUTTON_EDIT_COLOR),
                 lambda: root.item_details(lineEditEnabled=True, operation='Edit')
             ),
             (
                 # Delete Product
                 root.ui.buttonDeleteProduct,
-                qta.icon('mdi6.delete-outline', color=BUTTON_DELETE_COLOR),
+                icons.icon('mdi6.delete-outline', BUTTON_DELETE_COLOR),
                 lambda: root.delete_item(coll_name='Products')
             ),
 
             (   # Activate Customer
                 root.ui.buttonProductStatus,
-                qta.icon('mdi6.check', color=BUTTON_CHECK_COLOR),
+                icons.icon('mdi6.check', BUTTON_CHECK_COLOR),
                 lambda: root.activate_item(coll_name='Products')
             ),
+            (   # Import Products from CSV/XLSX
+                root.ui.buttonImportProducts,
+                icons.icon('mdi6.file-import-outline', BUTTON_PLUS_COLOR),
+                root.import_products
+            ),
 
             # THE SAVE BUTTON
             (
                 root.ui.buttonSave,
-                qta.icon('mdi.content-save', color=BUTTON_EDIT_COLOR),
+                icons.icon('mdi.content-save', BUTTON_EDIT_COLOR),
                 root.save_new_item
             ),
 
@@ -97,34 +102,34 @@ class Utils:
             # CUSTOMERS PAGE
             (   # Customer Details
                 root.ui.buttonCustomerDetails,
-                qta.icon('mdi.account-question', color=MENU_BUTTON_COLOR),
+                icons.icon('mdi.account-question', MENU_BUTTON_COLOR),
                 lambda: root.item_details(lineEditEnabled=False, operation="None", coll_name="Customers")
             ),
 
             (   # New Customer
                 root.ui.buttonNewCustomer,
-                qta.icon('mdi6.account-plus', color=BUTTON_PLUS_COLOR),
+                icons.icon('mdi6.account-plus', BUTTON_PLUS_COLOR),
                 lambda: root.new_customer()
             ),
 
             (   # Edit Customer
                 root.ui.buttonEditCustomer,
-                qta.icon('mdi6.account-edit', color=BUTTON_EDIT_COLOR),
+                icons.icon('mdi6.account-edit', BUTTON_EDIT_COLOR),
                 lambda: root.item_details(lineEditEnabled=True, operation="Edit", coll_name="Customers")
             ),
             (   # Delete Customer
                 root.ui.buttonDeleteCustomer,
-                qta.icon('mdi6.account-minus', color=BUTTON_DELETE_COLOR),
+                icons.icon('mdi6.account-minus', BUTTON_DELETE_COLOR),
                 lambda: root.delete_item(coll_name='Customers')
             ),
             (   # Activate Customer
                 root.ui.buttonCustomerStatus,
-                qta.icon('mdi6.check', color=BUTTON_CHECK_COLOR),
+                icons.icon('mdi6.check', BUTTON_CHECK_COLOR),
                 lambda: root.activate_item(coll_name='Customers')
             ),
             (   # Orders Customer
                 root.ui.buttonCustomerOrders,
-                qta.icon('mdi6.badge-account-horizontal', color=MENU_BUTTON_COLOR),
+                icons.icon('mdi6.badge-account-horizontal', MENU_BUTTON_COLOR),
                 root.customer_orders
             ),
 
@@ -132,25 +137,25 @@ class Utils:
             # ORDERS PAGE
             (   # Order Details
                 root.ui.buttonOrderDetails,
-                qta.icon('mdi6.information-variant', color=MENU_BUTTON_COLOR),
+                icons.icon('mdi6.information-variant', MENU_BUTTON_COLOR),
                 lambda: root.order_details(lineEditEnabled=False)
             ),
             (
                 # NEW ORDER
                 root.ui.buttonNewOrder,
-                qta.icon('ph.plus', color=BUTTON_PLUS_COLOR),
+                icons.icon('ph.plus', BUTTON_PLUS_COLOR),
                 root.new_order
             ),
             (
                 # Button Add To Cart
                 root.ui.buttonAddToCart,
-                qta.icon('ph.plus', color=BUTTON_PLUS_COLOR),
+                icons.icon('ph.plus', BUTTON_PLUS_COLOR),
                 lambda: root.add_product_to_table(root.ui.tableWidgetAddOrderProds)
             ),
             (
                 # Delete Order
                 root.ui.buttonDeleteOrder,
-                qta.icon('mdi6.delete-outline', color=BUTTON_DELETE_COLOR),
+                icons.icon('mdi6.delete-outline', BUTTON_DELETE_COLOR),
                 lambda: root.delete_item(coll_name='Orders')
             ),
         ]
@@ -160,7 +165,7 @@ class Utils:
             button.clicked.connect(callback)
 
         # Just Icons
-        root.ui.buttonOrderStatus.setIcon(qta.icon('mdi.list-status', color=MENU_BUTTON_COLOR))
+        root.ui.buttonOrderStatus.setIcon(icons.icon('mdi.list-status', MENU_BUTTON_COLOR))
 
         # Callback Functions [ LineEditSearch and his Button ]
         root.ui.lineEditSearchProduct.textChanged.connect(root.search_products)
@@ -205,8 +210,8 @@ class Utils:
 
         :example usage:
             order_actions = [
-                ({"pending": "قيد الانتظار"}, self.change_order_status, qta.icon('mdi6.clock-time-seven', color="#ffffff")),
-                ({"confirmed": "مؤكد"}, self.change_order_status, qta.icon('mdi6.check-circle-outline', color="#ffffff")),
+                ({"pending": "قيد الانتظار"}, self.change_order_status, icons.icon('mdi6.clock-time-seven', "#ffffff")),
+                ({"confirmed": "مؤكد"}, self.change_order_status, icons.icon('mdi6.check-circle-outline', "#ffffff")),
             ]
             Utils.create_menu(
                 root=self,
@@ -217,7 +222,7 @@ class Utils:
             )
         """
         # Set the icon for the button
-        button.setIcon(qta.icon(icon_name, color='#ffffff'))
+        button.setIcon(icons.icon(icon_name, '#ffffff'))
 
         # Create the menu
         menu = QtWidgets.QMenu(root)
@@ -296,19 +301,38 @@ class Utils:
         :param rows: A list of rows where each row is a list or tuple of values.
         :param headers: A list of column headers.
         """
+        # Sorting while items are inserted would move rows under our feet
+        sorting_enabled = table.isSortingEnabled()
+        table.setSortingEnabled(False)
+
         table.clear()
         table.setColumnCount(len(headers))
         table.setRowCount(len(rows))
         table.setHorizontalHeaderLabels(headers)
 
         for row_idx, row_data in enumerate(rows):
-            for col_idx, value in enumerate(row_data):
-                item = QtWidgets.QTableWidgetItem(str(value))
-                table.setItem(row_idx, col_idx, item)
+            Utils.set_table_row(table, row_idx, row_data)
 
+        table.setSortingEnabled(sorting_enabled)
         table.horizontalHeader().setStretchLastSection(True)
         table.resizeColumnsToContents()
 
+    @staticmethod
+    def set_table_row(table: QtWidgets.QTableWidget, row: int, values: list):
+        """
+        Set (or replace) the items of one row.
+
+        :param table: The QTableWidget instance.
+        :param row: The row index.
+        :param values: The row values.
+        """
+        for col_idx, value in enumerate(values):
+            item = table.item(row, col_idx)
+            if item is None:
+                table.setItem(row, col_idx, QtWidgets.QTableWidgetItem(str(value)))
+            else:
+                item.setText(str(value))
+
     @staticmethod
     def table_column_size(table: QtWidgets.QTableWidget, columns: list) -> None:
         """
@@ -391,6 +415,18 @@ class Utils:
         double_spinbox.setObjectName(name)
         return double_spinbox
 
+    @staticmethod
+    def create_tool_button(parent, name, tooltip=""):
+        """Create a page tool button sized like the ones of the designer toolbars."""
+        button = QtWidgets.QPushButton(parent)
+        button.setObjectName(name)
+        button.setSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
+        button.setMinimumSize(QtCore.QSize(40, 40))
+        button.setMaximumSize(QtCore.QSize(40, 40))
+        button.setIconSize(QtCore.QSize(27, 27))
+        button.setToolTip(tooltip)
+        return button
+
     @staticmethod
     def create_qtablewidget(column_count: int, headers: list):
         """
@@ -435,7 +471,7 @@ class Utils:
                 widget.deleteLater()
 
     @staticmethod
-    def datetime_fields(self, value):
+    def datetime_fields(value):
         """
         Transform datetime fields
         """